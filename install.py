@@ -5,25 +5,53 @@ Semabe theme installer for Linux Mint / Cinnamon
 
 Functions:
 - (if available) confirmation dialog via Zenity; without Zenity installation goes without questions
-- Extract archives:
+- Extract archives (.tar.xz, .tar.zst, .tar.gz or plain .tar, detected from the content):
     semabe.tar.xz -> ~/.themes
     semabe-theme-selector@sewbej.tar.xz -> ~/.local/share/cinnamon/extensions
-- During installation (if Zenity present) an "installing…" dialog is shown,
-  which closes automatically after completion. Without Zenity no dialogs – silent mode.
+- During installation (if Zenity present) a progress dialog shows the bytes and files
+  extracted and the throughput; it closes automatically after completion. Without Zenity
+  there are no dialogs and the progress is printed.
 
 Additionally:
 - `--run-tests` runs tests in a temporary directory (without touching real $HOME)
 - `-y/--yes` or env `SEMABE_ASSUME_YES=1` skip confirmation dialog
+- both archives are extracted concurrently; multi-block xz archives are decoded
+  on all cores (`--jobs N` limits the workers, `--serial` restores the one-by-one path)
+- `--benchmark` times the serial and the parallel extraction of the archives
+- a manifest of the installed files (size, mtime, sha256) is kept in ~/.local/share/semabe;
+  the next install writes only added/changed files and deletes removed ones (`--full` wipes instead)
+- full installs unpack into a staging directory which is swapped with the installed
+  tree in one rename; the old tree is deleted in the background
+- `--lazy` extracts only the selected variant plus the shared files; the extension
+  adds other variants on first use via `~/.local/share/semabe/install.py --materialize`
+- `--dedupe[=reflink]` stores identical files of all variants once (hard links or reflinks)
+- `--profile [FILE]` or env `SEMABE_PROFILE=<file or dir>` write a JSON trace with the wall/CPU
+  time, I/O and file counts of every install phase (~/.cache/semabe/traces by default)
+- `--verify[=archive]` hashes the installed files on all cores and reports missing, modified
+  and extra files against the stored manifest (or the archive); `--repair` also fixes them
 """
 
 import argparse
+import bz2
+import collections
+import contextlib
+import gzip
+import hashlib
+import io
 import json
+import lzma
 import os
+import re
+import struct
 import sys
 import tarfile
 import subprocess
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 # --- archives expected next to this script ---
 THEME_ARCHIVE = "semabe.tar.xz"
@@ -33,13 +61,264 @@ EXT_ARCHIVE = "semabe-theme-selector@sewbej.tar.xz"
 THEMES_DIR = Path.home() / ".themes"
 EXT_DIR = Path.home() / ".local" / "share" / "cinnamon" / "extensions"
 
+# --- installer state (manifests of installed files) ---
+STATE_DIR = Path.home() / ".local" / "share" / "semabe"
+MANIFEST_VERSION = 1
 
-def extract(archive: Path, dest: Path) -> None:
-    """Extract a .tar.xz archive into dest directory."""
+# --- variant catalog: every installable theme variant, loaded once by the extension ---
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+LAYOUT_LETTERS = {"right": "R", "left": "L", "classic_mac": "M", "gnome": "G"}
+SIZE_LETTERS = {"small": "S", "medium": "M", "large": "L", "extra-large": "XL", "extra-extra-large": "XXL"}
+TOOLKITS = ("cinnamon", "gtk-3.0", "gtk-4.0", "libadwaita")
+
+# --- lazy install: variant extracted when nothing Semabe is selected yet (extension defaults) ---
+DEFAULT_VARIANT = "semabe/legacy/Semabe Steel Glassy (legacy)"
+
+# --- xz container format ---
+XZ_MAGIC = b"\xfd7zXZ\x00"
+XZ_FOOTER_MAGIC = b"YZ"
+
+# --- archive formats: (suffix, magic) in the order archives are looked up ---
+ARCHIVE_FORMATS = [
+    (".tar.xz", XZ_MAGIC),
+    (".tar.zst", b"\x28\xb5\x2f\xfd"),
+    (".tar.gz", b"\x1f\x8b"),
+    (".tar.bz2", b"BZh"),
+    (".tar", None),
+]
+
+# --- traces (--profile / SEMABE_PROFILE): same schema as the extension's profiling.py ---
+TRACE_SCHEMA = "semabe-trace/1"
+TRACE_COUNTS = ("files_read", "files_written", "bytes_read", "bytes_written", "entries_scanned")
+
+
+class _Profiler:
+    """Per-phase wall/CPU time, /proc/self/io and counts of one run, written as JSON.
+
+    A copy of the extension's profiling.Profiler (this script runs on its own).
+    Disabled when `path` is None: phase() and count() then do nothing.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.enabled = path is not None
+        self.counts = dict.fromkeys(TRACE_COUNTS, 0)
+        self.phases: List[dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+        self._start = self._snapshot() if self.enabled else {}
+
+    def _snapshot(self) -> dict:
+        t = os.times()
+        snap = {"wall_s": time.perf_counter(),
+                "cpu_s": t.user + t.system + t.children_user + t.children_system}
+        snap.update(dict.fromkeys(("rchar", "wchar", "read_bytes", "write_bytes"), 0))
+        try:
+            with open("/proc/self/io", encoding="ascii") as f:
+                for line in f:
+                    key, _sep, value = line.partition(":")
+                    if key in snap:
+                        snap[key] = int(value)
+        except (OSError, ValueError):
+            pass
+        snap.update(self.counts)
+        return snap
+
+    def _delta(self, start: dict) -> dict:
+        end = self._snapshot()
+        return {key: round(end[key] - start[key], 6) if key.endswith("_s") else end[key] - start[key]
+                for key in start}
+
+    def count(self, key: str, n: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counts[key] += n
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = {"name": name, "depth": len(stack),
+                  "start_s": round(time.perf_counter() - self._start["wall_s"], 6)}
+        with self._lock:
+            self.phases.append(record)
+        start = self._snapshot()
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+            record.update(self._delta(start))
+
+    def write(self) -> Optional[Path]:
+        if not self.enabled:
+            return None
+        import platform
+        trace = {"schema": TRACE_SCHEMA, "tool": "install.py", "argv": sys.argv[1:],
+                 "host": platform.node(), "kernel": platform.release(), "python": platform.python_version(),
+                 "cpus": os.cpu_count(), "pid": os.getpid(), "started": self._started,
+                 "total": self._delta(self._start), "phases": self.phases}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(trace, indent=1), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"ℹ Cannot write trace {self.path}: {e}")
+            return None
+        print(f"ℹ Trace written: {self.path}")
+        return self.path
+
+
+def trace_path(value: Optional[str]) -> Optional[Path]:
+    """Trace file for a --profile/SEMABE_PROFILE value: empty, "1" or a directory give
+    <dir>/install-<time>-<pid>.json (default dir ~/.cache/semabe/traces); None: no trace."""
+    if value is None or value in ("0", "no", "false"):
+        return None
+    name = f"install-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json"
+    if value in ("", "1", "yes", "true"):
+        return Path.home() / ".cache" / "semabe" / "traces" / name
+    path = Path(value).expanduser()
+    if path.is_dir() or value.endswith("/"):
+        return path / name
+    return path
+
+
+_profiler = _Profiler()
+
+
+def archive_format(archive: Path) -> str:
+    """Compression of an archive from its first bytes: "xz", "zst", "gz", "bz2" or "tar"."""
+    with open(archive, "rb") as f:
+        head = f.read(6)
+    for suffix, magic in ARCHIVE_FORMATS:
+        if magic and head.startswith(magic):
+            return suffix.rsplit(".", 1)[1]
+    return "tar"
+
+
+def find_archive(directory: Path, name: str) -> Path:
+    """`name` (e.g. semabe.tar.xz) in directory, or the same archive in another format."""
+    base = name
+    for suffix, _magic in ARCHIVE_FORMATS:
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+            break
+    for suffix, _magic in ARCHIVE_FORMATS:
+        if (directory / (base + suffix)).exists():
+            return directory / (base + suffix)
+    return directory / name
+
+
+class _ZstdPipe(io.RawIOBase):
+    """Decompressed view of a .zst file through the zstd command (no zstd module in the stdlib)."""
+
+    def __init__(self, archive: Path):
+        super().__init__()
+        zstd = _which("zstd")
+        if not zstd:
+            raise tarfile.ReadError(f"{archive}: zstd archive, but neither the zstandard module nor zstd is installed")
+        self._proc = subprocess.Popen([zstd, "-dcq", "--", str(archive)], stdout=subprocess.PIPE)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._proc.stdout.readinto(b)
+        if n == 0 and self._proc.wait() != 0:
+            raise tarfile.ReadError(f"zstd exited with status {self._proc.returncode}")
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._proc.stdout.close()
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+        super().close()
+
+
+def open_archive(archive: Path):
+    """Binary file object with the uncompressed tar stream of `archive`, any supported format."""
+    fmt = archive_format(archive)
+    if fmt == "xz":
+        return lzma.open(archive)
+    if fmt == "gz":
+        return gzip.open(archive)
+    if fmt == "bz2":
+        return bz2.open(archive)
+    if fmt == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            return io.BufferedReader(_ZstdPipe(archive))
+        return zstandard.ZstdDecompressor().stream_reader(open(archive, "rb"), read_across_frames=True, closefd=True)
+    return open(archive, "rb")
+
+
+def uncompressed_size(archive: Path) -> Optional[int]:
+    """Size of the tar stream in `archive` if it is known without decoding (xz index, plain tar)."""
+    fmt = archive_format(archive)
+    if fmt == "tar":
+        return archive.stat().st_size
+    if fmt == "xz":
+        blocks = _xz_blocks(archive)
+        return sum(uncompressed for _offset, _unpadded, uncompressed in blocks) if blocks else None
+    return None
+
+
+def _stream_members(tar: tarfile.TarFile):
+    """Members of a "r|" tar stream one at a time.
+
+    TarFile keeps every member it has read in tar.members; the list is emptied
+    as we go, so memory does not grow with the number of members.
+    """
+    while True:
+        member = tar.next()
+        if member is None:
+            return
+        tar.members.clear()
+        yield member
+
+
+def extract(archive: Path, dest: Path, progress: Optional["Progress"] = None) -> None:
+    """Extract a tar archive (any supported compression) into dest directory.
+
+    Members are written as they are decoded; paths and link targets are
+    checked before each one is written (see _check_member()). `progress` gets
+    the position in the tar stream after every member.
+    """
     dest.mkdir(parents=True, exist_ok=True)
+    dirs = []
+    resolved = {}
     try:
-        with tarfile.open(archive, "r:xz") as tar:
-            tar.extractall(dest)
+        with _profiler.phase(f"extract {archive.name}"), \
+                open_archive(archive) as fileobj, tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            _profiler.count("files_read")
+            _profiler.count("bytes_read", archive.stat().st_size)
+            for count, member in enumerate(_stream_members(tar), 1):
+                target = _check_member(dest, member, resolved)
+                _profiler.count("entries_scanned")
+                if member.isdir():
+                    # like extractall(): directory attributes are set last
+                    _extract_member(tar, member, dest, set_attrs=False)
+                    dirs.append((target, member.mode, member.mtime))
+                else:
+                    _extract_member(tar, member, dest)
+                    if member.isfile():
+                        _profiler.count("files_written")
+                        _profiler.count("bytes_written", member.size)
+                if progress is not None:
+                    progress.update(archive, member.offset_data + member.size, count)
+        if progress is not None:
+            progress.finished(archive)
+        for target, mode, mtime in reversed(dirs):
+            os.chmod(target, mode & 0o7777)
+            os.utime(target, (mtime, mtime))
         print(f"✅ Extracted: {archive} -> {dest}")
     except FileNotFoundError:
         print(f"❌ File not found: {archive}")
@@ -49,6 +328,1307 @@ def extract(archive: Path, dest: Path) -> None:
         raise
 
 
+# --- progress ---
+
+class Progress:
+    """Byte and member progress of the archives being extracted.
+
+    update() is called after every member with its end in the uncompressed
+    tar stream. At most every INTERVAL seconds the total is sent to a
+    `zenity --progress` dialog (percentage plus a "# text" line) and/or
+    printed to `out`. The percentage needs the size of every tar stream (see
+    uncompressed_size()); otherwise the dialog pulsates.
+    """
+
+    INTERVAL = 0.5
+
+    def __init__(self, archives: List[Path], zenity: Optional[str] = None, out=None):
+        self.totals = {archive: uncompressed_size(archive) for archive in archives}
+        self.done = dict.fromkeys(archives, 0)
+        self.members = dict.fromkeys(archives, 0)
+        self.out = out
+        self.dialog = None
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last = 0.0
+        if zenity:
+            known = all(self.totals.values())
+            try:
+                self.dialog = subprocess.Popen(
+                    [zenity, "--progress", "--auto-close", "--no-cancel", "--width=450",
+                     "--title=Semabe theme selector installer", "--text=installing...",
+                     *([] if known else ["--pulsate"])],
+                    stdin=subprocess.PIPE, text=True)
+            except OSError as e:
+                print(f"ℹ Could not show installing dialog: {e}")
+
+    def percent(self) -> Optional[int]:
+        totals = list(self.totals.values())
+        if not all(totals):
+            return None
+        return min(100, sum(self.done.values()) * 100 // sum(totals))
+
+    def text(self) -> str:
+        done = sum(self.done.values())
+        rate = done / max(time.perf_counter() - self._start, 1e-6)
+        return f"{done / 2 ** 20:.1f} MiB, {sum(self.members.values())} files, {rate / 2 ** 20:.1f} MiB/s"
+
+    def update(self, archive: Path, position: int, members: int) -> None:
+        """`archive` was extracted up to byte `position` of its tar stream, `members` members so far."""
+        with self._lock:
+            self.done[archive] = position
+            self.members[archive] = members
+            now = time.perf_counter()
+            if now - self._last >= self.INTERVAL:
+                self._last = now
+                self._show(self.percent())
+
+    def finished(self, archive: Path) -> None:
+        """`archive` was read to its end (padding after the last member included)."""
+        with self._lock:
+            self.done[archive] = self.totals[archive] or self.done[archive]
+
+    def _show(self, percent: Optional[int]) -> None:
+        text = self.text()
+        if self.dialog is not None:
+            try:
+                if percent is not None:
+                    self.dialog.stdin.write(f"{min(percent, 99)}\n")
+                self.dialog.stdin.write(f"# installing... {text}\n")
+                self.dialog.stdin.flush()
+            except OSError:
+                # the dialog was closed: keep installing without it
+                self.dialog = None
+        if self.out is not None:
+            prefix = f"{percent}% " if percent is not None else ""
+            print(f"⏳ {prefix}{text}", file=self.out, flush=True)
+
+    def close(self) -> None:
+        """Report the final totals and close the dialog."""
+        with self._lock:
+            self._show(self.percent())
+            if self.dialog is not None:
+                try:
+                    self.dialog.stdin.write("100\n")
+                    self.dialog.stdin.close()
+                    self.dialog.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    self.dialog.terminate()
+                self.dialog = None
+
+
+# --- parallel extraction ---
+
+class UnsafeMemberError(tarfile.TarError):
+    """Archive member would be written outside of the destination directory."""
+
+
+# tarfile's own "data" extraction filter on top of _check_member(), where Python has it:
+# it also follows the links already on disk when checking link targets
+TAR_FILTER = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+# decoded file data handed to the writer threads but not written yet
+MAX_PENDING_BYTES = 64 << 20
+MAX_PENDING_FILES = 1024
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    """Decode an xz multibyte integer; return (value, new position)."""
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _xz_blocks(archive: Path) -> Optional[List[Tuple[int, int, int]]]:
+    """Return the block table of a single-stream .xz file.
+
+    Each entry is (file offset, unpadded size, uncompressed size). Returns None
+    when the file is not laid out as one plain xz stream (multiple streams,
+    stream padding, another compressor…) – callers then stay on the serial path.
+    """
+    try:
+        size = archive.stat().st_size
+        with open(archive, "rb") as f:
+            header = f.read(12)
+            if size < 24 or header[:6] != XZ_MAGIC:
+                return None
+            f.seek(size - 12)
+            footer = f.read(12)
+            if footer[10:] != XZ_FOOTER_MAGIC or footer[8:10] != header[6:8]:
+                return None
+            index_size = (struct.unpack("<I", footer[4:8])[0] + 1) * 4
+            if index_size > size - 24:
+                return None
+            f.seek(size - 12 - index_size)
+            index = f.read(index_size)
+    except OSError:
+        return None
+
+    try:
+        if index[0] != 0:
+            return None
+        count, pos = _read_varint(index, 1)
+        blocks = []
+        offset = 12
+        for _ in range(count):
+            unpadded, pos = _read_varint(index, pos)
+            uncompressed, pos = _read_varint(index, pos)
+            blocks.append((offset, unpadded, uncompressed))
+            offset += (unpadded + 3) & ~3
+    except IndexError:
+        return None
+
+    if offset + index_size + 12 != size:
+        return None
+    return blocks
+
+
+def _xz_wrap_block(stream_header: bytes, data: bytes, unpadded: int, uncompressed: int) -> bytes:
+    """Wrap one block of an xz stream into a minimal single-block stream.
+
+    The original header, the block, a one-record index and a matching footer
+    let the stdlib decoder verify and decompress the block without touching
+    the rest of the file.
+    """
+    index = b"\x00" + _varint(1) + _varint(unpadded) + _varint(uncompressed)
+    index += b"\x00" * (-len(index) % 4)
+    index += struct.pack("<I", zlib.crc32(index))
+    backward = struct.pack("<I", len(index) // 4 - 1) + stream_header[6:8]
+    footer = struct.pack("<I", zlib.crc32(backward)) + backward + XZ_FOOTER_MAGIC
+    return stream_header + data + index + footer
+
+
+def _xz_decode_block(stream_header: bytes, data: bytes, unpadded: int, uncompressed: int) -> bytes:
+    """Decode one block of an xz stream on its own."""
+    return lzma.decompress(_xz_wrap_block(stream_header, data, unpadded, uncompressed), format=lzma.FORMAT_XZ)
+
+
+def _read_range(archive: Path, start: int, end: int) -> bytes:
+    """Bytes [start, end) of the uncompressed tar stream of `archive`.
+
+    Multi-block xz archives decode only the blocks overlapping the range; other
+    formats are decoded from the start.
+    """
+    if _xz_blocks(archive) is not None:
+        return _xz_read_range(archive, start, end)
+    with open_archive(archive) as f:
+        skip = start
+        while skip:
+            chunk = f.read(min(skip, 1 << 20))
+            if not chunk:
+                break
+            skip -= len(chunk)
+        return f.read(end - start)
+
+
+def _xz_read_range(archive: Path, start: int, end: int) -> bytes:
+    """Return bytes [start, end) of the uncompressed content of a single-stream .xz file.
+
+    Only the blocks overlapping the range are decoded, and each of them only up
+    to the end of the range.
+    """
+    blocks = _xz_blocks(archive)
+    if blocks is None:
+        raise lzma.LZMAError(f"{archive} is not a single-stream xz file")
+    out = []
+    with open(archive, "rb") as f:
+        header = f.read(12)
+        block_start = 0
+        for offset, unpadded, uncompressed in blocks:
+            block_end = block_start + uncompressed
+            if block_end > start and block_start < end:
+                f.seek(offset)
+                wrapped = _xz_wrap_block(header, f.read((unpadded + 3) & ~3), unpadded, uncompressed)
+                need = min(end, block_end) - block_start
+                data = lzma.LZMADecompressor(format=lzma.FORMAT_XZ).decompress(wrapped, max_length=need)
+                out.append(data[max(0, start - block_start):need])
+            block_start = block_end
+            if block_start >= end:
+                break
+    return b"".join(out)
+
+
+class _ParallelXZReader(io.RawIOBase):
+    """Sequential read-only view of a multi-block .xz file decoded on a thread pool.
+
+    lzma releases the GIL while decoding, so independent blocks are decoded on
+    all cores. At most `window` decoded blocks are held in memory at once.
+    """
+
+    def __init__(self, archive: Path, blocks: List[Tuple[int, int, int]], workers: int):
+        super().__init__()
+        self._fd = os.open(archive, os.O_RDONLY)
+        self._header = os.pread(self._fd, 12, 0)
+        self._blocks = blocks
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._window = workers * 2
+        self._futures = []
+        self._next = 0
+        self._buf = b""
+        self._pos = 0
+        self._fill()
+
+    def _decode(self, i: int) -> bytes:
+        offset, unpadded, uncompressed = self._blocks[i]
+        data = os.pread(self._fd, (unpadded + 3) & ~3, offset)
+        return _xz_decode_block(self._header, data, unpadded, uncompressed)
+
+    def _fill(self) -> None:
+        while len(self._futures) < self._window and self._next < len(self._blocks):
+            self._futures.append(self._pool.submit(self._decode, self._next))
+            self._next += 1
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while self._pos >= len(self._buf):
+            if not self._futures:
+                return 0
+            self._buf = self._futures.pop(0).result()
+            self._pos = 0
+            self._fill()
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            for future in self._futures:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+            os.close(self._fd)
+        super().close()
+
+
+def _member_target(dest: Path, name: str) -> Path:
+    """Resolve an archive member name below dest, refusing absolute and `..` paths."""
+    parts = Path(name).parts
+    if Path(name).is_absolute() or ".." in parts:
+        raise UnsafeMemberError(f"unsafe member path: {name}")
+    return dest.joinpath(*parts)
+
+
+def _inside(root: str, path: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+def _check_member(dest: Path, member: tarfile.TarInfo, resolved: Optional[dict] = None) -> Path:
+    """Target of `member` below dest, refusing members that could write outside of it.
+
+    Besides the member path, symlink and hard link targets must stay inside
+    dest, and device files are refused. Paths are resolved on disk, so links
+    extracted earlier (a chain of `..` links) cannot lead out of dest either.
+    `resolved` caches the resolved directories over one extraction; it is
+    emptied at every link member, which may change what they resolve to.
+    """
+    target = _member_target(dest, member.name)
+    if resolved is None:
+        resolved = {}
+    if member.issym() or member.islnk():
+        resolved.clear()
+    root = resolved.get(dest) or resolved.setdefault(dest, os.path.realpath(dest))
+    parent = resolved.get(target.parent) or resolved.setdefault(target.parent, os.path.realpath(target.parent))
+    if not _inside(root, parent):
+        raise UnsafeMemberError(f"unsafe member path (through a link): {member.name}")
+    if member.issym():
+        link = os.path.normpath(os.path.join(os.path.dirname(member.name), member.linkname))
+        if os.path.isabs(member.linkname) or link == ".." or link.startswith("../") \
+                or not _inside(root, os.path.realpath(os.path.join(parent, member.linkname))):
+            raise UnsafeMemberError(f"unsafe link target: {member.name} -> {member.linkname}")
+    elif member.islnk():
+        if not _inside(root, os.path.realpath(_member_target(dest, member.linkname))):
+            raise UnsafeMemberError(f"unsafe link target: {member.name} -> {member.linkname}")
+    elif member.ischr() or member.isblk():
+        raise UnsafeMemberError(f"device file in archive: {member.name}")
+    return target
+
+
+def _extract_member(tar: tarfile.TarFile, member: tarfile.TarInfo, dest: Path, **kwargs) -> None:
+    """tar.extract() with TAR_FILTER; members the filter refuses raise UnsafeMemberError."""
+    try:
+        tar.extract(member, dest, **TAR_FILTER, **kwargs)
+    except getattr(tarfile, "FilterError", ()) as e:
+        raise UnsafeMemberError(str(e)) from e
+
+
+def _write_member(target: Path, data: bytes, mode: int, mtime: float) -> None:
+    # write next to the target and rename over it: a deduplicated file may be
+    # a hard link shared with other variants, which must not change with it
+    tmp = target.with_name(f".{target.name}.semabe-tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    _profiler.count("files_written")
+    _profiler.count("bytes_written", len(data))
+    os.chmod(tmp, mode & 0o7777)
+    os.utime(tmp, (mtime, mtime))
+    os.replace(tmp, target)
+
+
+def _unchanged(target: Path, entry: dict, old: Optional[dict]) -> bool:
+    """True when the installed file still matches `old` and `old` has the content of `entry`.
+
+    Fixes the mode and keeps the installed mtime in `entry` in that case.
+    """
+    if old and old.get("sha256") == entry["sha256"]:
+        try:
+            st = target.stat()
+        except OSError:
+            st = None
+        # untouched since the last install: keep the file (and its mtime) as it is
+        if st is not None and st.st_size == old["size"] and int(st.st_mtime) == old["mtime"]:
+            if old.get("mode") != entry["mode"]:
+                os.chmod(target, entry["mode"])
+            entry["mtime"] = old["mtime"]
+            return True
+    return False
+
+
+def _sync_member(target: Path, data: bytes, mode: int, mtime: float, old: Optional[dict]) -> Tuple[dict, bool]:
+    """Write a member unless the installed file still matches its manifest entry.
+
+    Returns the new manifest entry and whether the file was written.
+    """
+    entry = {"size": len(data), "mtime": int(mtime), "mode": mode & 0o7777,
+             "sha256": hashlib.sha256(data).hexdigest()}
+    if _unchanged(target, entry, old):
+        return entry, False
+    _write_member(target, data, mode, mtime)
+    return entry, True
+
+
+def _link_member(target: Path, source: Path, source_entry: dict, old: Optional[dict]) -> Tuple[dict, bool]:
+    """Install a tar hard link entry as a hard link to the already installed `source`.
+
+    The manifest entry is the one of the source file, so delta installs and
+    --dedupe treat it like any other file.
+    """
+    entry = dict(source_entry)
+    if _unchanged(target, entry, old):
+        return entry, False
+    tmp = target.with_name(f".{target.name}.semabe-tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        import shutil
+        shutil.copy2(source, tmp)
+    _profiler.count("files_written")
+    os.replace(tmp, target)
+    return entry, True
+
+
+def _member_key(name: str) -> str:
+    """Manifest key of an archive member (`./semabe/x` and `semabe/x` are the same file)."""
+    return "/".join(Path(name).parts)
+
+
+def _extract_stream(archive: Path, dest: Path, writers: ThreadPoolExecutor, workers: int,
+                    previous: Optional[dict] = None, select: Optional[Callable[[str], bool]] = None,
+                    ranges: Optional[dict] = None, sources: Optional[dict] = None,
+                    toolkits: Optional[dict] = None, progress: Optional["Progress"] = None) -> dict:
+    """Unpack one archive, decoding in order and handing file writes to `writers`.
+
+    At most MAX_PENDING_BYTES of decoded data (MAX_PENDING_FILES files) wait
+    for the writers; past that the decoder waits for them, so memory stays
+    flat however large the archive is. `progress` gets the position in the
+    tar stream after every member.
+
+    With `previous` (the manifest of the last install into dest) only files that
+    were added or changed are written and files no longer shipped are removed.
+    `select` limits extraction to the member keys it accepts, and `ranges` is
+    filled with the uncompressed byte ranges of every theme variant directory.
+    `sources` is filled with the data range of every hard link target, for
+    links whose target is not extracted, and `toolkits` with the toolkits of
+    every variant (see variant_toolkit()). Returns the manifest of the installed files.
+    """
+    dest.mkdir(parents=True, exist_ok=True)
+    blocks = _xz_blocks(archive)
+    if blocks is not None and len(blocks) > 1 and workers > 1:
+        fileobj = _ParallelXZReader(archive, blocks, workers)
+    else:
+        # single-block xz or another format: nothing to decode in parallel
+        fileobj = open_archive(archive)
+
+    _profiler.count("files_read")
+    _profiler.count("bytes_read", archive.stat().st_size)
+    old_files = previous["files"] if previous else {}
+    files = {}
+    pending = collections.deque()
+    pending_bytes = 0
+    dirs = []
+    written = 0
+    offsets = {}  # key -> (data offset, size) of regular files, for hard links
+    deferred = []  # hard links to files that were not extracted
+    resolved = {}
+
+    def collect() -> None:
+        nonlocal written, pending_bytes
+        key, future, size = pending.popleft()
+        files[key], changed = future.result()
+        written += changed
+        pending_bytes -= size
+
+    def drain() -> None:
+        while pending:
+            collect()
+
+    try:
+        with fileobj, tarfile.open(fileobj=fileobj, mode="r|") as tar:
+            for count, member in enumerate(_stream_members(tar), 1):
+                _profiler.count("entries_scanned")
+                if progress is not None:
+                    progress.update(archive, member.offset_data + member.size, count)
+                target = _check_member(dest, member, resolved)
+                key = _member_key(member.name)
+                if ranges is not None:
+                    _add_range(ranges, key, member)
+                if toolkits is not None:
+                    _add_toolkit(toolkits, key)
+                if member.isfile():
+                    offsets[key] = (member.offset_data, member.size)
+                if member.islnk() and sources is not None:
+                    link_key = _member_key(member.linkname)
+                    if link_key in offsets:
+                        sources[link_key] = offsets[link_key]
+                if select is not None and not select(key):
+                    continue
+                if member.isdir():
+                    target.mkdir(parents=True, exist_ok=True)
+                    dirs.append((target, member))
+                elif member.isfile():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    data = tar.extractfile(member).read()
+                    pending.append((key, writers.submit(
+                        _sync_member, target, data, member.mode, member.mtime, old_files.get(key)), len(data)))
+                    pending_bytes += len(data)
+                    while pending and (pending_bytes > MAX_PENDING_BYTES or len(pending) > MAX_PENDING_FILES):
+                        collect()
+                elif member.islnk():
+                    link_key = _member_key(member.linkname)
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    drain()
+                    if link_key in files:
+                        files[key], changed = _link_member(
+                            target, _member_target(dest, member.linkname), files[link_key], old_files.get(key))
+                        written += changed
+                    elif link_key in offsets:
+                        deferred.append((key, target, member, offsets[link_key]))
+                    else:
+                        raise tarfile.ReadError(f"{member.name}: hard link to unknown member {member.linkname}")
+                else:
+                    # links may point at files still queued for writing
+                    drain()
+                    _extract_member(tar, member, dest)
+                    files[key] = {"size": 0, "mtime": int(member.mtime), "link": member.linkname}
+                    written += 1
+            drain()
+        if progress is not None:
+            progress.finished(archive)
+    finally:
+        for _key, future, _size in pending:
+            future.cancel()
+
+    # links into parts of the archive that were not selected: read the data on its own
+    for key, target, member, (offset, size) in deferred:
+        files[key], changed = _sync_member(
+            target, _read_range(archive, offset, offset + size), member.mode, member.mtime, old_files.get(key))
+        written += changed
+
+    # like extractall(): directory attributes last, deepest first
+    for target, member in reversed(dirs):
+        os.chmod(target, member.mode & 0o7777)
+        os.utime(target, (member.mtime, member.mtime))
+
+    dir_keys = sorted({_member_key(member.name) for _target, member in dirs} - {""})
+    removed = _remove_stale(dest, previous, files, dir_keys) if previous else 0
+
+    if previous:
+        print(f"✅ Updated: {archive} -> {dest} "
+              f"(written: {written}, unchanged: {len(files) - written}, removed: {removed})")
+    else:
+        print(f"✅ Extracted: {archive} -> {dest}")
+    return {"version": MANIFEST_VERSION, "archive": archive.name, "dest": str(dest),
+            "files": files, "dirs": dir_keys}
+
+
+def _add_range(ranges: dict, key: str, member: tarfile.TarInfo) -> None:
+    """Record the bytes (header included) occupied by a member of a variant directory."""
+    variant = variant_of(key)
+    if variant is None:
+        return
+    end = member.offset_data + ((member.size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+    spans = ranges.setdefault(variant, [])
+    if spans and spans[-1][1] == member.offset:
+        spans[-1][1] = end
+    else:
+        spans.append([member.offset, end])
+
+
+def _add_toolkit(toolkits: dict, key: str) -> None:
+    """Record the toolkit directory (gtk-3.0, cinnamon, …) a member of a variant belongs to."""
+    variant = variant_of(key)
+    if variant is not None and len(key) > len(variant):
+        toolkit = variant_toolkit(key[len(variant) + 1:].split("/", 1)[0])
+        if toolkit:
+            toolkits.setdefault(variant, set()).add(toolkit)
+
+
+def _remove_stale(dest: Path, previous: dict, files: dict, dirs: List[str]) -> int:
+    """Delete what the previous install shipped and the current archive does not."""
+    removed = 0
+    for key in previous["files"].keys() - files.keys():
+        try:
+            (dest / key).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    # deepest first; a directory still holding user files stays
+    for key in sorted(set(previous.get("dirs", [])) - set(dirs), reverse=True):
+        try:
+            (dest / key).rmdir()
+        except OSError:
+            pass
+    return removed
+
+
+# --- install manifests ---
+
+def manifest_path(archive: Path) -> Path:
+    """Location of the manifest describing what `archive` installed (the same for every format)."""
+    name = archive.name
+    for suffix, _magic in ARCHIVE_FORMATS:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return STATE_DIR / f"{name}.manifest.json"
+
+
+def load_manifest(archive: Path, dest: Path) -> Optional[dict]:
+    """Return the manifest of the last install of `archive` into dest, if usable."""
+    try:
+        manifest = json.loads(manifest_path(archive).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("dest") != str(dest):
+        return None
+    return manifest
+
+
+def save_manifest(archive: Path, manifest: Optional[dict]) -> None:
+    """Store (or with None, forget) the manifest of `archive`."""
+    path = manifest_path(archive)
+    if manifest is None:
+        path.unlink(missing_ok=True)
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def extract_parallel(jobs: List[Tuple[Path, Path]], workers: Optional[int] = None,
+                     previous: Optional[dict] = None, progress: Optional["Progress"] = None) -> dict:
+    """Extract several (archive, dest) pairs at the same time.
+
+    Archives are unpacked concurrently, multi-block xz data is decoded on all
+    cores and file writes go through a shared worker pool. If the parallel path
+    fails for an archive, that archive is extracted again with extract(); a
+    failed delta update is redone by install_staged(), so the installed tree
+    is only replaced once the archive has been decoded in full.
+
+    `previous` maps archives to the manifests of their last install and turns
+    extraction into a delta update. Returns the new manifest of every archive
+    (None where the serial fallback was used). `progress` follows all archives.
+    """
+    workers = workers or os.cpu_count() or 1
+    previous = previous or {}
+
+    def run(archive: Path, dest: Path) -> Optional[dict]:
+        try:
+            with _profiler.phase(f"extract {archive.name}"):
+                return _extract_stream(archive, dest, writers, workers, previous.get(archive), progress=progress)
+        except (FileNotFoundError, UnsafeMemberError):
+            raise
+        except (OSError, EOFError, lzma.LZMAError, tarfile.TarError) as e:
+            print(f"ℹ Parallel extraction failed for {archive} ({e}), using serial extraction")
+            if previous.get(archive):
+                return install_staged([(archive, dest)], serial=True, progress=progress)[archive]
+            extract(archive, dest, progress)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as writers, \
+            ThreadPoolExecutor(max_workers=max(1, len(jobs))) as readers:
+        futures = {archive: readers.submit(run, archive, dest) for archive, dest in jobs}
+        return {archive: future.result() for archive, future in futures.items()}
+
+
+def benchmark_extract(jobs: List[Tuple[Path, Path]], workers: Optional[int] = None) -> dict:
+    """Time serial extract() against extract_parallel() in scratch directories."""
+    import shutil
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+
+        start = time.perf_counter()
+        for i, (archive, _dest) in enumerate(jobs):
+            extract(archive, tmp_path / "serial" / str(i))
+        serial = time.perf_counter() - start
+        shutil.rmtree(tmp_path / "serial")
+
+        start = time.perf_counter()
+        extract_parallel([(archive, tmp_path / "parallel" / str(i)) for i, (archive, _dest) in enumerate(jobs)], workers)
+        parallel = time.perf_counter() - start
+
+    result = {
+        "serial_s": round(serial, 4),
+        "parallel_s": round(parallel, 4),
+        "speedup": round(serial / parallel, 2) if parallel else None,
+        "workers": workers or os.cpu_count() or 1,
+    }
+    print(f"⏱ serial: {result['serial_s']} s, parallel: {result['parallel_s']} s, speedup: {result['speedup']}×")
+    return result
+
+
+# --- lazy install ---
+
+def variant_of(key: str) -> Optional[str]:
+    """Variant directory a member belongs to (`semabe/…/Semabe <name>`), None for the shared core."""
+    parts = key.split("/")
+    for i, part in enumerate(parts):
+        if part.startswith("Semabe "):
+            return "/".join(parts[:i + 1])
+    return None
+
+
+def index_path(archive: Path) -> Path:
+    """Location of the lazy-install index of `archive`."""
+    return manifest_path(archive).with_name(manifest_path(archive).name.replace(".manifest.", ".index."))
+
+
+def _current_variants() -> List[str]:
+    """Semabe variants selected in the desktop settings (falls back to the extension default)."""
+    variants = []
+    gsettings = _which("gsettings")
+    if gsettings:
+        for schema, key in (("org.cinnamon.desktop.interface", "gtk-theme"), ("org.cinnamon.theme", "name")):
+            try:
+                out = subprocess.run([gsettings, "get", schema, key], capture_output=True, text=True, timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+            value = out.stdout.strip().strip("'")
+            if out.returncode == 0 and value.startswith("semabe/") and value not in variants:
+                variants.append(value)
+    return variants or [DEFAULT_VARIANT]
+
+
+def install_lazy(archive: Path, dest: Path, variants: List[str], workers: Optional[int] = None,
+                 index_dest: Optional[Path] = None, progress: Optional["Progress"] = None) -> dict:
+    """Extract the shared core and the given variants of the theme archive only.
+
+    The byte ranges of all variant directories are stored in an index next to
+    a copy of the archive (and of this installer), so that materialize() can
+    add any other variant later without decoding the whole archive.
+    `index_dest` is the final location when dest is a staging directory.
+    """
+    wanted = set(variants)
+    ranges = {}
+    sources = {}
+    toolkits = {}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as writers:
+        manifest = _extract_stream(
+            archive, dest, writers, workers or os.cpu_count() or 1,
+            select=lambda key: variant_of(key) in wanted or variant_of(key) is None,
+            ranges=ranges, sources=sources, toolkits=toolkits, progress=progress,
+        )
+
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    stored = STATE_DIR / archive.name
+    if not stored.exists() or not stored.samefile(archive):
+        import shutil
+        shutil.copyfile(archive, stored)
+    installer = STATE_DIR / "install.py"
+    if not installer.exists() or not installer.samefile(__file__):
+        import shutil
+        shutil.copyfile(__file__, installer)
+
+    index = {"version": MANIFEST_VERSION, "archive": archive.name, "dest": str(index_dest or dest),
+             "size": stored.stat().st_size, "variants": ranges, "sources": sources,
+             "toolkits": {variant: sorted(names) for variant, names in toolkits.items()}}
+    tmp = index_path(archive).with_suffix(".tmp")
+    tmp.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, index_path(archive))
+    print(f"✅ Lazy install: {len(wanted & ranges.keys())} of {len(ranges)} variants extracted")
+    return manifest
+
+
+def materialize(variants: List[str], archive_name: str = THEME_ARCHIVE) -> int:
+    """Extract variants recorded in the lazy-install index; return the number of files written.
+
+    Only the compressed blocks holding the variant's byte ranges are decoded.
+    Installed variants are skipped; unknown ones raise KeyError.
+    """
+    index = json.loads(index_path(STATE_DIR / archive_name).read_text(encoding="utf-8"))
+    archive = STATE_DIR / index["archive"]
+    dest = Path(index["dest"])
+    if index.get("version") != MANIFEST_VERSION or index["size"] != archive.stat().st_size:
+        raise ValueError(f"lazy-install index does not match {archive}")
+    missing = [v for v in dict.fromkeys(variants) if not (dest / v).is_dir()]
+    for variant in missing:
+        if variant not in index["variants"]:
+            raise KeyError(f"unknown variant: {variant}")
+    if not missing:
+        return 0
+
+    manifest = load_manifest(archive, dest) or {
+        "version": MANIFEST_VERSION, "archive": archive.name, "dest": str(dest), "files": {}, "dirs": []}
+    written = 0
+    chunks = [_read_range(archive, start, end) for v in missing for start, end in index["variants"][v]]
+    resolved = {}
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks)), mode="r|") as tar:
+        for member in _stream_members(tar):
+            target = _check_member(dest, member, resolved)
+            key = _member_key(member.name)
+            if member.isdir():
+                target.mkdir(parents=True, exist_ok=True)
+                manifest["dirs"].append(key)
+            elif member.isfile():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                manifest["files"][key], _changed = _sync_member(
+                    target, tar.extractfile(member).read(), member.mode, member.mtime, None)
+                written += 1
+            elif member.islnk():
+                link_key = _member_key(member.linkname)
+                source = _member_target(dest, member.linkname)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if link_key in manifest["files"] and source.is_file():
+                    manifest["files"][key], _changed = _link_member(target, source, manifest["files"][link_key], None)
+                else:
+                    offset, size = index["sources"][link_key]
+                    manifest["files"][key], _changed = _sync_member(
+                        target, _read_range(archive, offset, offset + size), member.mode, member.mtime, None)
+                written += 1
+            else:
+                _extract_member(tar, member, dest)
+                manifest["files"][key] = {"size": 0, "mtime": int(member.mtime), "link": member.linkname}
+    manifest["dirs"] = sorted(set(manifest["dirs"]))
+    save_manifest(archive, manifest)
+    catalog = load_catalog()
+    if catalog is not None:
+        for entry in catalog["paths"]:
+            if entry["path"] in missing:
+                entry["lazy"] = False
+        save_catalog(catalog)
+    print(f"✅ Materialized: {', '.join(missing)} ({written} files)")
+    return written
+
+
+# --- variant catalog ---
+
+def variant_toolkit(name: str) -> Optional[str]:
+    """Toolkit served by a directory of a variant (libadwaita-1.5 → libadwaita), else None."""
+    if name.startswith("libadwaita"):
+        return "libadwaita"
+    return name if name in TOOLKITS else None
+
+
+def variant_keys(path: str) -> List[str]:
+    """Catalog keys `controls|size|layout|color|transparency` served by a variant directory.
+
+    Paths follow the extension's theme layout: `semabe/legacy/<name>` (any
+    layout, size L), `semabe/<controls>/<size>/<name>` (any layout) and
+    `semabe/<controls>/<layout>/<size>/<name>`. Other paths serve no key.
+    """
+    parts = path.split("/")
+    match = re.fullmatch(r"Semabe (.+) (\S+) \(([^)]+)\)\w*", parts[-1])
+    if len(parts) < 3 or len(parts) > 5 or parts[0] != "semabe" or not match or match.group(3) != parts[1]:
+        return []
+    color, transparency, controls = match.groups()
+    middle = parts[2:-1]
+    try:
+        sizes = [SIZE_LETTERS[middle[-1]]] if middle else ["L"]
+        layouts = [LAYOUT_LETTERS[middle[0]]] if len(middle) == 2 else list(LAYOUT_LETTERS.values())
+    except KeyError:
+        return []
+    return [f"{controls}|{size}|{layout}|{color}|{transparency}" for size in sizes for layout in layouts]
+
+
+def build_catalog(themes_dir: Path, lazy: Optional[dict] = None) -> dict:
+    """Catalog of the theme variants below themes_dir/semabe for the extension.
+
+    `lazy` maps the variants of a lazy install that are not extracted yet to
+    their toolkits; they are listed with "lazy": true. The catalog holds
+    every variant path with its toolkits, a map from each settings key (see
+    variant_keys()) to the index of its path, and the sizes each window
+    control style comes in.
+    """
+    found = {}
+    stack = [themes_dir / "semabe"]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = [e for e in it if e.is_dir(follow_symlinks=False)]
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("Semabe "):
+                try:
+                    with os.scandir(entry.path) as it:
+                        names = {variant_toolkit(e.name) for e in it if e.is_dir()}
+                except OSError:
+                    continue
+                found[Path(entry.path).relative_to(themes_dir).as_posix()] = (names - {None}, False)
+            else:
+                stack.append(Path(entry.path))
+    for variant, toolkits in (lazy or {}).items():
+        found.setdefault(variant, (set(toolkits), True))
+
+    catalog = {"version": CATALOG_VERSION, "themes_dir": str(themes_dir), "paths": [], "variants": {}, "sizes": {}}
+    sizes = {}
+    for path in sorted(found):
+        keys = variant_keys(path)
+        if not keys:
+            continue
+        toolkits, is_lazy = found[path]
+        index = len(catalog["paths"])
+        catalog["paths"].append({"path": path, "toolkits": sorted(toolkits), "lazy": is_lazy})
+        for key in keys:
+            catalog["variants"][key] = index
+            controls, size = key.split("|", 2)[:2]
+            sizes.setdefault(controls, set()).add(size)
+    catalog["sizes"] = {controls: [s for s in SIZE_LETTERS.values() if s in found_sizes]
+                        for controls, found_sizes in sorted(sizes.items())}
+    return catalog
+
+
+def load_catalog() -> Optional[dict]:
+    try:
+        catalog = json.loads((STATE_DIR / CATALOG_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return catalog if catalog.get("version") == CATALOG_VERSION else None
+
+
+def save_catalog(catalog: dict) -> None:
+    path = STATE_DIR / CATALOG_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(catalog, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def write_catalog(theme_archive: Path, themes_dir: Path) -> dict:
+    """Build and store the catalog after an install of `theme_archive` into themes_dir."""
+    lazy = None
+    try:
+        index = json.loads(index_path(theme_archive).read_text(encoding="utf-8"))
+        if index.get("dest") == str(themes_dir):
+            lazy = index.get("toolkits", {})
+    except (OSError, ValueError):
+        pass
+    catalog = build_catalog(themes_dir, lazy)
+    save_catalog(catalog)
+    print(f"✅ Variant catalog: {len(catalog['paths'])} variants, {len(catalog['variants'])} settings combinations")
+    return catalog
+
+
+# --- staged install ---
+
+RENAME_EXCHANGE = 2  # renameat2() flag: swap two existing paths atomically
+AT_FDCWD = -100
+
+
+def _rename_exchange(a: Path, b: Path) -> bool:
+    """Atomically swap two paths with renameat2(); False where the kernel/libc cannot."""
+    import ctypes
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    return renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0
+
+
+def _remove_in_background(path: Path) -> Optional[subprocess.Popen]:
+    """Delete a directory tree from a detached process; the installer does not wait for it."""
+    if not path.exists():
+        return None
+    return subprocess.Popen(
+        [sys.executable, "-c", "import shutil, sys; shutil.rmtree(sys.argv[1], ignore_errors=True)", str(path)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _move_aside(path: Path, like: Optional[Path] = None) -> Path:
+    """Rename path to a hidden name next to `like` (default: path itself) and return it."""
+    like = like or path
+    aside = like.with_name(f".{like.name}.old-{os.getpid()}-{time.monotonic_ns()}")
+    os.rename(path, aside)
+    return aside
+
+
+def _swap_in(staged: Path, target: Path) -> None:
+    """Put the staged tree in place of target; the previous tree is removed in the background."""
+    if not target.exists():
+        os.rename(staged, target)
+        return
+    if _rename_exchange(staged, target):
+        # staged now holds the old tree
+        _remove_in_background(_move_aside(staged, target))
+        return
+    old = _move_aside(target)
+    os.rename(staged, target)
+    _remove_in_background(old)
+
+
+def install_staged(jobs: List[Tuple[Path, Path]], workers: Optional[int] = None, serial: bool = False,
+                   lazy: Optional[dict] = None, progress: Optional["Progress"] = None) -> dict:
+    """Full install that never leaves the target directories half-populated.
+
+    Every archive is extracted into a staging directory next to its target;
+    afterwards each top-level directory of the archive is swapped into place
+    (atomically where renameat2 is available) and the old tree is deleted by a
+    background process. `lazy` maps archives to the variants install_lazy()
+    should extract. Returns the manifests like extract_parallel().
+    """
+    lazy = lazy or {}
+    staging = {dest: dest / f".semabe-staging-{os.getpid()}" for _archive, dest in jobs}
+    try:
+        if serial:
+            for archive, dest in jobs:
+                extract(archive, staging[dest], progress)
+            manifests = {archive: None for archive, _dest in jobs}
+        else:
+            manifests = extract_parallel([(a, staging[d]) for a, d in jobs if a not in lazy], workers,
+                                         progress=progress)
+            for archive, dest in jobs:
+                if archive in lazy:
+                    with _profiler.phase(f"extract {archive.name} (lazy)"):
+                        manifests[archive] = install_lazy(
+                            archive, staging[dest], lazy[archive], workers, index_dest=dest, progress=progress)
+    except BaseException:
+        for path in staging.values():
+            _remove_in_background(path)
+        raise
+
+    for archive, dest in jobs:
+        for entry in sorted(staging[dest].iterdir()):
+            _swap_in(entry, dest / entry.name)
+        staging[dest].rmdir()
+        if manifests.get(archive):
+            manifests[archive]["dest"] = str(dest)
+    return manifests
+
+
+# --- deduplication ---
+
+FICLONE = 0x40049409  # ioctl(dest_fd, FICLONE, src_fd): share extents (btrfs, xfs, bcachefs)
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_from_tree(dest: Path, root: str, workers: Optional[int] = None) -> dict:
+    """Build a manifest for an installed tree that was not extracted by extract_parallel()."""
+    paths = [p for p in sorted((dest / root).rglob("*")) if p.is_file() and not p.is_symlink()]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        digests = list(pool.map(_file_sha256, paths))
+    files = {}
+    for path, digest in zip(paths, digests):
+        st = path.stat()
+        files[path.relative_to(dest).as_posix()] = {
+            "size": st.st_size, "mtime": int(st.st_mtime), "mode": st.st_mode & 0o7777, "sha256": digest}
+    return {"version": MANIFEST_VERSION, "archive": None, "dest": str(dest), "files": files, "dirs": []}
+
+
+def _reflink(src: Path, dest: Path) -> bool:
+    """Replace dest by a copy-on-write clone of src; False if the filesystem cannot clone."""
+    import fcntl
+    tmp = dest.with_name(f".{dest.name}.semabe-tmp")
+    try:
+        with open(src, "rb") as s, open(tmp, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        st = dest.stat()
+        os.chmod(tmp, st.st_mode & 0o7777)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dest)
+        return True
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return False
+
+
+def _hardlink(src: Path, dest: Path) -> bool:
+    """Replace dest by a hard link to src (atomically, via a temporary name)."""
+    tmp = dest.with_name(f".{dest.name}.semabe-tmp")
+    try:
+        os.link(src, tmp)
+        os.replace(tmp, dest)
+        return True
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return False
+
+
+def dedupe(manifests: List[dict], mode: str = "hardlink") -> dict:
+    """Store each distinct installed file only once.
+
+    Files are grouped by the sha256 and mode recorded in the manifests; every
+    copy in a group is replaced by a hard link to the first one, or with
+    mode="reflink" by a copy-on-write clone where the filesystem supports it
+    (hard links otherwise). Manifest entries of replaced files are updated.
+    """
+    groups = {}
+    for manifest in manifests:
+        dest = Path(manifest["dest"])
+        for key, entry in sorted(manifest["files"].items()):
+            if "sha256" in entry:
+                groups.setdefault((entry["sha256"], entry.get("mode")), []).append((dest / key, entry))
+
+    result = {"hardlinked": 0, "reflinked": 0, "bytes_saved": 0, "inodes_saved": 0}
+    for copies in groups.values():
+        (first, first_entry), rest = copies[0], copies[1:]
+        if not rest:
+            continue
+        try:
+            first_st = first.stat()
+        except OSError:
+            continue
+        for path, entry in rest:
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if st.st_ino == first_st.st_ino and st.st_dev == first_st.st_dev:
+                continue
+            if mode == "reflink" and _reflink(first, path):
+                result["reflinked"] += 1
+                result["bytes_saved"] += st.st_size
+            elif _hardlink(first, path):
+                result["hardlinked"] += 1
+                result["inodes_saved"] += 1
+                result["bytes_saved"] += st.st_size
+                entry["mtime"] = first_entry["mtime"]
+
+    print(f"✅ Deduplicated: {result['hardlinked']} hard links, {result['reflinked']} reflinks, "
+          f"{result['bytes_saved']} bytes and {result['inodes_saved']} inodes saved")
+    return result
+
+
+# --- integrity check ---
+
+def _hash_files(paths: List[str]) -> List[Optional[str]]:
+    """sha256 of each file (None if it cannot be read); runs in the worker processes of verify()."""
+    digests = []
+    for path in paths:
+        try:
+            digests.append(_file_sha256(Path(path)))
+        except OSError:
+            digests.append(None)
+    return digests
+
+
+def archive_manifest(archive: Path, dest: Path) -> dict:
+    """Manifest of what `archive` installs into dest, read from the archive without extracting.
+
+    Variants of a lazy install into dest that are not extracted yet are left out.
+    """
+    lazy = set()
+    try:
+        index = json.loads(index_path(archive).read_text(encoding="utf-8"))
+        if index.get("dest") == str(dest):
+            lazy = {v for v in index["variants"] if not (dest / v).is_dir()}
+    except (OSError, ValueError, KeyError):
+        pass
+    files = {}
+    dirs = []
+    with open_archive(archive) as fileobj, tarfile.open(fileobj=fileobj, mode="r|") as tar:
+        for member in _stream_members(tar):
+            key = _member_key(member.name)
+            if variant_of(key) in lazy:
+                continue
+            if member.isdir():
+                dirs.append(key)
+            elif member.isfile():
+                digest = hashlib.sha256()
+                source = tar.extractfile(member)
+                for chunk in iter(lambda: source.read(1 << 20), b""):
+                    digest.update(chunk)
+                files[key] = {"size": member.size, "mtime": int(member.mtime), "mode": member.mode & 0o7777,
+                              "sha256": digest.hexdigest()}
+            elif member.islnk():
+                files[key] = dict(files[_member_key(member.linkname)])
+            else:
+                files[key] = {"size": 0, "mtime": int(member.mtime), "link": member.linkname}
+    _profiler.count("files_read")
+    _profiler.count("bytes_read", archive.stat().st_size)
+    return {"version": MANIFEST_VERSION, "archive": archive.name, "dest": str(dest),
+            "files": files, "dirs": sorted(set(dirs) - {""})}
+
+
+def verify(reference: dict, workers: Optional[int] = None) -> dict:
+    """Compare the tree installed in reference["dest"] with a manifest.
+
+    Files whose size or mode differ are modified without reading them; the
+    others are hashed in a process pool, each inode once (deduplicated
+    variants share most of their files). Files below the top directories of
+    the manifest that it does not list are extra. Returns the sorted keys
+    of the missing, modified and extra files and the number checked.
+    """
+    import stat
+
+    dest = Path(reference["dest"])
+    files = reference["files"]
+    missing, modified = [], []
+    inodes = {}  # (dev, ino) -> (path to hash, size)
+    expected = {}  # key -> ((dev, ino), sha256)
+    for key, entry in files.items():
+        try:
+            st = os.lstat(dest / key)
+        except OSError:
+            missing.append(key)
+            continue
+        if "link" in entry:
+            if not stat.S_ISLNK(st.st_mode) or os.readlink(dest / key) != entry["link"]:
+                modified.append(key)
+        elif not stat.S_ISREG(st.st_mode) or st.st_size != entry["size"] \
+                or ("mode" in entry and st.st_mode & 0o7777 != entry["mode"]):
+            modified.append(key)
+        else:
+            inode = (st.st_dev, st.st_ino)
+            inodes.setdefault(inode, (str(dest / key), st.st_size))
+            expected[key] = (inode, entry["sha256"])
+
+    # largest files first, dealt out round-robin: chunks of about the same size
+    paths = [path for path, _size in sorted(inodes.values(), key=lambda item: -item[1])]
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i::workers * 4] for i in range(min(len(paths), workers * 4))]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_hash_files, chunks))
+    else:
+        results = [_hash_files(chunk) for chunk in chunks]
+    digests = {path: digest for chunk, result in zip(chunks, results) for path, digest in zip(chunk, result)}
+    _profiler.count("files_read", len(paths))
+    _profiler.count("bytes_read", sum(size for _path, size in inodes.values()))
+    for key, (inode, sha256) in expected.items():
+        if digests[inodes[inode][0]] != sha256:
+            modified.append(key)
+
+    known = set(files) | set(reference.get("dirs", []))
+    extra = []
+    for root in sorted({key.split("/", 1)[0] for key in files}):
+        for dirpath, dirnames, filenames in os.walk(dest / root):
+            rel = Path(dirpath).relative_to(dest).as_posix()
+            _profiler.count("entries_scanned", len(dirnames) + len(filenames))
+            for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+                if f"{rel}/{name}" not in known:
+                    extra.append(f"{rel}/{name}")
+    return {"checked": len(files), "hashed": len(paths), "missing": sorted(missing),
+            "modified": sorted(modified), "extra": sorted(extra)}
+
+
+def repair(archive: Path, reference: dict, result: dict, workers: Optional[int] = None) -> dict:
+    """Restore the missing and modified files found by verify() from `archive` and delete the extra ones.
+
+    Only those files are written. Returns the manifest entries of the restored files.
+    """
+    dest = Path(reference["dest"])
+    for key in result["extra"]:
+        try:
+            (dest / key).unlink()
+        except OSError as e:
+            print(f"⚠ Cannot remove {dest / key}: {e}")
+    wanted = set(result["missing"]) | set(result["modified"])
+    if not wanted:
+        return {}
+    for key in wanted:
+        # a modified symlink or a directory in the way of a file: extraction replaces files only
+        path = dest / key
+        if path.is_symlink() or not path.exists():
+            path.unlink(missing_ok=True)
+        elif path.is_dir():
+            import shutil
+            shutil.rmtree(path)
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as writers:
+        restored = _extract_stream(archive, dest, writers, workers, select=lambda key: key in wanted)
+    return restored["files"]
+
+
+def verify_installed(jobs: List[Tuple[Path, Path]], source: str = "manifest", fix: bool = False,
+                     workers: Optional[int] = None) -> int:
+    """--verify/--repair for (archive, dest) pairs; returns the exit status.
+
+    `source` "manifest" checks against the manifest of the last install
+    (the archive when there is none), "archive" against the archive itself.
+    """
+    status = 0
+    for archive, dest in jobs:
+        start = time.perf_counter()
+        manifest = load_manifest(archive, dest)
+        with _profiler.phase(f"verify {archive.name}"):
+            try:
+                if source == "manifest" and manifest is not None:
+                    reference = manifest
+                else:
+                    reference = archive_manifest(archive, dest)
+            except (OSError, EOFError, KeyError, lzma.LZMAError, tarfile.TarError) as e:
+                print(f"❌ Cannot verify {dest}: no manifest and no readable archive {archive} ({e})")
+                status = 1
+                continue
+            result = verify(reference, workers)
+        problems = len(result["missing"]) + len(result["modified"]) + len(result["extra"])
+        print(f"{'❌' if problems else '✅'} Verified: {archive.name} -> {dest} in {time.perf_counter() - start:.2f} s "
+              f"({result['checked']} files, {len(result['missing'])} missing, {len(result['modified'])} modified, "
+              f"{len(result['extra'])} extra)")
+        for kind in ("missing", "modified", "extra"):
+            for key in result[kind][:20]:
+                print(f"   {kind}: {key}")
+            if len(result[kind]) > 20:
+                print(f"   … {len(result[kind]) - 20} more {kind}")
+        if not problems:
+            continue
+        if not fix:
+            status = 1
+            continue
+        try:
+            with _profiler.phase(f"repair {archive.name}"):
+                restored = repair(archive, reference, result, workers)
+        except (OSError, EOFError, lzma.LZMAError, tarfile.TarError) as e:
+            print(f"❌ Cannot repair {dest} from {archive}: {e}")
+            status = 1
+            continue
+        if manifest is not None:
+            manifest["files"].update(restored)
+            save_manifest(archive, manifest)
+        print(f"🔧 Repaired: {len(restored)} files restored, {len(result['extra'])} extra files removed")
+    return status
+
+
 def confirm_install(assume_yes: bool = False) -> bool:
     """Confirm installation.
 
@@ -80,10 +1660,14 @@ def confirm_install(assume_yes: bool = False) -> bool:
 
 
 def clean_existing(theme_base: Path, ext_base: Path) -> None:
-    """Remove only the exact target directories requested by the user."""
-    import shutil
-    shutil.rmtree(theme_base / "semabe", ignore_errors=True)
-    shutil.rmtree(ext_base / "semabe-theme-selector@sewbej", ignore_errors=True)
+    """Remove only the exact target directories requested by the user.
+
+    The directories are renamed aside at once and deleted by a background process.
+    """
+    with _profiler.phase("clean_existing"):
+        for path in (theme_base / "semabe", ext_base / "semabe-theme-selector@sewbej"):
+            if path.exists():
+                _remove_in_background(_move_aside(path))
 
 
 def _which(cmd: str) -> Optional[str]:
@@ -96,12 +1680,66 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Semabe theme selector installer")
     parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
     parser.add_argument("-y", "--yes", action="store_true", help="do not ask for confirmation (non-interactive)")
+    parser.add_argument("--jobs", type=int, default=None, help="number of decode/write workers (default: CPU count)")
+    parser.add_argument("--serial", action="store_true", help="extract archives one after another in a single thread")
+    parser.add_argument("--benchmark", action="store_true", help="compare serial and parallel extraction and exit")
+    parser.add_argument("--full", action="store_true", help="remove the installed files and extract everything again")
+    parser.add_argument("--lazy", action="store_true",
+                        help="extract only the selected theme variant; others are added on first use")
+    parser.add_argument("--materialize", nargs="+", metavar="VARIANT",
+                        help="extract variants (e.g. 'semabe/legacy/Semabe Grey Opaque (legacy)') of a lazy install")
+    parser.add_argument("--dedupe", nargs="?", const="hardlink", choices=["hardlink", "reflink"],
+                        help="store identical theme files once (hard links, or reflinks where supported)")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="write a JSON trace of the install phases "
+                             "(default: ~/.cache/semabe/traces; or set SEMABE_PROFILE)")
+    parser.add_argument("--verify", nargs="?", const="manifest", choices=["manifest", "archive"],
+                        help="check the installed files against the stored manifest (default) or the archive")
+    parser.add_argument("--repair", action="store_true",
+                        help="with --verify: restore missing and modified files and delete extra ones")
     args = parser.parse_args()
 
     if args.run_tests:
         return run_tests()
 
-    if not confirm_install(assume_yes=args.yes):
+    global _profiler
+    _profiler = _Profiler(trace_path(args.profile if args.profile is not None else os.environ.get("SEMABE_PROFILE")))
+    try:
+        return install(args)
+    finally:
+        _profiler.write()
+        _profiler = _Profiler()
+
+
+def install(args: argparse.Namespace) -> int:
+    """The install run of main() for the parsed command line."""
+    if args.materialize:
+        try:
+            with _profiler.phase("materialize"):
+                materialize(args.materialize)
+        except (OSError, KeyError, ValueError, lzma.LZMAError, tarfile.TarError) as e:
+            print(f"❌ Cannot materialize {args.materialize}: {e}")
+            return 1
+        return 0
+
+    if args.verify or args.repair:
+        cwd = Path(__file__).resolve().parent
+        # a lazy install keeps its own copy of the theme archive
+        jobs = [(archive if archive.exists() or not (STATE_DIR / archive.name).exists() else STATE_DIR / archive.name,
+                 dest)
+                for archive, dest in ((find_archive(cwd, THEME_ARCHIVE), THEMES_DIR),
+                                      (find_archive(cwd, EXT_ARCHIVE), EXT_DIR))]
+        return verify_installed(jobs, args.verify or "manifest", args.repair, args.jobs)
+
+    if args.benchmark:
+        cwd = Path(__file__).resolve().parent
+        benchmark_extract([(find_archive(cwd, THEME_ARCHIVE), THEMES_DIR),
+                           (find_archive(cwd, EXT_ARCHIVE), EXT_DIR)], args.jobs)
+        return 0
+
+    with _profiler.phase("confirm_install"):
+        confirmed = confirm_install(assume_yes=args.yes)
+    if not confirmed:
         print("Cancelled.")
         if _which("zenity"):
             subprocess.run([
@@ -116,8 +1754,8 @@ def main() -> int:
 
     cwd = Path(__file__).resolve().parent
 
-    theme_archive_path = cwd / THEME_ARCHIVE
-    ext_archive_path = cwd / EXT_ARCHIVE
+    theme_archive_path = find_archive(cwd, THEME_ARCHIVE)
+    ext_archive_path = find_archive(cwd, EXT_ARCHIVE)
 
     # missing files handling (single popup for one or both)
     missing = []
@@ -140,59 +1778,81 @@ def main() -> int:
             ])
         return 1
 
-    # Installing dialog (non-blocking); no CANCEL; if no Zenity – no dialog
+    # progress dialog (non-blocking, no CANCEL); without Zenity progress goes to stdout
     zenity = _which("zenity")
-    installing = None
-    if zenity:
-        try:
-            installing = subprocess.Popen([
-                zenity,
-                "--info",
-                "--width=450",
-                "--no-wrap",
-                "--title=Semabe theme selector installer",
-                "--text=\n\ninstalling...          ",
-            ])
-            # short pause so the window can render; does not block process
-            try:
-                installing.wait(timeout=0.1)
-            except subprocess.TimeoutExpired:
-                pass
-        except Exception as e:
-            print(f"ℹ Could not show installing dialog: {e}")
-            installing = None
+    with _profiler.phase("progress_dialog"):
+        progress = Progress([theme_archive_path, ext_archive_path], zenity, out=None if zenity else sys.stdout)
 
     # ensure target directories exist
     THEMES_DIR.mkdir(parents=True, exist_ok=True)
     EXT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # remove existing target directories before unpacking
-    clean_existing(THEMES_DIR, EXT_DIR)
+    jobs = [(theme_archive_path, THEMES_DIR), (ext_archive_path, EXT_DIR)]
 
-    # unpack
-    extract(theme_archive_path, THEMES_DIR)
-    extract(ext_archive_path, EXT_DIR)
+    # with manifests of the last install only the delta is written, otherwise
+    # the archives are unpacked into staging directories and swapped into place
+    previous = {}
+    if not (args.full or args.serial or args.lazy):
+        with _profiler.phase("load_manifests"):
+            previous = {archive: load_manifest(archive, dest) for archive, dest in jobs}
+    # no manifests loaded (--full, --serial, --lazy) is not "all manifests present"
+    delta = len(previous) == len(jobs) and None not in previous.values()
 
-    # close installing dialog (if present)
-    if installing is not None:
-        try:
-            installing.terminate()
-        except Exception:
-            pass
+    try:
+        # unpack
+        if delta:
+            with _profiler.phase("extract_parallel"):
+                manifests = extract_parallel(jobs, args.jobs, previous, progress)
+        else:
+            lazy = {theme_archive_path: _current_variants()} if args.lazy else None
+            with _profiler.phase("install_staged"):
+                manifests = install_staged(jobs, args.jobs, serial=args.serial, lazy=lazy,
+                                           progress=progress)
+
+        if args.dedupe:
+            with _profiler.phase("dedupe"):
+                dedupe([
+                    manifests.get(archive) or manifest_from_tree(dest, root, args.jobs)
+                    for (archive, dest), root in zip(jobs, ("semabe", "semabe-theme-selector@sewbej"))
+                ], args.dedupe)
+
+        with _profiler.phase("save_manifests"):
+            for archive, manifest in manifests.items():
+                save_manifest(archive, manifest)
+
+        with _profiler.phase("write_catalog"):
+            write_catalog(theme_archive_path, THEMES_DIR)
+    except (UnsafeMemberError, tarfile.TarError, lzma.LZMAError, EOFError) as e:
+        msg = f"Installation failed, the archive cannot be installed:\n{e}"
+        print(f"❌ {msg}")
+        if zenity:
+            subprocess.run([
+                zenity,
+                "--error",
+                "--width=450",
+                "--no-wrap",
+                "--title=Semabe theme selector installer",
+                f"--text={msg}"
+            ])
+        return 1
+    finally:
+        # the dialog closes itself at 100 %
+        progress.close()
 
     print("✔ Installation finished!")
 
     # final OK dialog (if Zenity available)
     if zenity:
-        subprocess.run([
-            zenity,
-            "--info",
-            "--width=450",
-            "--no-wrap",
-            "--title=Semabe theme selector installer",
-            "--text=Installation finished successfully.\n\nNow enable the SEMABE THEME SELECTOR extension in your system settings.",
-            "--ok-label=OK",
-        ])
+        with _profiler.phase("finished_dialog"):
+            subprocess.run([
+                zenity,
+                "--info",
+                "--width=450",
+                "--no-wrap",
+                "--title=Semabe theme selector installer",
+                "--text=Installation finished successfully.\n\nNow enable the SEMABE THEME SELECTOR extension in your system settings.",
+                "--ok-label=OK",
+            ])
 
     return 0
 
@@ -200,7 +1860,7 @@ def main() -> int:
 # --- basic tests ---
 
 def run_tests() -> int:
-    """Basic tests for extract(), confirm_install(), and cleaning.
+    """Basic tests for extract(), extract_parallel(), confirm_install(), and cleaning.
     These tests use temporary directories and do NOT modify real user files.
     Return 0 on success, non‑zero on failure.
     """
@@ -226,12 +1886,290 @@ def run_tests() -> int:
             print("❌ TEST: extract() – file not extracted")
             failures += 1
 
-        # 4) confirm_install – should accept assume_yes=True without interaction
+        # 2) extract_parallel – same tree as extract(), also for multi-block xz
+        for i in range(40):
+            (src_dir / "SemabeTest" / f"sub{i % 4}" / f"f{i}.css").parent.mkdir(exist_ok=True)
+            (src_dir / "SemabeTest" / f"sub{i % 4}" / f"f{i}.css").write_bytes(os.urandom(4096))
+        (src_dir / "SemabeTest" / "link.css").symlink_to("sub0/f0.css")
+        big_tar = tmp_path / "big.tar"
+        with tarfile.open(big_tar, "w") as tar:
+            tar.add(src_dir / "SemabeTest", arcname="SemabeTest")
+        archives = [tmp_path / "single.tar.xz"]
+        archives[0].write_bytes(lzma.compress(big_tar.read_bytes()))
+        xz = _which("xz")
+        if xz:
+            subprocess.run([xz, "-k", "-T2", "--block-size=32KiB", str(big_tar)], check=True)
+            archives.append(tmp_path / "big.tar.xz")
+            blocks = _xz_blocks(archives[1])
+            if not blocks or len(blocks) < 2:
+                print("❌ TEST: _xz_blocks() – multi-block archive not recognised")
+                failures += 1
+
+        for archive in archives:
+            serial_dir = tmp_path / f"serial_{archive.name}"
+            parallel_dir = tmp_path / f"parallel_{archive.name}"
+            extract(archive, serial_dir)
+            extract_parallel([(archive, parallel_dir), (theme_tar, parallel_dir / "second")], workers=4)
+            serial_files = sorted(p.relative_to(serial_dir) for p in serial_dir.rglob("*"))
+            parallel_files = sorted(p.relative_to(parallel_dir) for p in parallel_dir.rglob("*") if "second" not in p.parts)
+            if serial_files != parallel_files or any(
+                (serial_dir / p).read_bytes() != (parallel_dir / p).read_bytes()
+                for p in serial_files if (serial_dir / p).is_file()
+            ):
+                print(f"❌ TEST: extract_parallel({archive.name}) – tree differs from extract()")
+                failures += 1
+            if not (parallel_dir / "second" / "SemabeTest" / "dummy.txt").exists():
+                print("❌ TEST: extract_parallel() – second archive not extracted")
+                failures += 1
+
+        # 3) extract_parallel – refuses members outside the destination
+        evil_tar = tmp_path / "evil.tar.xz"
+        with tarfile.open(evil_tar, "w:xz") as tar:
+            tar.add(src_dir / "SemabeTest" / "dummy.txt", arcname="../evil.txt")
+        try:
+            extract_parallel([(evil_tar, tmp_path / "evil_out")])
+            print("❌ TEST: extract_parallel() – unsafe member was not rejected")
+            failures += 1
+        except UnsafeMemberError:
+            pass
+        if (tmp_path / "evil.txt").exists():
+            print("❌ TEST: extract_parallel() – file written outside destination")
+            failures += 1
+        # a symlink out of dest, then a file written through it; extract() checks too
+        link_tar = tmp_path / "evil-link.tar"
+        with tarfile.open(link_tar, "w") as tar:
+            info = tarfile.TarInfo("SemabeTest/out")
+            info.type, info.linkname = tarfile.SYMTYPE, "../../.."
+            tar.addfile(info)
+            info = tarfile.TarInfo("SemabeTest/out/evil-link.txt")
+            tar.addfile(info, io.BytesIO(b""))
+        for label, run in (("extract", extract), ("extract_parallel", lambda a, d: extract_parallel([(a, d)]))):
+            try:
+                run(link_tar, tmp_path / "evil_link_out" / label)
+                print(f"❌ TEST: {label}() – symlink out of the destination was not rejected")
+                failures += 1
+            except UnsafeMemberError:
+                pass
+        if (tmp_path / "evil-link.txt").exists() or (tmp_path / "evil_link_out" / "extract" / "SemabeTest" / "out").exists():
+            print("❌ TEST: extract() – symlink out of the destination was created")
+            failures += 1
+        # a chain of links that each stay inside on paper: a/b -> .., a/b/c -> .. leads out on disk
+        chain_tar = tmp_path / "evil-chain.tar"
+        with tarfile.open(chain_tar, "w") as tar:
+            for name in ("a/b", "a/b/c", "a/b/c/d"):
+                info = tarfile.TarInfo(name)
+                info.type, info.linkname = tarfile.SYMTYPE, ".."
+                tar.addfile(info)
+            info = tarfile.TarInfo("a/b/c/d/PWNED")
+            info.size = 1
+            tar.addfile(info, io.BytesIO(b"x"))
+        for label, run in (("extract", extract), ("extract_parallel", lambda a, d: extract_parallel([(a, d)]))):
+            try:
+                run(chain_tar, tmp_path / "evil_chain_out" / label / "dest")
+                print(f"❌ TEST: {label}() – chain of links out of the destination was not rejected")
+                failures += 1
+            except UnsafeMemberError:
+                pass
+        # the installer itself, on every extraction path: a clean error, nothing written
+        evil_dir = tmp_path / "evil_install"
+        evil_dir.mkdir()
+        import shutil
+        shutil.copyfile(chain_tar, evil_dir / "semabe.tar")
+        with tarfile.open(evil_dir / "semabe-theme-selector@sewbej.tar", "w") as tar:
+            tar.add(src_dir / "SemabeTest", arcname="semabe-theme-selector@sewbej")
+        shutil.copyfile(__file__, evil_dir / "install.py")
+        for flags in ([], ["--lazy"], ["--serial"]):
+            home = tmp_path / "evil_home" / "-".join(flags or ["default"])
+            home.mkdir(parents=True)
+            run = subprocess.run([sys.executable, str(evil_dir / "install.py"), "-y", *flags],
+                                 capture_output=True, text=True, env={**os.environ, "HOME": str(home), "PATH": ""})
+            if run.returncode != 1 or "Traceback" in run.stderr or "❌ Installation failed" not in run.stdout:
+                print(f"❌ TEST: install.py -y {' '.join(flags)} – unsafe archive: {run.returncode} {run.stderr[-300:]}")
+                failures += 1
+        if list(tmp_path.rglob("PWNED")):
+            print(f"❌ TEST: extract() – file written through a chain of links: {list(tmp_path.rglob('PWNED'))}")
+            failures += 1
+
+        # 4) delta install – only changed files are written, removed ones deleted
+        delta_src = tmp_path / "delta_src" / "semabe"
+        delta_src.mkdir(parents=True)
+        (delta_src / "keep.css").write_text("keep")
+        (delta_src / "change.css").write_text("old")
+        (delta_src / "gone.css").write_text("gone")
+        delta_tar = tmp_path / "delta.tar.xz"
+        with tarfile.open(delta_tar, "w:xz") as tar:
+            tar.add(delta_src, arcname="semabe")
+        delta_out = tmp_path / "delta_out"
+        first = extract_parallel([(delta_tar, delta_out)])[delta_tar]
+        (delta_src / "change.css").write_text("new")
+        (delta_src / "gone.css").unlink()
+        (delta_src / "added.css").write_text("added")
+        with tarfile.open(delta_tar, "w:xz") as tar:
+            tar.add(delta_src, arcname="semabe")
+        keep_ctime = (delta_out / "semabe" / "keep.css").stat().st_ctime_ns
+        time.sleep(0.05)
+        second = extract_parallel([(delta_tar, delta_out)], previous={delta_tar: first})[delta_tar]
+        if (delta_out / "semabe" / "keep.css").stat().st_ctime_ns != keep_ctime:
+            print("❌ TEST: delta install – unchanged file was rewritten")
+            failures += 1
+        if (delta_out / "semabe" / "change.css").read_text() != "new" or \
+                (delta_out / "semabe" / "added.css").read_text() != "added":
+            print("❌ TEST: delta install – changed/added files not written")
+            failures += 1
+        if (delta_out / "semabe" / "gone.css").exists() or "semabe/gone.css" in second["files"]:
+            print("❌ TEST: delta install – removed file still present")
+            failures += 1
+
+        # 5) dedupe – identical files end up sharing one inode, updates do not leak
+        dup_src = tmp_path / "dup_src" / "semabe"
+        for variant in ("A", "B", "C"):
+            (dup_src / variant).mkdir(parents=True)
+            (dup_src / variant / "shared.png").write_bytes(b"png" * 100)
+            (dup_src / variant / "own.css").write_text(variant)
+        dup_tar = tmp_path / "dup.tar.xz"
+        with tarfile.open(dup_tar, "w:xz") as tar:
+            tar.add(dup_src, arcname="semabe")
+        dup_out = tmp_path / "dup_out"
+        dup_manifest = extract_parallel([(dup_tar, dup_out)])[dup_tar]
+        stats = dedupe([dup_manifest])
+        inodes = {(dup_out / "semabe" / v / "shared.png").stat().st_ino for v in "ABC"}
+        if len(inodes) != 1 or stats["inodes_saved"] != 2:
+            print("❌ TEST: dedupe() – identical files were not linked")
+            failures += 1
+        if len({(dup_out / "semabe" / v / "own.css").stat().st_ino for v in "ABC"}) != 3:
+            print("❌ TEST: dedupe() – different files were linked")
+            failures += 1
+        (dup_src / "A" / "shared.png").write_bytes(b"new")
+        with tarfile.open(dup_tar, "w:xz") as tar:
+            tar.add(dup_src, arcname="semabe")
+        extract_parallel([(dup_tar, dup_out)], previous={dup_tar: dup_manifest})
+        if (dup_out / "semabe" / "B" / "shared.png").read_bytes() != b"png" * 100:
+            print("❌ TEST: dedupe() – update of one copy changed its hard links")
+            failures += 1
+
+        # 6) lazy install – one variant up front, another one materialized later
+        lazy_src = tmp_path / "lazy_src" / "semabe"
+        for variant in ("Semabe Grey Opaque (legacy)", "Semabe Mint Glassy (legacy)"):
+            (lazy_src / "legacy" / variant / "gtk-3.0").mkdir(parents=True)
+            (lazy_src / "legacy" / variant / "gtk-3.0" / "gtk.css").write_text(variant * 300)
+        (lazy_src / "symbolic icons").mkdir()
+        (lazy_src / "symbolic icons" / "core.svg").write_text("core")
+        lazy_tar = tmp_path / "semabe.tar.xz"
+        with tarfile.open(lazy_tar, "w:xz") as tar:
+            tar.add(lazy_src, arcname="semabe")
+        lazy_out = tmp_path / "lazy_out"
+        global STATE_DIR
+        saved_state_dir, STATE_DIR = STATE_DIR, tmp_path / "state"
+        try:
+            save_manifest(lazy_tar, install_lazy(lazy_tar, lazy_out, ["semabe/legacy/Semabe Grey Opaque (legacy)"]))
+            if (lazy_out / "semabe/legacy/Semabe Mint Glassy (legacy)").exists() or \
+                    not (lazy_out / "semabe/symbolic icons/core.svg").exists():
+                print("❌ TEST: install_lazy() – wrong set of files extracted")
+                failures += 1
+            catalog = write_catalog(lazy_tar, lazy_out)
+            grey = catalog["paths"][catalog["variants"]["legacy|L|G|Grey|Opaque"]]
+            mint = catalog["paths"][catalog["variants"]["legacy|L|R|Mint|Glassy"]]
+            if grey["lazy"] or not mint["lazy"] or mint["toolkits"] != ["gtk-3.0"] \
+                    or catalog["sizes"] != {"legacy": ["L"]}:
+                print(f"❌ TEST: write_catalog() – lazy variants not listed: {catalog['paths']}")
+                failures += 1
+            materialize(["semabe/legacy/Semabe Mint Glassy (legacy)"], lazy_tar.name)
+            css = lazy_out / "semabe/legacy/Semabe Mint Glassy (legacy)/gtk-3.0/gtk.css"
+            if not css.exists() or css.read_text() != "Semabe Mint Glassy (legacy)" * 300:
+                print("❌ TEST: materialize() – variant not extracted")
+                failures += 1
+            if "semabe/legacy/Semabe Mint Glassy (legacy)/gtk-3.0/gtk.css" not in \
+                    load_manifest(lazy_tar, lazy_out)["files"]:
+                print("❌ TEST: materialize() – manifest not updated")
+                failures += 1
+            if any(entry["lazy"] for entry in load_catalog()["paths"]):
+                print("❌ TEST: materialize() – catalog still lists the variant as lazy")
+                failures += 1
+        finally:
+            STATE_DIR = saved_state_dir
+
+        # 7) other formats and hard link entries – detected by content, links installed
+        link_src = tmp_path / "link_src" / "semabe" / "legacy"
+        for variant in ("Semabe Grey Opaque (legacy)", "Semabe Mint Glassy (legacy)"):
+            (link_src / variant / "assets").mkdir(parents=True)
+            (link_src / variant / "assets" / "check.png").write_bytes(b"same" * 50)
+        link_tar = tmp_path / "link.tar"
+        with tarfile.open(link_tar, "w") as tar:
+            tar.add(link_src.parent, arcname="semabe")
+            info = tar.gettarinfo(link_src / "Semabe Grey Opaque (legacy)/assets/check.png",
+                                  arcname="semabe/legacy/Semabe Mint Glassy (legacy)/assets/copy.png")
+            info.type, info.linkname, info.size = tarfile.LNKTYPE, \
+                "semabe/legacy/Semabe Grey Opaque (legacy)/assets/check.png", 0
+            tar.addfile(info)
+        formats = {"semabe.tar.xz": lzma.compress, "semabe.tar.gz": lambda d: gzip.compress(d, mtime=0)}
+        if _which("zstd"):
+            formats["semabe.tar.zst"] = lambda d: subprocess.run(
+                [_which("zstd"), "-q", "-c"], input=d, capture_output=True, check=True).stdout
+        for name, compress in formats.items():
+            fmt_dir = tmp_path / f"fmt_{name}"
+            fmt_dir.mkdir()
+            archive = fmt_dir / name
+            archive.write_bytes(compress(link_tar.read_bytes()))
+            if find_archive(fmt_dir, THEME_ARCHIVE) != archive or archive_format(archive) != name.rsplit(".", 1)[1]:
+                print(f"❌ TEST: find_archive() – {name} not detected")
+                failures += 1
+            out = fmt_dir / "out"
+            manifest = extract_parallel([(archive, out)])[archive]
+            copy = out / "semabe/legacy/Semabe Mint Glassy (legacy)/assets/copy.png"
+            if not copy.is_file() or copy.read_bytes() != b"same" * 50 or copy.stat().st_nlink != 2:
+                print(f"❌ TEST: extract_parallel({name}) – hard link entry not installed")
+                failures += 1
+            if manifest["files"]["semabe/legacy/Semabe Mint Glassy (legacy)/assets/copy.png"].get("sha256") is None:
+                print(f"❌ TEST: extract_parallel({name}) – hard link missing from the manifest")
+                failures += 1
+            extract(archive, fmt_dir / "serial")
+            if not (fmt_dir / "serial/semabe/legacy/Semabe Mint Glassy (legacy)/assets/copy.png").is_file():
+                print(f"❌ TEST: extract({name}) – not extracted")
+                failures += 1
+        saved_state_dir, STATE_DIR = STATE_DIR, tmp_path / "link_state"
+        try:
+            lazy_link_tar = tmp_path / "lazy_link" / THEME_ARCHIVE
+            lazy_link_tar.parent.mkdir()
+            lazy_link_tar.write_bytes(lzma.compress(link_tar.read_bytes()))
+            lazy_link_out = tmp_path / "lazy_link_out"
+            save_manifest(lazy_link_tar, install_lazy(
+                lazy_link_tar, lazy_link_out, ["semabe/legacy/Semabe Mint Glassy (legacy)"]))
+            materialize(["semabe/legacy/Semabe Grey Opaque (legacy)"])
+            for name in ("Semabe Mint Glassy (legacy)/assets/copy.png", "Semabe Grey Opaque (legacy)/assets/check.png"):
+                if (lazy_link_out / "semabe/legacy" / name).read_bytes() != b"same" * 50:
+                    print(f"❌ TEST: install_lazy() – hard link target outside the variant: {name}")
+                    failures += 1
+        finally:
+            STATE_DIR = saved_state_dir
+
+        # 8) confirm_install – should accept assume_yes=True without interaction
         if not confirm_install(assume_yes=True):
             print("❌ TEST: confirm_install(assume_yes=True) should return True")
             failures += 1
 
-        # 5) clean_existing – removes only specified directories
+        # 9) install_staged – old tree replaced in one swap, nothing else touched
+        staged_root = tmp_path / "staged"
+        (staged_root / "SemabeTest").mkdir(parents=True)
+        (staged_root / "SemabeTest" / "old.css").write_text("old")
+        (staged_root / "other-theme").mkdir()
+        manifests = install_staged([(theme_tar, staged_root)])
+        if (staged_root / "SemabeTest" / "old.css").exists() or \
+                not (staged_root / "SemabeTest" / "dummy.txt").exists():
+            print("❌ TEST: install_staged() – archive root not swapped in")
+            failures += 1
+        if not (staged_root / "other-theme").exists() or any(p.name.startswith(".semabe-staging") for p in staged_root.iterdir()):
+            print("❌ TEST: install_staged() – unrelated or staging directories left behind")
+            failures += 1
+        if manifests[theme_tar]["dest"] != str(staged_root):
+            print("❌ TEST: install_staged() – manifest points at the staging directory")
+            failures += 1
+        (staged_root / "SemabeTest" / "stale.txt").write_text("stale")
+        install_staged([(theme_tar, staged_root)])
+        if (staged_root / "SemabeTest" / "stale.txt").exists():
+            print("❌ TEST: install_staged() – previous tree not replaced")
+            failures += 1
+
+        # 10) clean_existing – removes only specified directories
         themes_root = tmp_path / "themes"
         exts_root = tmp_path / "exts"
         (themes_root / "semabe").mkdir(parents=True)
@@ -246,6 +2184,174 @@ def run_tests() -> int:
             print("❌ TEST: clean_existing – too many directories removed")
             failures += 1
 
+        # 11) --profile: phases and counts of an install in the shared trace schema
+        global _profiler
+        trace_file = tmp_path / "traces" / "install.json"
+        _profiler = _Profiler(trace_file)
+        try:
+            with _profiler.phase("install_staged"):
+                install_staged([(theme_tar, tmp_path / "traced")])
+            _profiler.write()
+        finally:
+            _profiler = _Profiler()
+        try:
+            trace = json.loads(trace_file.read_text())
+            phases = {p["name"]: p for p in trace["phases"]}
+            if trace["schema"] != TRACE_SCHEMA or set(trace["total"]) < set(TRACE_COUNTS) \
+                    or phases["install_staged"]["files_written"] != 1 \
+                    or phases["extract theme.tar.xz"]["entries_scanned"] != 2 \
+                    or phases["install_staged"]["wall_s"] < phases["extract theme.tar.xz"]["wall_s"]:
+                print(f"❌ TEST: --profile – unexpected trace: {trace}")
+                failures += 1
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ TEST: --profile – no trace: {e}")
+            failures += 1
+        if trace_path(str(tmp_path)).parent != tmp_path or trace_path(None) is not None \
+                or trace_path("").parent != Path.home() / ".cache" / "semabe" / "traces":
+            print("❌ TEST: trace_path() – unexpected locations")
+            failures += 1
+
+        # 12) streaming extraction: members are not kept, progress reaches the end of the stream
+        stream_tar = tmp_path / "stream.tar"
+        with tarfile.open(stream_tar, "w") as tar:
+            for i in range(300):
+                info = tarfile.TarInfo(f"SemabeTest/s{i % 3}/f{i}.css")
+                info.size = 100
+                tar.addfile(info, io.BytesIO(bytes(100)))
+        stream_xz = tmp_path / "stream.tar.xz"
+        stream_xz.write_bytes(lzma.compress(stream_tar.read_bytes()))
+        kept = []
+        real_members = _stream_members
+
+        def watched(tar):
+            for member in real_members(tar):
+                kept.append(len(tar.members))
+                yield member
+        globals()["_stream_members"] = watched
+        out = io.StringIO()
+        progress = Progress([stream_tar, stream_xz], out=out)
+        progress.INTERVAL = 0
+        try:
+            extract(stream_tar, tmp_path / "stream_serial", progress)
+            extract_parallel([(stream_xz, tmp_path / "stream_parallel")], progress=progress)
+        finally:
+            globals()["_stream_members"] = real_members
+        progress.close()
+        if max(kept, default=1) != 0 or len(kept) != 600:
+            print(f"❌ TEST: _stream_members() – tar.members kept {max(kept, default=None)} members")
+            failures += 1
+        last = out.getvalue().splitlines()[-1] if out.getvalue() else ""
+        if progress.members != {stream_tar: 300, stream_xz: 300} or progress.percent() != 100 \
+                or not last.startswith("⏳ 100% ") or " 600 files" not in last:
+            print(f"❌ TEST: Progress – {progress.members}, {progress.percent()}%, {last!r}")
+            failures += 1
+        if len(list((tmp_path / "stream_parallel" / "SemabeTest").rglob("*.css"))) != 300:
+            print("❌ TEST: extract_parallel() – streamed files missing")
+            failures += 1
+
+        # 13) variant catalog – settings keys of every theme layout, sizes and toolkits
+        keys = {
+            "semabe/legacy/Semabe Grey Opaque (legacy)": 4,
+            "semabe/macOS/small/Semabe Grey Opaque (macOS)S": 4,
+            "semabe/ambiance/left/extra-large/Semabe Grey Opaque (ambiance)XLL": 1,
+            "semabe/ambiance/left/huge/Semabe Grey Opaque (ambiance)XLL": 0,
+            "semabe/macOS/small/Semabe Grey Opaque (breeze)S": 0,
+            "semabe/symbolic icons": 0,
+        }
+        for path, n in keys.items():
+            if len(variant_keys(path)) != n:
+                print(f"❌ TEST: variant_keys() – {path}: {variant_keys(path)}")
+                failures += 1
+        if variant_keys("semabe/ambiance/left/extra-large/Semabe Grey Opaque (ambiance)XLL") != \
+                ["ambiance|XL|L|Grey|Opaque"]:
+            print("❌ TEST: variant_keys() – wrong key for a layout variant")
+            failures += 1
+        themes = tmp_path / "catalog_themes"
+        for path in ("semabe/macOS/large/Semabe Grey Opaque (macOS)L", "semabe/macOS/small/Semabe Grey Opaque (macOS)S"):
+            for toolkit in ("gtk-3.0", "libadwaita-1.5", "assets"):
+                (themes / path / toolkit).mkdir(parents=True)
+        catalog = build_catalog(themes)
+        if catalog["sizes"] != {"macOS": ["S", "L"]} or len(catalog["variants"]) != 8 \
+                or catalog["paths"][0]["toolkits"] != ["gtk-3.0", "libadwaita"]:
+            print(f"❌ TEST: build_catalog() – {catalog}")
+            failures += 1
+
+        # 14) --verify/--repair: missing, modified and extra files found in parallel, only those fixed
+        verify_src = tmp_path / "verify_src" / "semabe"
+        for i in range(20):
+            (verify_src / f"v{i % 3}").mkdir(parents=True, exist_ok=True)
+            (verify_src / f"v{i % 3}" / f"f{i}.css").write_bytes(os.urandom(2048))
+        (verify_src / "v1" / "f19.css").write_bytes((verify_src / "v0" / "f18.css").read_bytes())
+        (verify_src / "v0" / "link.css").symlink_to("f0.css")
+        verify_tar = tmp_path / "verify.tar"
+        with tarfile.open(verify_tar, "w") as tar:
+            tar.add(verify_src, arcname="semabe")
+        verify_out = tmp_path / "verify_out"
+        saved_state_dir, STATE_DIR = STATE_DIR, tmp_path / "verify_state"
+        try:
+            verify_manifest = extract_parallel([(verify_tar, verify_out)])[verify_tar]
+            save_manifest(verify_tar, verify_manifest)
+            dedupe([verify_manifest])
+            clean = verify(verify_manifest, workers=2)
+            # the two identical files were linked by dedupe() and are hashed once
+            if clean["missing"] or clean["modified"] or clean["extra"] or clean["checked"] != 21 \
+                    or clean["hashed"] != 19:
+                print(f"❌ TEST: verify() – problems in a fresh install: {clean}")
+                failures += 1
+            tree = verify_out / "semabe"
+            (tree / "v1" / "f1.css").unlink()
+            (tree / "v2" / "f2.css").write_bytes(os.urandom(2048))
+            (tree / "v0" / "f3.css").chmod(0o600)
+            (tree / "v0" / "link.css").unlink()
+            (tree / "v0" / "link.css").symlink_to("f3.css")
+            (tree / "v0" / "stray.css").write_text("stray")
+            expected = {"missing": ["semabe/v1/f1.css"], "modified": ["semabe/v0/f3.css", "semabe/v0/link.css",
+                                                                      "semabe/v2/f2.css"],
+                        "extra": ["semabe/v0/stray.css"]}
+            for name, reference in (("manifest", verify_manifest), ("archive", archive_manifest(verify_tar, verify_out))):
+                found = verify(reference, workers=2)
+                if {kind: found[kind] for kind in expected} != expected:
+                    print(f"❌ TEST: verify() against the {name} – {found}")
+                    failures += 1
+            untouched = (tree / "v1" / "f4.css").stat().st_mtime_ns
+            with contextlib.redirect_stdout(io.StringIO()):
+                status = verify_installed([(verify_tar, verify_out)], fix=True, workers=2)
+            after = verify(load_manifest(verify_tar, verify_out), workers=2)
+            if status or after["missing"] or after["modified"] or after["extra"] \
+                    or (tree / "v1" / "f4.css").stat().st_mtime_ns != untouched:
+                print(f"❌ TEST: --repair – {status}, {after}")
+                failures += 1
+        finally:
+            STATE_DIR = saved_state_dir
+
+        # 15) a damaged archive on a delta install: the installed tree stays as it was
+        damaged_src = tmp_path / "damaged_src" / "semabe"
+        damaged_src.mkdir(parents=True)
+        for i in range(300):
+            (damaged_src / f"f{i}.css").write_bytes(os.urandom(1024))
+        damaged_tar = tmp_path / "damaged.tar.xz"
+        with tarfile.open(damaged_tar, "w:xz") as tar:
+            tar.add(damaged_src, arcname="semabe")
+        damaged_out = tmp_path / "damaged_out"
+        with contextlib.redirect_stdout(io.StringIO()):
+            damaged_manifest = extract_parallel([(damaged_tar, damaged_out)])[damaged_tar]
+        before = {p: p.read_bytes() for p in (damaged_out / "semabe").iterdir()}
+        data = damaged_tar.read_bytes()
+        damaged_tar.write_bytes(data[:len(data) * 2 // 3])
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                extract_parallel([(damaged_tar, damaged_out)], previous={damaged_tar: damaged_manifest})
+            print("❌ TEST: extract_parallel() – truncated archive accepted")
+            failures += 1
+        except (OSError, EOFError, lzma.LZMAError, tarfile.TarError):
+            pass
+        after = {p: p.read_bytes() for p in (damaged_out / "semabe").iterdir()}
+        # the staging directory of the failed retry is removed in the background
+        if after != before or [p.name for p in damaged_out.iterdir() if not p.name.startswith(".semabe-staging-")] \
+                != ["semabe"]:
+            print(f"❌ TEST: extract_parallel() – damaged archive changed the installed tree "
+                  f"({len(after)} of {len(before)} files left)")
+            failures += 1
     if failures:
         print(f"\n❌ TESTS: failures: {failures}")
         return 1
@@ -30,6 +30,7 @@ class SemabeGlassDesigner {
 		this._origPopupMenuClose = null;
 		this._origNotifyUpdate = null;
 		this._origNotifyOnScreen = null;
+		this._bumpmapExists = new Map();
 
 		this._bindSettings();
 		this._updatePatches();
@@ -49,6 +50,19 @@ class SemabeGlassDesigner {
 		this._settings.connect("changed::surface-style-notifications", () => this._updateColorClassesOnExisting());
 		this._settings.connect("changed::backgd-blur-menus", () => this._updatePatches());
 		this._settings.connect("changed::backgd-blur-notifications", () => this._updatePatches());
+		// maps installed since the last lookup are picked up when a map is chosen again
+		this._settings.connect("changed::light-refraction-menus", () => this._bumpmapExists.clear());
+		this._settings.connect("changed::light-refraction-notifications", () => this._bumpmapExists.clear());
+	}
+
+	// Pre-scaled refraction map for the surface (tools/optimize_assets.py) if there is one.
+	_bumpmap(file, surface) {
+		if (file === 'none') return 'none';
+		const dir = `${GLib.get_home_dir()}/.local/share/cinnamon/extensions/semabe-theme-blur@sewbej/refraction`;
+		const scaled = `${dir}/${surface}/${file}`;
+		if (!this._bumpmapExists.has(scaled))
+			this._bumpmapExists.set(scaled, GLib.file_test(scaled, GLib.FileTest.EXISTS));
+		return `url("${this._bumpmapExists.get(scaled) ? scaled : `${dir}/${file}`}")`;
 	}
 
 	btn_website_pressed() {
@@ -209,7 +223,7 @@ class SemabeGlassDesigner {
 			this._applyColorClassMenus(actor, 'semabe-blur-popup');
 			actor.set_style(`
 background-blur: ${this.bgBlurStrengthMenus}px;
-background-bumpmap: ${this.lightRefractionMenus === 'none' ? 'none' : `url("${GLib.get_home_dir()}/.local/share/cinnamon/extensions/semabe-theme-blur@sewbej/refraction/${this.lightRefractionMenus}")`};
+background-bumpmap: ${this._bumpmap(this.lightRefractionMenus, 'menus')};
 border-radius: 12px;
 `);
 		};
@@ -276,7 +290,7 @@ border-radius: 12px;
 		actor.set_style(`
 background-color: transparent !important;
 background-blur: ${this.bgBlurStrengthNotifications}px;
-background-bumpmap: ${this.lightRefractionNotifications === 'none' ? 'none' : `url("${GLib.get_home_dir()}/.local/share/cinnamon/extensions/semabe-theme-blur@sewbej/refraction/${this.lightRefractionNotifications}")`};
+background-bumpmap: ${this._bumpmap(this.lightRefractionNotifications, 'notifications')};
 border-radius: 12px;
 margin: 0px !important;
 `);
@@ -319,7 +333,7 @@ margin: 0px !important;
 			self._applyColorClassMenus(this.actor, 'semabe-blur-popup');
 			this.actor.set_style(`
 background-blur: ${self.bgBlurStrengthMenus}px;
-background-bumpmap: ${self.lightRefractionMenus === 'none' ? 'none' : `url("${GLib.get_home_dir()}/.local/share/cinnamon/extensions/semabe-theme-blur@sewbej/refraction/${self.lightRefractionMenus}")`};
+background-bumpmap: ${self._bumpmap(self.lightRefractionMenus, 'menus')};
 border-radius: 12px;
 `);
 
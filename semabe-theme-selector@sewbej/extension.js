@@ -2,10 +2,29 @@ const UUID = "semabe-theme-selector@sewbej";
 const Gettext = imports.gettext;
 const GLib = imports.gi.GLib;
 const Gio = imports.gi.Gio;
+const ByteArray = imports.byteArray;
 const Main = imports.ui.main;
 const Settings = imports.ui.settings;
 const SignalManager = imports.misc.signalManager;
 const ICON_SCHEMA = "org.cinnamon.desktop.interface";
+const THEMES_DIR = `${GLib.get_home_dir()}/.themes`;
+const LAZY_INSTALLER = `${GLib.get_home_dir()}/.local/share/semabe/install.py`;
+const CATALOG = `${GLib.get_home_dir()}/.local/share/semabe/catalog.json`;
+const EXTENSION_DIR = `${GLib.get_home_dir()}/.local/share/cinnamon/extensions/${UUID}`;
+const HELPER_SOCKET = `${GLib.get_user_runtime_dir()}/semabe-helper.sock`;
+// sizes per window control style when the installer wrote no catalog (older installs)
+const DEFAULT_SIZES = {
+    legacy: ["L"],
+    ambiance: ["M", "L"],
+    macOS: ["S", "M", "L", "XL", "XXL"],
+    breeze: ["S", "M", "L", "XL", "XXL"],
+    LED: ["S", "M", "L"],
+    zephyr: ["S", "M", "L"],
+    human: ["S", "M", "L"]
+};
+const SIZE_SETTINGS = {
+    legacy: "size1", ambiance: "size2", macOS: "size3", breeze: "size4", LED: "size5", zephyr: "size6", human: "size7"
+};
 
 class ThemeSelectorExtension {
     constructor(meta) {
@@ -47,6 +66,10 @@ class ThemeSelectorExtension {
         this.settings.bind("size5", "size5", this.onSettingsChanged.bind(this));
         this.settings.bind("size6", "size6", this.onSettingsChanged.bind(this));
         this.settings.bind("size7", "size7", this.onSettingsChanged.bind(this));
+        this.settings.bind("helper-service", "helperService", this._updateHelper.bind(this));
+
+        this._loadCatalog();
+        this._updateHelper();
 
         this._updateUnifiedSize();
 
@@ -80,6 +103,7 @@ class ThemeSelectorExtension {
     }
 
     disable() {
+        this._stopHelper();
         if (this.wmSettingsChangedId && this.wmSettings) {
             this.wmSettings.disconnect(this.wmSettingsChangedId);
             this.wmSettingsChangedId = null;
@@ -93,16 +117,56 @@ class ThemeSelectorExtension {
         this.settings = null;
     }
 
+    _updateHelper() {
+        if (this.helperService)
+            this._startHelper();
+        else
+            this._stopHelper();
+    }
+
+    _startHelper() {
+        // keeps Python/GTK warm; exits by itself when idle or when another instance is running
+        if (this._helperProc) return;
+        try {
+            this._helperProc = Gio.Subprocess.new(
+                ["python3", `${EXTENSION_DIR}/helper_service.py`],
+                Gio.SubprocessFlags.NONE
+            );
+            this._helperProc.wait_async(null, () => {
+                this._helperProc = null;
+            });
+        } catch (e) {
+            global.logError("Error starting the Semabe helper service: " + e);
+            this._helperProc = null;
+        }
+    }
+
+    _stopHelper() {
+        if (!this._helperProc) return;
+        helperRequest("quit", [], () => {});
+        this._helperProc = null;
+    }
+
+    _loadCatalog() {
+        // variants written by the installer: settings key -> theme path, toolkits, lazy flag
+        this.catalog = null;
+        try {
+            const [ok, contents] = GLib.file_get_contents(CATALOG);
+            const catalog = ok ? JSON.parse(ByteArray.toString(contents)) : null;
+            if (catalog && catalog.version === 1 && catalog.themes_dir === THEMES_DIR)
+                this.catalog = catalog;
+        } catch (e) {
+            // no catalog yet: theme paths are built from the settings
+        }
+    }
+
+    _catalogEntry(windowControls, size, layout, color, transparency) {
+        const index = this.catalog.variants[[windowControls, size, layout, color, transparency].join("|")];
+        return index === undefined ? null : this.catalog.paths[index];
+    }
+
     _validateSize() {
-        const sizeMap = {
-            legacy: ["L"],
-            ambiance: ["M", "L"],
-            macOS: ["S", "M", "L", "XL", "XXL"],
-            breeze: ["S", "M", "L", "XL", "XXL"],
-            LED: ["S", "M", "L"],
-            zephyr: ["S", "M", "L"],
-            human: ["S", "M", "L"]
-        };
+        const sizeMap = this.catalog ? this.catalog.sizes : DEFAULT_SIZES;
 
         const windowControls = this.windowControls || "";
         const size = this.size || "";
@@ -110,14 +174,15 @@ class ThemeSelectorExtension {
         if (windowControls in sizeMap) {
             const availableSizes = sizeMap[windowControls];
             if (!availableSizes.includes(size)) {
-                this.size = "L";
+                const fallback = availableSizes.includes("L") ? "L" : availableSizes[0];
+                this.size = fallback;
                 if (this.settings && typeof this.settings.set_string === "function") {
-                    this.settings.set_string("size1", "L"); 
+                    this.settings.set_string(SIZE_SETTINGS[windowControls] || "size1", fallback);
                 }
 
                 Main.notify(
                     _("Theme Selector"),
-                    _(`Size "${size}" not supported for "${windowControls}". Reset to "L".`)
+                    _(`Size "${size}" not supported for "${windowControls}". Reset to "${fallback}".`)
                 );
             }
         }
@@ -236,52 +301,169 @@ class ThemeSelectorExtension {
         return "R";
     }
 
+    _ensureInstalled(missing, callback) {
+        // lazy install: variants are extracted from the stored archive on first use;
+        // callback(ok) with ok false if the extraction failed
+        if (missing.length === 0 || !GLib.file_test(LAZY_INSTALLER, GLib.FileTest.EXISTS)) {
+            callback(missing.length === 0);
+            return;
+        }
+
+        try {
+            let proc = Gio.Subprocess.new(
+                ["python3", LAZY_INSTALLER, "--materialize", ...missing],
+                Gio.SubprocessFlags.NONE
+            );
+            proc.wait_async(null, (p, res) => {
+                let ok = false;
+                try {
+                    p.wait_finish(res);
+                    ok = p.get_successful();
+                } catch (e) {
+                    global.logError("Error during theme variant extraction: " + e);
+                }
+                callback(ok);
+            });
+        } catch (e) {
+            global.logError(e);
+            callback(false);
+        }
+    }
+
     applyTheme(themeGtk, themeCinn) {
-        const path = this.buildThemePath(themeGtk);
-        const pathCinn = this.buildThemePathCinn(themeCinn);
-        const scriptPath = `${GLib.get_home_dir()}/.local/share/cinnamon/extensions/${UUID}/flatpak.py`;
+        if (!this.catalog) {
+            const path = this.buildThemePath(themeGtk);
+            const pathCinn = this.buildThemePathCinn(themeCinn);
+            const missing = [path, pathCinn].filter(p => !GLib.file_test(`${THEMES_DIR}/${p}`, GLib.FileTest.IS_DIR));
+            this._ensureInstalled(missing, () => this._setTheme(path, pathCinn));
+            return;
+        }
 
+        const layout = this.mapLayoutToLetter(this.wmSettings.get_string("button-layout"));
+        const entry = this._catalogEntry(this.windowControls, this.size, layout, this.color, this.transparency);
+        const entryCinn = this._catalogEntry(this.windowControlsCinn, "L", "R", this.colorCinn, this.transparencyCinn);
+        if (!entry || !entry.toolkits.includes("gtk-3.0") || !entryCinn || !entryCinn.toolkits.includes("cinnamon")) {
+            Main.notify(
+                _("Theme Selector"),
+                _(`Theme "${!entry || !entry.toolkits.includes("gtk-3.0") ? themeGtk : themeCinn}" is not installed.`)
+            );
+            return;
+        }
+
+        const lazy = [...new Set([entry, entryCinn].filter(e => e.lazy))];
+        this._ensureInstalled(lazy.map(e => e.path), (ok) => {
+            if (!ok) {
+                Main.notify(_("Theme Selector"), _(`Theme "${themeGtk}" could not be extracted.`));
+                return;
+            }
+            lazy.forEach(e => { e.lazy = false; });
+            this._setTheme(entry.path, entryCinn.path);
+        });
+    }
+
+    _setTheme(path, pathCinn) {
         this.interfaceSettings.set_string("gtk-theme", path);
         new Gio.Settings({ schema: "org.cinnamon.theme" }).set_string("name", pathCinn);
 
-        let proc = Gio.Subprocess.new(
-            ["python3", scriptPath, path],
-            Gio.SubprocessFlags.NONE
-        );
-        
-        proc.wait_async(null, (p, res) => {
+        // coalesced: a burst of settings changes ends in a single write of the last theme
+        const args = ["--coalesce", path];
+        runHelperOrSpawn("flatpak", args, ["python3", `${EXTENSION_DIR}/flatpak.py`, ...args], (status) => {
+            if (status !== 0)
+                global.logError("Error during Flatpak theme update");
+        });
+    }
+}
+
+// Sends one request to the helper service; callback(status) gets null if the
+// service is not running or did not run the request.
+function helperRequest(cmd, args, callback) {
+    if (!GLib.file_test(HELPER_SOCKET, GLib.FileTest.EXISTS)) {
+        callback(null);
+        return;
+    }
+
+    const client = new Gio.SocketClient();
+    client.connect_async(new Gio.UnixSocketAddress({ path: HELPER_SOCKET }), null, (c, res) => {
+        let conn;
+        try {
+            conn = c.connect_finish(res);
+        } catch (e) {
+            callback(null);
+            return;
+        }
+
+        const request = ByteArray.fromString(JSON.stringify({ cmd: cmd, args: args }) + "\n");
+        conn.get_output_stream().write_bytes_async(new GLib.Bytes(request), GLib.PRIORITY_DEFAULT, null, (out, wres) => {
             try {
-                p.wait_finish(res);
+                out.write_bytes_finish(wres);
             } catch (e) {
-                global.logError("Error during Flatpak theme update: " + e);
+                conn.close(null);
+                callback(null);
+                return;
             }
+
+            const input = new Gio.DataInputStream({ base_stream: conn.get_input_stream() });
+            input.read_line_async(GLib.PRIORITY_DEFAULT, null, (inp, rres) => {
+                let status = null;
+                try {
+                    const [line] = inp.read_line_finish_utf8(rres);
+                    const reply = JSON.parse(line);
+                    if (typeof reply.status === "number") status = reply.status;
+                    if (reply.output) global.log(reply.output);
+                } catch (e) {
+                    status = null;
+                }
+                conn.close(null);
+                callback(status);
+            });
         });
-    }
+    });
+}
+
+// Runs a request on the helper service, or spawns argv if the service cannot
+// take it; callback(status) gets the exit status (-1 if the spawn failed).
+function runHelperOrSpawn(cmd, args, argv, callback) {
+    helperRequest(cmd, args, (status) => {
+        if (status !== null) {
+            callback(status);
+            return;
+        }
+
+        // the service exits when idle or after an update of its scripts: this
+        // request runs cold, the next one finds the service warm again
+        if (extension && extension.helperService)
+            extension._startHelper();
+
+        try {
+            let proc = Gio.Subprocess.new(argv, Gio.SubprocessFlags.NONE);
+            proc.wait_async(null, (p, res) => {
+                try {
+                    p.wait_finish(res);
+                    callback(p.get_exit_status());
+                } catch (e) {
+                    global.logError(e);
+                    callback(-1);
+                }
+            });
+        } catch (e) {
+            global.logError(e);
+            callback(-1);
+        }
+    });
 }
 
 function runThemeScript(mode, style, targetDir) {
-    const homeDir = GLib.get_home_dir();
-    const scriptPath = `${homeDir}/.local/share/cinnamon/extensions/${UUID}/replace_symbolic_icon.py`;
+    const scriptPath = `${EXTENSION_DIR}/replace_symbolic_icon.py`;
 
     if (!targetDir) {
         const s = new Gio.Settings({ schema: ICON_SCHEMA });
         targetDir = s.get_string("icon-theme");
     }
 
-    try {
-        let proc = Gio.Subprocess.new(
-            ["python3", scriptPath, mode, style, targetDir],
-            Gio.SubprocessFlags.NONE
-        );
-        
-        proc.wait_async(null, (p, res) => {
-            if (p.wait_finish(res)) {
-                refreshIconTheme(targetDir);
-            }
-        });
-    } catch (e) {
-        global.logError(e);
-    }
+    runHelperOrSpawn("icons", [mode, style, targetDir], ["python3", scriptPath, mode, style, targetDir], (status) => {
+        if (status !== -1)
+            refreshIconTheme(targetDir);
+    });
 }
 
 function refreshIconTheme(targetDir) {
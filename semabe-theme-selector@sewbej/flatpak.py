@@ -1,60 +1,356 @@
 #!/usr/bin/env python3
 
+import argparse
+import contextlib
+import json
+import os
 import sys
+import time
+import uuid
 from pathlib import Path
+from typing import List, Optional, Tuple
 
+import profiling
 
-def apply_flatpak_theme(theme_path: str):
-    home = Path.home()
-    global_path = home / ".local/share/flatpak/overrides/global"
+THEME_FILESYSTEMS = ["~/.themes", "/usr/share/themes"]
+# requests arriving within this window are coalesced into one write
+COALESCE_DELAY = 0.3
 
-    if not global_path.exists():
-        return
 
-    try:
-        lines = global_path.read_text(encoding="utf-8").splitlines()
-    except Exception as e:
-        raise RuntimeError(f"File read error: {global_path}: {e}")
+def _overrides_path() -> Path:
+    return Path.home() / ".local/share/flatpak/overrides/global"
 
-    new_lines = []
-    filesystems_set = False
-    gtk_theme_set = False
 
+def _pending_path() -> Path:
+    return Path.home() / ".cache/semabe/flatpak-pending"
+
+
+def _parse_keyfile(lines: List[str]) -> List[Tuple[Optional[str], List[str]]]:
+    """Split keyfile lines into [(section name, lines)], keeping comments and order.
+    Lines before the first group header are kept under the section None."""
+    sections = [(None, [])]
     for line in lines:
-        if line.startswith("filesystems="):
-            new_lines.append("filesystems=~/.themes;/usr/share/themes")
-            filesystems_set = True
-        elif line.startswith("GTK_THEME="):
-            new_lines.append(f"GTK_THEME={theme_path}")
-            gtk_theme_set = True
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            sections.append((stripped[1:-1], [line]))
         else:
-            new_lines.append(line)
+            sections[-1][1].append(line)
+    return sections
+
+
+def _key_of(line: str) -> Optional[str]:
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or "=" not in stripped:
+        return None
+    return stripped.split("=", 1)[0].strip()
+
+
+def _merge_filesystems(value: Optional[str]) -> str:
+    """Add the theme directories to a `filesystems=` list, keeping the other entries."""
+    entries = [e for e in (value or "").split(";") if e]
+
+    def base(entry):
+        entry = entry.lstrip("!")
+        for suffix in (":ro", ":rw", ":create"):
+            if entry.endswith(suffix):
+                return entry[: -len(suffix)]
+        return entry
+
+    for fs in THEME_FILESYSTEMS:
+        if any(base(e) == fs and not e.startswith("!") for e in entries):
+            continue
+        entries = [e for e in entries if base(e) != fs] + [fs]
+    return ";".join(entries) + ";"
+
 
-    if not filesystems_set:
-        new_lines.append("filesystems=~/.themes;/usr/share/themes")
+def _set_key(sections, group: str, key: str, update) -> None:
+    """Set `key` in `group` to update(old value); drop the key from every other group."""
+    for name, lines in sections:
+        if name != group:
+            lines[:] = [line for line in lines if _key_of(line) != key]
 
-    if not gtk_theme_set:
-        new_lines.append(f"GTK_THEME={theme_path}")
+    target = next((lines for name, lines in sections if name == group), None)
+    if target is None:
+        target = [f"[{group}]"]
+        sections.append((group, target))
+
+    old = None
+    index = None
+    for i, line in enumerate(target):
+        if _key_of(line) == key:
+            if index is None:
+                old, index = line.split("=", 1)[1].strip(), i
+            else:
+                target[i] = None
+    target[:] = [line for line in target if line is not None]
+
+    new_line = f"{key}={update(old)}"
+    if index is not None:
+        target[index] = new_line
+    else:
+        # after the last key of the group, before trailing blank lines
+        end = len(target)
+        while end > 1 and not target[end - 1].strip():
+            end -= 1
+        target.insert(end, new_line)
+
+
+def render_overrides(text: str, theme_path: str) -> str:
+    """Return the overrides keyfile `text` with the theme settings applied.
+
+    [Context] filesystems gets the theme directories (other entries are kept)
+    and [Environment] GTK_THEME is set. Other groups, keys and comments stay as
+    they are. Stray keys from older line-based writers are removed from the
+    wrong groups.
+    """
+    sections = _parse_keyfile(text.splitlines())
+    _set_key(sections, "Context", "filesystems", _merge_filesystems)
+    _set_key(sections, "Environment", "GTK_THEME", lambda _old: theme_path)
+    lines = [line for _name, section in sections for line in section]
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        with contextlib.suppress(OSError):
+            os.chmod(tmp, path.stat().st_mode & 0o7777)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def apply_flatpak_theme(theme_path: str) -> bool:
+    """Point the global Flatpak overrides at theme_path. Return True if the file was written."""
+    global_path = _overrides_path()
+
+    if not global_path.exists():
+        return False
 
     try:
-        global_path.write_text("\n".join(new_lines) + "\n", encoding="utf-8")
+        with profiling.phase("read"):
+            text = global_path.read_text(encoding="utf-8")
+            profiling.count("files_read")
+            profiling.count("bytes_read", len(text))
+    except Exception as e:
+        raise RuntimeError(f"File read error: {global_path}: {e}")
+
+    with profiling.phase("render"):
+        new_text = render_overrides(text, theme_path)
+    if new_text == text:
+        return False
+
+    try:
+        with profiling.phase("write"):
+            _write_atomic(global_path, new_text)
+            profiling.count("files_written")
+            profiling.count("bytes_written", len(new_text))
     except Exception as e:
         raise RuntimeError(f"The file cannot be saved.: {global_path}: {e}")
+    return True
+
+
+@contextlib.contextmanager
+def _locked(path: Path):
+    import fcntl
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def apply_flatpak_theme_coalesced(theme_path: str, delay: float = COALESCE_DELAY) -> str:
+    """Debounced apply_flatpak_theme(): return "written", "unchanged" or "superseded".
+
+    The request is recorded in a pending file, then the call waits `delay`
+    seconds. If no newer request replaced it by then, this call writes the
+    final value. Otherwise it leaves the write to the newer request. A burst
+    of settings changes therefore ends in a single write.
+    """
+    pending = _pending_path()
+    token = uuid.uuid4().hex
+    with _locked(pending):
+        pending.write_text(f"{token}\n{theme_path}\n", encoding="utf-8")
+
+    with profiling.phase("coalesce_wait"):
+        time.sleep(delay)
+
+    with _locked(pending):
+        try:
+            current = pending.read_text(encoding="utf-8").split("\n")[0]
+        except OSError:
+            current = None
+        if current != token:
+            return "superseded"
+        try:
+            return "written" if apply_flatpak_theme(theme_path) else "unchanged"
+        finally:
+            pending.unlink(missing_ok=True)
 
 
-def main():
-    if len(sys.argv) != 2:
-        sys.exit(1)
+def run_tests() -> int:
+    """Tests for the overrides writer in a temporary HOME.
+    Return 0 on success, non-zero on failure.
+    """
+    import tempfile
+    import threading
 
-    theme_path = sys.argv[1]
+    failures = 0
+    theme = "semabe/legacy/Semabe Steel Opaque (legacy)"
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_home = os.environ.get("HOME")
+        os.environ["HOME"] = tmp
+        try:
+            global_path = _overrides_path()
 
+            # 1) no overrides file: nothing is created
+            if apply_flatpak_theme(theme) or global_path.exists():
+                print("❌ TEST: apply_flatpak_theme – created a missing overrides file")
+                failures += 1
+
+            # 2) groups, other keys and comments are kept; theme keys land in their groups
+            global_path.parent.mkdir(parents=True)
+            global_path.write_text(
+                "[Context]\n"
+                "# user comment\n"
+                "filesystems=xdg-download;!~/.themes;\n"
+                "sockets=wayland;\n"
+                "\n"
+                "[Environment]\n"
+                "FOO=bar\n"
+                "GTK_THEME=Old\n"
+                "[Session Bus Policy]\n"
+                "org.example=talk\n"
+                "GTK_THEME=stray\n"
+            )
+            if not apply_flatpak_theme(theme):
+                print("❌ TEST: apply_flatpak_theme – not written")
+                failures += 1
+            expected = (
+                "[Context]\n"
+                "# user comment\n"
+                "filesystems=xdg-download;~/.themes;/usr/share/themes;\n"
+                "sockets=wayland;\n"
+                "\n"
+                "[Environment]\n"
+                "FOO=bar\n"
+                f"GTK_THEME={theme}\n"
+                "[Session Bus Policy]\n"
+                "org.example=talk\n"
+            )
+            if global_path.read_text() != expected:
+                print(f"❌ TEST: apply_flatpak_theme – unexpected result:\n{global_path.read_text()}")
+                failures += 1
+
+            # 3) same value again: no write
+            before = global_path.stat().st_mtime_ns
+            time.sleep(0.01)
+            if apply_flatpak_theme(theme) or global_path.stat().st_mtime_ns != before:
+                print("❌ TEST: apply_flatpak_theme – rewrote an unchanged file")
+                failures += 1
+
+            # 4) file from the old line-based writer, empty file
+            global_path.write_text("[Context]\nfilesystems=~/.themes;/usr/share/themes\nGTK_THEME=Old\n")
+            apply_flatpak_theme(theme)
+            if global_path.read_text() != (
+                    f"[Context]\nfilesystems=~/.themes;/usr/share/themes;\n[Environment]\nGTK_THEME={theme}\n"):
+                print(f"❌ TEST: apply_flatpak_theme – legacy file:\n{global_path.read_text()}")
+                failures += 1
+            global_path.write_text("")
+            apply_flatpak_theme(theme)
+            if "[Environment]" not in global_path.read_text() or "[Context]" not in global_path.read_text():
+                print("❌ TEST: apply_flatpak_theme – empty file")
+                failures += 1
+
+            # 5) a burst of coalesced requests writes once, with the last value
+            writes = []
+            real_write = globals()["_write_atomic"]
+            globals()["_write_atomic"] = lambda path, text: (writes.append(text), real_write(path, text))
+            results = []
+            threads = []
+            try:
+                for i in range(5):
+                    t = threading.Thread(target=lambda i=i: results.append(
+                        apply_flatpak_theme_coalesced(f"Theme {i}", delay=0.2)))
+                    t.start()
+                    threads.append(t)
+                    time.sleep(0.02)
+                for t in threads:
+                    t.join()
+            finally:
+                globals()["_write_atomic"] = real_write
+            if len(writes) != 1 or "GTK_THEME=Theme 4" not in writes[0] or results.count("superseded") != 4:
+                print(f"❌ TEST: apply_flatpak_theme_coalesced – {len(writes)} writes, {results}")
+                failures += 1
+            if _pending_path().exists():
+                print("❌ TEST: apply_flatpak_theme_coalesced – pending request left behind")
+                failures += 1
+
+            # 6) --profile writes a trace with the shared schema
+            trace = Path(tmp) / "trace.json"
+            main(["--profile", str(trace), "Traced"])
+            try:
+                data = json.loads(trace.read_text())
+                names = [p["name"] for p in data["phases"]]
+                if (data["schema"] != profiling.SCHEMA or names != ["apply", "read", "render", "write"]
+                        or data["total"]["files_written"] != 1 or data["phases"][1]["depth"] != 1):
+                    print(f"❌ TEST: --profile – unexpected trace: {data}")
+                    failures += 1
+            except (OSError, ValueError, KeyError) as e:
+                print(f"❌ TEST: --profile – no trace: {e}")
+                failures += 1
+        finally:
+            if saved_home is None:
+                os.environ.pop("HOME", None)
+            else:
+                os.environ["HOME"] = saved_home
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Set the Semabe theme in the global Flatpak overrides")
+    parser.add_argument("theme_path", nargs="?")
+    parser.add_argument("--coalesce", action="store_true",
+                        help=f"wait {COALESCE_DELAY} s and skip the write if a newer request arrived")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help=f"write a JSON trace of the run (default: ~/.cache/semabe/traces; "
+                             f"or set {profiling.ENV_VAR})")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    args = parser.parse_args(argv)
+
+    if args.run_tests:
+        return run_tests()
+    if not args.theme_path:
+        return 1
+
+    profiling.start("flatpak.py", args.profile)
     try:
-        apply_flatpak_theme(theme_path)
+        with profiling.phase("apply"):
+            if args.coalesce:
+                apply_flatpak_theme_coalesced(args.theme_path)
+            else:
+                apply_flatpak_theme(args.theme_path)
     except Exception as e:
         print(f"[flatpak.py] {e}", file=sys.stderr)
-        sys.exit(1)
+        return 1
+    finally:
+        profiling.finish()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
-
+    sys.exit(main())
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Semabe helper service
+
+Keeps one warm Python process for the theme selector extension. flatpak.py and
+replace_symbolic_icon.py are imported once, so a settings change does not pay
+for interpreter start-up and module imports again. replace_symbolic_icon.py
+imports GTK only for its dialogs; the service loads it up front where it is
+available, so interactive icon requests do not initialise GTK either.
+
+Requests are single JSON lines on a Unix socket in $XDG_RUNTIME_DIR:
+
+    {"cmd": "flatpak", "args": ["--coalesce", "semabe/legacy/Semabe Steel Opaque (legacy)"]}
+    {"cmd": "icons", "args": ["controls", "breeze", "Mint-Y"]}
+    {"cmd": "ping"}
+    {"cmd": "quit"}
+
+Each request is answered with one line {"status": <exit code>, "output": "..."}.
+A status of null means the request was not run, and the caller should spawn
+the script itself. The extension does this whenever the service is not running.
+
+Icon requests run on the main thread, because they may open GTK dialogs.
+Flatpak requests are handled on the connection thread, which lets coalesced
+requests supersede each other while they wait. The service exits after
+IDLE_TIMEOUT seconds without requests. It also exits when one of its scripts
+changes on disk, so an updated extension never runs stale code.
+"""
+
+import contextlib
+import io
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+SCRIPTS = ("helper_service.py", "flatpak.py", "replace_symbolic_icon.py", "preview_dialog.py", "profiling.py")
+SOCKET_NAME = "semabe-helper.sock"
+IDLE_TIMEOUT = 15 * 60
+REQUEST_TIMEOUT = 5.0
+
+sys.path.insert(0, str(SCRIPT_DIR))
+
+
+def socket_path() -> Path:
+    """Same directory as GLib.get_user_runtime_dir() in the extension."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime:
+        runtime = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(runtime) / SOCKET_NAME
+
+
+def _script_mtimes() -> dict:
+    mtimes = {}
+    for name in SCRIPTS:
+        try:
+            mtimes[name] = (SCRIPT_DIR / name).stat().st_mtime_ns
+        except OSError:
+            mtimes[name] = None
+    return mtimes
+
+
+def request(cmd: str, args=(), path: Optional[Path] = None, timeout: Optional[float] = None) -> dict:
+    """Send one request to a running service and return its reply (OSError if it is not running)."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path or socket_path()))
+        sock.sendall(json.dumps({"cmd": cmd, "args": list(args)}).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("helper service closed the connection")
+    return json.loads(line)
+
+
+class HelperService:
+    def __init__(self, path: Path, idle_timeout: float = IDLE_TIMEOUT):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.mtimes = _script_mtimes()
+        self.main_jobs = queue.Queue()
+        self.flatpak_lock = threading.Lock()
+        self.last_request = time.monotonic()
+        self.stopping = threading.Event()
+        self.sock = None
+        self.inode = None
+        self.flatpak = None
+        self.icons = None
+        self.icons_error = None
+
+    def load(self):
+        """Import the scripts once, and GTK for the icon dialogs where it is installed."""
+        import flatpak
+        self.flatpak = flatpak
+        try:
+            import replace_symbolic_icon
+            self.icons = replace_symbolic_icon
+        except Exception as e:  # icon requests are left to spawned scripts
+            self.icons_error = f"{type(e).__name__}: {e}"
+            return
+        # without GTK, headless (--yes/--json) icon requests still run here
+        with contextlib.suppress(Exception):
+            import preview_dialog  # noqa: F401  (imported lazily by the script)
+
+    def bind(self) -> bool:
+        """Listen on the socket. Return False if another instance is already serving it."""
+        try:
+            request("ping", path=self.path, timeout=1.0)
+            return False
+        except (OSError, ValueError):
+            pass
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(str(self.path))
+        finally:
+            os.umask(old_umask)
+        sock.listen(8)
+        sock.settimeout(1.0)
+        self.sock = sock
+        self.inode = self.path.stat().st_ino
+        return True
+
+    def serve(self):
+        """Accept connections in a thread and run main-thread jobs until stopped or idle."""
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    job = self.main_jobs.get(timeout=1.0)
+                except queue.Empty:
+                    if time.monotonic() - self.last_request > self.idle_timeout:
+                        self.stop()
+                    continue
+                job()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        if self.sock is not None:
+            self.sock.close()
+            with contextlib.suppress(OSError):
+                # only remove the socket if it is still ours
+                if self.path.stat().st_ino == self.inode:
+                    self.path.unlink()
+
+    def _accept_loop(self):
+        while not self.stopping.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        with conn:
+            conn.settimeout(REQUEST_TIMEOUT)
+            try:
+                with conn.makefile("rb") as f:
+                    line = f.readline()
+                req = json.loads(line)
+                cmd, args = req.get("cmd"), [str(a) for a in req.get("args", [])]
+            except (OSError, ValueError, AttributeError) as e:
+                self._reply(conn, {"status": None, "error": f"bad request: {e}"})
+                return
+            conn.settimeout(None)
+            self.last_request = time.monotonic()
+
+            if cmd != "quit" and _script_mtimes() != self.mtimes:
+                self._reply(conn, {"status": None, "error": "scripts changed, restarting"})
+                self.stop()
+                return
+
+            if cmd == "ping":
+                reply = {"status": 0, "output": "", "pid": os.getpid()}
+            elif cmd == "quit":
+                reply = {"status": 0, "output": ""}
+                self.stop()
+            elif cmd == "flatpak":
+                reply = self._run_flatpak(args)
+            elif cmd == "icons":
+                if self.icons is None:
+                    reply = {"status": None, "error": f"icons unavailable: {self.icons_error}"}
+                else:
+                    done = threading.Event()
+                    result = {}
+
+                    def job():
+                        result.update(self._run_icons(args))
+                        done.set()
+
+                    self.main_jobs.put(job)
+                    while not done.wait(1.0):
+                        if self.stopping.is_set():
+                            break
+                    reply = result or {"status": None, "error": "service stopped"}
+            else:
+                reply = {"status": None, "error": f"unknown command: {cmd}"}
+            self._reply(conn, reply)
+
+    @staticmethod
+    def _reply(conn: socket.socket, reply: dict):
+        with contextlib.suppress(OSError):
+            conn.sendall(json.dumps(reply).encode("utf-8") + b"\n")
+
+    def _run_flatpak(self, args) -> dict:
+        """Same as `flatpak.py [--coalesce] <theme_path>`."""
+        coalesce = args[:1] == ["--coalesce"]
+        if coalesce:
+            args = args[1:]
+        if len(args) != 1:
+            return {"status": 1, "output": ""}
+        try:
+            if coalesce:
+                # waits for the debounce window; concurrent requests supersede each other
+                self.flatpak.apply_flatpak_theme_coalesced(args[0])
+            else:
+                with self.flatpak_lock:
+                    self.flatpak.apply_flatpak_theme(args[0])
+        except Exception as e:
+            return {"status": 1, "output": f"[flatpak.py] {e}"}
+        return {"status": 0, "output": ""}
+
+    def _run_icons(self, args) -> dict:
+        """Same as `replace_symbolic_icon.py <mode> <style> <theme_dir>`, in this process."""
+        out = io.StringIO()
+        old_argv = sys.argv
+        sys.argv = [str(SCRIPT_DIR / "replace_symbolic_icon.py"), *args]
+        try:
+            with contextlib.redirect_stdout(out):
+                self.icons.main()
+            status = 0
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            out.write(traceback.format_exc())
+            status = 1
+        finally:
+            sys.argv = old_argv
+        return {"status": status, "output": out.getvalue()}
+
+
+def run_tests() -> int:
+    """Tests for the helper service on a temporary socket and HOME.
+    Return 0 on success, non-zero on failure.
+    """
+    import tempfile
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        saved_home = os.environ.get("HOME")
+        os.environ["HOME"] = str(tmp_path)
+        try:
+            overrides = tmp_path / ".local/share/flatpak/overrides/global"
+            overrides.parent.mkdir(parents=True)
+            overrides.write_text("[Context]\n")
+
+            service = HelperService(tmp_path / "run" / SOCKET_NAME, idle_timeout=60)
+            service.load()
+            if not service.bind():
+                print("❌ TEST: helper service – socket already in use")
+                return 1
+            thread = threading.Thread(target=service.serve, daemon=True)
+            thread.start()
+
+            if request("ping", path=service.path, timeout=5)["pid"] != os.getpid():
+                print("❌ TEST: helper service – ping")
+                failures += 1
+
+            theme = "semabe/legacy/Semabe Steel Opaque (legacy)"
+            reply = request("flatpak", ["--coalesce", theme], path=service.path, timeout=5)
+            if reply["status"] != 0 or f"GTK_THEME={theme}" not in overrides.read_text():
+                print(f"❌ TEST: helper service – flatpak request: {reply}")
+                failures += 1
+
+            if request("nope", path=service.path, timeout=5)["status"] is not None:
+                print("❌ TEST: helper service – unknown command accepted")
+                failures += 1
+
+            second = HelperService(service.path)
+            if second.bind():
+                print("❌ TEST: helper service – second instance took over the socket")
+                failures += 1
+
+            request("quit", path=service.path, timeout=5)
+            thread.join(5)
+            if thread.is_alive() or service.path.exists():
+                print("❌ TEST: helper service – quit")
+                failures += 1
+            try:
+                request("ping", path=service.path, timeout=1)
+                print("❌ TEST: helper service – still answering after quit")
+                failures += 1
+            except OSError:
+                pass
+        finally:
+            if saved_home is None:
+                os.environ.pop("HOME", None)
+            else:
+                os.environ["HOME"] = saved_home
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main() -> int:
+    if len(sys.argv) == 2 and sys.argv[1] == "--run-tests":
+        return run_tests()
+
+    service = HelperService(socket_path())
+    if not service.bind():
+        return 0
+    service.load()
+    service.serve()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
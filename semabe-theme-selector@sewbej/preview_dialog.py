@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GTK preview dialog of replace_symbolic_icon.py
+
+Kept in its own module so that GTK is only imported when a dialog is shown;
+the headless mode (--yes/--json) never loads it.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gdk, Gtk, GdkPixbuf, GLib
+
+# rasterized preview icons, keyed by source path, size and mtime
+THUMBNAIL_DIR = Path.home() / ".cache/semabe/thumbnails"
+PREVIEW_SIZE = 48
+THUMBNAIL_SIZES = (PREVIEW_SIZE, PREVIEW_SIZE * 2)
+FADE_DURATION_US = 300_000
+
+# ------------------------------
+# GTK Animated Preview Dialog
+# ------------------------------
+def thumbnail_path(src: Path, size: int) -> Optional[Path]:
+    """Cache file for `src` rendered at `size` px; a changed source gets a new name."""
+    try:
+        st = src.stat()
+    except OSError:
+        return None
+    key = f"{src.resolve()}\0{st.st_mtime_ns}\0{st.st_size}".encode("utf-8", "surrogateescape")
+    return THUMBNAIL_DIR / f"{hashlib.sha1(key).hexdigest()}-{size}.png"
+
+def load_thumbnail(src: Path, size: int):
+    """GdkPixbuf of `src` at `size` px, from the thumbnail cache when possible.
+
+    Safe to call off the main thread: it only touches pixbufs, never widgets.
+    """
+    cached = thumbnail_path(src, size)
+    if cached is None:
+        return None
+    if cached.exists():
+        try:
+            return GdkPixbuf.Pixbuf.new_from_file(str(cached))
+        except GLib.Error:
+            cached.unlink(missing_ok=True)
+
+    pixbuf = None
+    for px in THUMBNAIL_SIZES:
+        rendered = GdkPixbuf.Pixbuf.new_from_file_at_size(str(src), px, px)
+        target = thumbnail_path(src, px)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            rendered.savev(str(tmp), "png", [], [])
+            os.replace(tmp, target)
+        except (OSError, GLib.Error):
+            pass
+        if px == size:
+            pixbuf = rendered
+    if pixbuf is None:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(str(src), size, size)
+    return pixbuf
+
+class PreviewDialog(Gtk.Dialog):
+    def __init__(self, title, header, icons_dir, filenames, target_dir, show_icons=True):
+        super().__init__(title=title)
+        self.set_default_size(420, 260)
+        self.set_border_width(12)
+        self.set_opacity(0.0)
+        self._closed = False
+        self.connect("destroy", self._on_destroy)
+        ok_label = "Restore" if "restore" in title.lower() else "Replace"
+        self.add_button("         Cancel         ", Gtk.ResponseType.CANCEL)
+        self.add_button(ok_label, Gtk.ResponseType.OK)
+
+        label = Gtk.Label()
+        extra = "" if "restore" in title.lower() else "\n\nwith the following icons:"
+        label.set_markup(f"<b>{header}</b>\n\n<i>{GLib.markup_escape_text(target_dir.name)}</i>{extra}")
+
+        label.set_justify(Gtk.Justification.CENTER)
+        label.set_margin_bottom(10)
+        box = self.get_content_area()
+        box.pack_start(label, False, False, 0)
+
+        if show_icons:
+            self.grid = Gtk.FlowBox()
+            self.grid.set_max_children_per_line(4)
+            self.grid.set_selection_mode(Gtk.SelectionMode.NONE)
+            self.grid.set_column_spacing(10)
+            self.grid.set_row_spacing(10)
+
+            revealer = Gtk.Revealer()
+            revealer.set_transition_type(Gtk.RevealerTransitionType.SLIDE_UP)
+            revealer.set_transition_duration(600)
+            revealer.add(self.grid)
+
+            scrolled = Gtk.ScrolledWindow()
+            scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+            scrolled.add(revealer)
+
+            box.pack_start(scrolled, True, True, 0)
+            self.show_all()
+            GLib.timeout_add(150, lambda: revealer.set_reveal_child(True) or False)
+
+            # icons are decoded in a worker thread and added as they become ready
+            paths = [icons_dir / name for name in filenames]
+            threading.Thread(target=self._load_icons, args=(paths, self.get_scale_factor()),
+                             daemon=True).start()
+        else:
+            self.show_all()
+
+        self._fade_in()
+
+    def _on_destroy(self, *_args):
+        self._closed = True
+
+    def _load_icons(self, paths, scale):
+        for icon_path in paths:
+            if self._closed:
+                return
+            try:
+                pixbuf = load_thumbnail(icon_path, PREVIEW_SIZE * min(scale, 2))
+            except Exception:
+                continue
+            if pixbuf is not None:
+                GLib.idle_add(self._add_icon, pixbuf, scale)
+
+    def _add_icon(self, pixbuf, scale):
+        if self._closed:
+            return False
+        if scale > 1 and pixbuf.get_width() > PREVIEW_SIZE:
+            surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, min(scale, 2), self.get_window())
+            image = Gtk.Image.new_from_surface(surface)
+        else:
+            image = Gtk.Image.new_from_pixbuf(pixbuf)
+        image.show()
+        self.grid.add(image)
+        return False
+
+    def _animate_opacity(self, start, end, done=None):
+        """Fade from `start` to `end` opacity in step with the frame clock."""
+        begin = []
+
+        def tick(widget, frame_clock):
+            now = frame_clock.get_frame_time()
+            if not begin:
+                begin.append(now)
+            t = min(1.0, (now - begin[0]) / FADE_DURATION_US)
+            self.set_opacity(start + (end - start) * t)
+            if t < 1.0:
+                return GLib.SOURCE_CONTINUE
+            if done:
+                done()
+            return GLib.SOURCE_REMOVE
+
+        self.add_tick_callback(tick)
+
+    def _fade_in(self):
+        self._animate_opacity(0.0, 1.0)
+
+    def _fade_out_and_close(self):
+        def close():
+            self.response(Gtk.ResponseType.NONE)
+            self.destroy()
+
+        self._animate_opacity(self.get_opacity(), 0.0, close)
+        return False
+
+    def run(self):
+        response = super().run()
+        if response != Gtk.ResponseType.NONE:
+            GLib.idle_add(self._fade_out_and_close)
+        return response
+
+def preview_icons(title, header, icons_dir, filenames, target_dir, show_icons=True):
+    win = PreviewDialog(title, header, icons_dir, filenames, target_dir, show_icons)
+    response = win.run()
+    win.destroy()
+    return response == Gtk.ResponseType.OK
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-phase traces for flatpak.py and replace_symbolic_icon.py
+
+A script enables tracing with `--profile [FILE]` or the environment variable
+SEMABE_PROFILE (a file, or a directory that gets one trace per run). Without
+either, phase() and count() do nothing. The trace is one JSON file:
+
+    {"schema": "semabe-trace/1", "tool": ..., "argv": [...], "host": ...,
+     "kernel": ..., "python": ..., "cpus": ..., "pid": ..., "started": ...,
+     "total": {counters}, "phases": [{"name", "depth", "start_s", counters}]}
+
+with the counters wall_s, cpu_s (user + system, waited-for children included),
+rchar/wchar and read_bytes/write_bytes (/proc/self/io) and the counts kept by
+the script itself (files_read, files_written, bytes_read, bytes_written,
+entries_scanned). The counters are process-wide, so phases running at the
+same time in other threads include each other's work. install.py ships on
+its own and carries a copy of this writer with the same schema.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCHEMA = "semabe-trace/1"
+ENV_VAR = "SEMABE_PROFILE"
+COUNTS = ("files_read", "files_written", "bytes_read", "bytes_written", "entries_scanned")
+PROC_IO = ("rchar", "wchar", "read_bytes", "write_bytes")
+
+
+def default_dir() -> Path:
+    return Path.home() / ".cache/semabe/traces"
+
+
+def _proc_io() -> Dict[str, int]:
+    values = dict.fromkeys(PROC_IO, 0)
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                key, _sep, value = line.partition(":")
+                if key in values:
+                    values[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def _cpu() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class Profiler:
+    """Collects the phases and counts of one run; disabled when `path` is None."""
+
+    def __init__(self, tool: str, path: Optional[Path] = None):
+        self.tool = tool
+        self.path = path
+        self.enabled = path is not None
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.phases: List[dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started = datetime.datetime.now(datetime.timezone.utc)
+        self._start = self._snapshot() if self.enabled else {}
+
+    def _snapshot(self) -> dict:
+        snap = {"wall_s": time.perf_counter(), "cpu_s": _cpu()}
+        snap.update(_proc_io())
+        snap.update(self.counts)
+        return snap
+
+    def _delta(self, start: dict) -> dict:
+        end = self._snapshot()
+        return {key: round(end[key] - start[key], 6) if key.endswith("_s") else end[key] - start[key]
+                for key in start}
+
+    def count(self, key: str, n: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counts[key] += n
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block; phases nest per thread."""
+        if not self.enabled:
+            yield
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = {"name": name, "depth": len(stack),
+                  "start_s": round(time.perf_counter() - self._start["wall_s"], 6)}
+        with self._lock:
+            self.phases.append(record)
+        start = self._snapshot()
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+            record.update(self._delta(start))
+
+    def trace(self) -> dict:
+        return {
+            "schema": SCHEMA,
+            "tool": self.tool,
+            "argv": sys.argv[1:],
+            "host": platform.node(),
+            "kernel": platform.release(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "pid": os.getpid(),
+            "started": self._started.isoformat(timespec="seconds"),
+            "total": self._delta(self._start),
+            "phases": self.phases,
+        }
+
+    def write(self) -> Optional[Path]:
+        """Write the trace (atomically) and return its path; None when disabled or on errors."""
+        if not self.enabled:
+            return None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self.trace(), indent=1), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[{self.tool}] cannot write trace {self.path}: {e}", file=sys.stderr)
+            return None
+        return self.path
+
+
+def trace_path(tool: str, value: Optional[str]) -> Optional[Path]:
+    """Where the trace of `tool` goes for a --profile/SEMABE_PROFILE value (None: no trace).
+
+    An empty value, "1" or a directory give <dir>/<tool>-<time>-<pid>.json.
+    """
+    if value is None or value in ("0", "no", "false"):
+        return None
+    name = f"{Path(tool).stem}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json"
+    if value in ("", "1", "yes", "true"):
+        return default_dir() / name
+    path = Path(value).expanduser()
+    if path.is_dir() or value.endswith("/"):
+        return path / name
+    return path
+
+
+_current = Profiler("")
+
+
+def start(tool: str, value: Optional[str] = None) -> Profiler:
+    """Begin the trace of a run; `value` is the --profile argument (SEMABE_PROFILE if None)."""
+    global _current
+    if value is None:
+        value = os.environ.get(ENV_VAR)
+    _current = Profiler(tool, trace_path(tool, value))
+    return _current
+
+
+def finish() -> Optional[Path]:
+    """Write the trace begun by start() and switch tracing off again."""
+    global _current
+    profiler, _current = _current, Profiler("")
+    return profiler.write()
+
+
+def active() -> bool:
+    """True while a trace is recorded (for counts that cost a stat() to take)."""
+    return _current.enabled
+
+
+def phase(name: str):
+    return _current.phase(name)
+
+
+def count(key: str, n: int = 1) -> None:
+    if _current.enabled:
+        _current.count(key, n)
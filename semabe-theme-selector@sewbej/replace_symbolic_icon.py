@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import contextlib
+import filecmp
+import json
+import os
+import stat
+import struct
 import sys
 import subprocess
+import time
 from pathlib import Path
 import shutil
-import gi
-from typing import List
-gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GdkPixbuf, GLib, GObject
+from typing import Dict, List, Optional
+
+import profiling
 
 CONTROLS_FILES = [
     "window-close-symbolic.svg",
@@ -38,203 +45,697 @@ ARROW_PREVIEW_FILES = [
 BACKUP_SUFFIX = ".semabe.bak"
 XSI_PREFIX = "xsi-"
 
+# persistent index of where the symbolic icons live in each theme
+ICON_INDEX = Path.home() / ".cache/semabe/icon-index.json"
+ICON_INDEX_VERSION = 1
+INDEXED_NAMES = CONTROLS_FILES + ARROW_FILES
+# directories modified this recently may change again within the same mtime tick
+RACY_MTIME_NS = 2_000_000_000
+
+FICLONE = 0x40049409  # ioctl(dest_fd, FICLONE, src_fd): copy-on-write clone
+
+# system-wide icon themes that ensure_local_copy() copies from
+SYSTEM_ICONS_DIR = Path("/usr/share/icons")
+
+# per-theme journal of every file replace runs touched, replayed backwards by restore
+JOURNAL_DIR = Path.home() / ".local/share/semabe/icon-journal"
+
+_icon_index = None
+
+# GTK icon-theme.cache (format of gtk-update-icon-cache, version 1.0)
+ICON_CACHE_FILE = "icon-theme.cache"
+ICON_CACHE_SUFFIX_FLAGS = {".xpm": 1, ".svg": 2, ".png": 4, ".icon": 8}
+ICON_CACHE_NONE = 0xFFFFFFFF
+ICON_CACHE_ROOT_DIR = 0xFFFF
+
+# headless mode (--yes/--json): no GTK, no zenity; errors are collected instead
+_headless = False
+_errors: List[str] = []
+
 def zenity_error(msg):
+    if _headless:
+        _errors.append(msg)
+        return
     subprocess.run(["zenity", "--error", "--title=Semabe Theme Selector", "--text", msg])
 
+def preview_icons(*args, **kwargs) -> bool:
+    """Show the GTK preview dialog; GTK is only imported here."""
+    import preview_dialog
+    return preview_dialog.preview_icons(*args, **kwargs)
+
+def scan_tree(root: Path, names: List[str]) -> Dict[str, List[Path]]:
+    """Walk `root` once and collect every file called like one of `names`.
+
+    The `.semabe.bak` backups and `xsi-` companions of those names are collected
+    in the same pass, under their own file names. Like Path.rglob(), symlinked
+    directories are not descended into.
+    """
+    wanted = set()
+    for name in names:
+        wanted.update((name, name + BACKUP_SUFFIX, XSI_PREFIX + name))
+    found = {name: [] for name in wanted}
+
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        profiling.count("entries_scanned", len(entries))
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name in wanted and entry.is_file():
+                    found[entry.name].append(Path(entry.path))
+            except OSError:
+                continue
+    return found
+
+def _load_index() -> dict:
+    global _icon_index
+    if _icon_index is None:
+        try:
+            _icon_index = json.loads(ICON_INDEX.read_text(encoding="utf-8"))
+            if _icon_index.get("version") != ICON_INDEX_VERSION:
+                raise ValueError("index version")
+        except (OSError, ValueError):
+            _icon_index = {"version": ICON_INDEX_VERSION, "themes": {}}
+    return _icon_index
+
+def _save_index():
+    try:
+        ICON_INDEX.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ICON_INDEX.with_name(f"{ICON_INDEX.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(_icon_index, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, ICON_INDEX)
+    except OSError:
+        pass
+
+def scan_icons(root: Path, names: List[str]) -> Dict[str, List[Path]]:
+    """scan_tree() backed by a persistent index in ~/.cache/semabe.
+
+    Every directory of a theme is stored with its mtime, its subdirectories and
+    the symbolic icons (plus backups/companions) it holds. Directories whose
+    mtime did not change are taken from the index with a single stat(); only
+    new or modified directories are read again.
+    """
+    if not set(names) <= set(INDEXED_NAMES):
+        return scan_tree(root, names)
+
+    wanted = set()
+    for name in INDEXED_NAMES:
+        wanted.update((name, name + BACKUP_SUFFIX, XSI_PREFIX + name))
+
+    index = _load_index()
+    key = str(root)
+    cached_dirs = index["themes"].get(key, {}).get("dirs", {})
+    dirs = {}
+    changed = key not in index["themes"]
+    now = time.time_ns()
+
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(key, rel)
+        try:
+            st = os.stat(path)
+        except OSError:
+            changed = True
+            continue
+        if not stat.S_ISDIR(st.st_mode):
+            changed = True
+            continue
+
+        cached = cached_dirs.get(rel)
+        if cached and cached[0] == st.st_mtime_ns:
+            subdirs, hits = cached[1], cached[2]
+        else:
+            changed = True
+            subdirs, hits = [], []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        profiling.count("entries_scanned")
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.name)
+                            elif entry.name in wanted and entry.is_file():
+                                hits.append(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+        mtime = st.st_mtime_ns if now - st.st_mtime_ns > RACY_MTIME_NS else None
+        dirs[rel] = [mtime, subdirs, hits]
+        stack.extend(os.path.join(rel, d) if rel else d for d in subdirs)
+
+    if changed or dirs.keys() != cached_dirs.keys():
+        index["themes"][key] = {"dirs": dirs}
+        _save_index()
+
+    requested = set()
+    for name in names:
+        requested.update((name, name + BACKUP_SUFFIX, XSI_PREFIX + name))
+    found = {name: [] for name in requested}
+    for rel, (_mtime, _subdirs, hits) in dirs.items():
+        for hit in hits:
+            if hit in requested:
+                found[hit].append(Path(key, rel, hit))
+    return found
+
+def theme_has_icons(root: Path, names: List[str]) -> bool:
+    """True if the theme at `root` contains at least one of `names`.
+
+    Answered by scan_icons(): one stat() per directory of the theme, a readdir
+    only for directories that changed since they were indexed.
+    """
+    if not root.is_dir():
+        return False
+    found = scan_icons(root, names)
+    return any(found[name] for name in names)
+
+def _count_copy(dest: Path):
+    """Record a file copied to `dest` in the --profile trace."""
+    if profiling.active():
+        size = dest.stat().st_size
+        profiling.count("files_read")
+        profiling.count("files_written")
+        profiling.count("bytes_read", size)
+        profiling.count("bytes_written", size)
+
 def ensure_backup_once(target_file: Path):
     backup = Path(str(target_file) + BACKUP_SUFFIX)
     if backup.exists():
         return False
     try:
         shutil.copy2(target_file, backup)
+        _count_copy(backup)
         return True
     except Exception:
         return False
 
-def replace_many(source_dir: Path, target_dir: Path, names: list[str]):
+def same_content(a: Path, b: Path) -> bool:
+    """True if both files hold the same bytes (cheap checks first)."""
+    try:
+        sa, sb = a.stat(), b.stat()
+    except OSError:
+        return False
+    if (sa.st_dev, sa.st_ino) == (sb.st_dev, sb.st_ino):
+        return True
+    if sa.st_size != sb.st_size:
+        return False
+    profiling.count("files_read", 2)
+    profiling.count("bytes_read", 2 * sa.st_size)
+    return filecmp.cmp(a, b, shallow=False)
+
+def copy_file(src: Path, dest: Path):
+    """Replace dest by a copy of src made in the kernel.
+
+    Tries a reflink (FICLONE), then copy_file_range(), then a plain copy. The
+    copy is written to a temporary name and renamed over dest, so hard links
+    to the old dest are left alone.
+    """
+    tmp = dest.with_name(f".{dest.name}.semabe-tmp")
+    try:
+        with open(src, "rb") as fs, open(tmp, "wb") as fd:
+            try:
+                import fcntl
+                fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+            except (OSError, ImportError):
+                remaining = os.fstat(fs.fileno()).st_size
+                try:
+                    while remaining > 0:
+                        n = os.copy_file_range(fs.fileno(), fd.fileno(), remaining)
+                        if n == 0:
+                            break
+                        remaining -= n
+                except (OSError, AttributeError):
+                    remaining = 1
+                if remaining > 0:
+                    fs.seek(0)
+                    fd.seek(0)
+                    fd.truncate()
+                    shutil.copyfileobj(fs, fd)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dest)
+        _count_copy(dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+def link_companion(primary: Path, companion: Path) -> str:
+    """Make `companion` hold the same bytes as `primary`; return skipped/linked/copied."""
+    if same_content(primary, companion):
+        return "skipped"
+    tmp = companion.with_name(f".{companion.name}.semabe-tmp")
+    try:
+        os.link(primary, tmp)
+        os.replace(tmp, companion)
+        return "linked"
+    except OSError:
+        tmp.unlink(missing_ok=True)
+    copy_file(primary, companion)
+    return "copied"
+
+class Journal:
+    """Write-ahead log of the changes made to one theme, replayed backwards by restore.
+
+    Every change is recorded before it is made:
+
+    - mkdir  – a directory that did not exist
+    - create – a file that did not exist
+    - backup – `path` saved as `path` + BACKUP_SUFFIX
+    - copy / link – new content for an existing file (undone through its backup)
+    - cache  – icon-theme.cache regenerated
+
+    With dry_run=True nothing is written or changed; the entries are the plan.
+    """
+
+    def __init__(self, path: Optional[Path] = None, dry_run: bool = False, header: Optional[dict] = None):
+        self.path = path
+        self.dry_run = dry_run
+        self.header = header or {}
+        self.entries: List[dict] = []
+        self._planned = set()
+        self._file = None
+
+    def record(self, op: str, path: Path, **extra) -> bool:
+        """Log one change; True if the caller should go ahead and make it."""
+        entry = {"op": op, "path": str(path)}
+        entry.update((k, str(v)) for k, v in extra.items())
+        self.entries.append(entry)
+        if self.dry_run:
+            if op in ("mkdir", "create"):
+                self._planned.add(str(path))
+            return False
+        if self.path is not None:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps({"op": "begin", "time": int(time.time()), **self.header}) + "\n")
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+        return True
+
+    def exists(self, path: Path) -> bool:
+        """Path.exists(), counting files and directories a dry run would have created."""
+        return str(path) in self._planned or path.exists()
+
+    def makedirs(self, path: Path):
+        missing = []
+        while not self.exists(path) and path != path.parent:
+            missing.append(path)
+            path = path.parent
+        for d in reversed(missing):
+            if self.record("mkdir", d):
+                d.mkdir(exist_ok=True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def journal_path(theme: str) -> Path:
+    return JOURNAL_DIR / f"{theme}.jsonl"
+
+def load_journal(path: Path) -> List[dict]:
+    """Entries of a journal, oldest first; a torn last line (crash) is ignored."""
+    entries = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("op") != "begin":
+                    entries.append(entry)
+    except OSError:
+        pass
+    return entries
+
+def restore_from_journal(entries: List[dict], plan: Optional[Journal] = None) -> Dict[str, int]:
+    """Undo journaled changes newest first; cost is proportional to the files touched.
+
+    Backups are copied back and removed, created files and directories are
+    removed. A file copied over is restored from its backup too, also when the
+    backup predates the journal (made by a version without one). Content
+    written over files without a backup is left alone. With a dry-run `plan`,
+    the undo steps are only recorded there.
+    """
+    if plan is None:
+        plan = Journal()
+    counts = {"restored": 0, "removed": 0, "failed": 0}
+    restored = set()
+    for entry in reversed(entries):
+        op, path = entry["op"], Path(entry["path"])
+        try:
+            if op in ("backup", "copy"):
+                backup = Path(entry["path"] + BACKUP_SUFFIX)
+                if entry["path"] not in restored and backup.exists():
+                    restored.add(entry["path"])
+                    if plan.record("restore", path, backup=backup):
+                        shutil.copy2(backup, path)
+                        _count_copy(path)
+                        backup.unlink()
+                    counts["restored"] += 1
+            elif op == "create":
+                if path.exists():
+                    if plan.record("delete", path):
+                        path.unlink()
+                    counts["removed"] += 1
+            elif op == "mkdir":
+                if path.is_dir() and plan.record("rmdir", path):
+                    with contextlib.suppress(OSError):  # not empty: someone else put files there
+                        path.rmdir()
+        except OSError:
+            counts["failed"] += 1
+    return counts
+
+def replace_many(source_dir: Path, target_dir: Path, names: list[str],
+                 found: Optional[Dict[str, List[Path]]] = None,
+                 stats: Optional[Dict[str, int]] = None,
+                 journal: Optional[Journal] = None):
+    """Put the icons from source_dir over every matching file below target_dir.
+
+    Files that already hold the right bytes are left untouched (their mtimes do
+    not change, so icon caches stay valid). `stats` counts skipped, copied and
+    linked files. Every change is recorded in `journal` first.
+    """
     replaced = 0
     skip_backup = "Adwaita/symbolic/ui" in str(target_dir)
+    if found is None:
+        with profiling.phase("scan"):
+            found = scan_icons(target_dir, names)
+    if stats is None:
+        stats = {}
+    if journal is None:
+        journal = Journal()
+    for key in ("skipped", "copied", "linked"):
+        stats.setdefault(key, 0)
 
     for name in names:
         src = source_dir / name
         if not src.exists():
             continue
-        for dest in target_dir.rglob(name):
-            if not dest.is_file():
-                continue
+        for dest in found.get(name, []):
 
-            if not skip_backup:
-                ensure_backup_once(dest)
+            backup = Path(str(dest) + BACKUP_SUFFIX)
+            if not skip_backup and not backup.exists():
+                if journal.record("backup", dest, backup=backup):
+                    ensure_backup_once(dest)
 
             try:
-                shutil.copy2(src, dest)
-                
+                if same_content(src, dest):
+                    stats["skipped"] += 1
+                else:
+                    if journal.record("copy", dest, source=src):
+                        copy_file(src, dest)
+                    stats["copied"] += 1
+
                 xsi_dest = dest.parent / (XSI_PREFIX + dest.name)
-                shutil.copy2(src, xsi_dest)
-                
+                if same_content(src, xsi_dest):
+                    stats["skipped"] += 1
+                elif journal.record("link" if journal.exists(xsi_dest) else "create", xsi_dest, source=dest):
+                    stats[link_companion(dest, xsi_dest)] += 1
+                else:
+                    stats["linked"] += 1
+
                 replaced += 1
             except Exception as e:
                 zenity_error(f"Error during copying {name}: {e}")
 
     return replaced
 
-def restore_from_backups(target_dir: Path, names: list[str]):
+def restore_from_backups(target_dir: Path, names: list[str],
+                         found: Optional[Dict[str, List[Path]]] = None,
+                         plan: Optional[Journal] = None):
+    """Restore from the .semabe.bak files found by a scan (themes changed without a journal)."""
     restored = 0
+    if found is None:
+        found = scan_icons(target_dir, names)
+    if plan is None:
+        plan = Journal()
     for name in names:
-        for dest in target_dir.rglob(name):
-            if not dest.is_file():
-                continue
-            
+        xsi_files = set(found.get(XSI_PREFIX + name, []))
+        backups = set(found.get(name + BACKUP_SUFFIX, []))
+        for dest in found.get(name, []):
             xsi_file = dest.parent / (XSI_PREFIX + dest.name)
-            if xsi_file.exists():
+            if xsi_file in xsi_files and plan.record("delete", xsi_file):
                 try:
                     xsi_file.unlink()
                 except Exception:
                     pass
 
             backup = Path(str(dest) + BACKUP_SUFFIX)
-            if backup.exists():
+            if backup in backups:
+                if not plan.record("restore", dest, backup=backup):
+                    restored += 1
+                    continue
                 try:
                     shutil.copy2(backup, dest)
+                    _count_copy(dest)
                     backup.unlink(missing_ok=True)
                     restored += 1
                 except Exception:
                     pass
     return restored
 
-# ------------------------------
-# GTK Animated Preview Dialog
-# ------------------------------
-class PreviewDialog(Gtk.Dialog):
-    def __init__(self, title, header, icons_dir, filenames, target_dir, show_icons=True):
-        super().__init__(title=title)
-        self.set_default_size(420, 260)
-        self.set_border_width(12)
-        self.set_opacity(0.0)
-        ok_label = "Restore" if "restore" in title.lower() else "Replace"
-        self.add_button("         Cancel         ", Gtk.ResponseType.CANCEL)
-        self.add_button(ok_label, Gtk.ResponseType.OK)
-
-        label = Gtk.Label()
-        extra = "" if "restore" in title.lower() else "\n\nwith the following icons:"
-        label.set_markup(f"<b>{header}</b>\n\n<i>{GLib.markup_escape_text(target_dir.name)}</i>{extra}")
-
-        label.set_justify(Gtk.Justification.CENTER)
-        label.set_margin_bottom(10)
-        box = self.get_content_area()
-        box.pack_start(label, False, False, 0)
-
-        if show_icons:
-            grid = Gtk.FlowBox()
-            grid.set_max_children_per_line(4)
-            grid.set_selection_mode(Gtk.SelectionMode.NONE)
-            grid.set_column_spacing(10)
-            grid.set_row_spacing(10)
-
-            for name in filenames:
-                icon_path = icons_dir / name
-                if not icon_path.exists():
-                    continue
-                try:
-                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(str(icon_path), 48, 48)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-                    grid.add(image)
-                except Exception:
+def _icon_name_hash(name: str) -> int:
+    """icon_name_hash() of gtkiconcache.c: h = h * 31 + c over signed chars."""
+    h = 0
+    for i, c in enumerate(name.encode("utf-8")):
+        c = c - 256 if c > 127 else c
+        h = c if i == 0 else (h << 5) - h + c
+        h &= 0xFFFFFFFF
+    return h
+
+def _cache_buckets(n: int) -> int:
+    """Smallest prime >= n (GTK uses g_spaced_primes_closest(), any size is valid)."""
+    n = max(n, 2)
+    while any(n % d == 0 for d in range(2, int(n ** 0.5) + 1)):
+        n += 1
+    return n
+
+def _scan_icon_files(theme_dir: Path):
+    """Directories (relative, in cache order) and {icon name: {dir index: flags}}."""
+    dirs: List[str] = []
+    icons: Dict[str, Dict[int, int]] = {}
+    seen = set()
+
+    def walk(path: str, rel: str):
+        try:
+            real = os.path.realpath(path)
+            if real in seen:
+                return
+            seen.add(real)
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except OSError:
+            return
+        profiling.count("entries_scanned", len(entries))
+        dir_index = None
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    walk(entry.path, f"{rel}/{entry.name}" if rel else entry.name)
                     continue
+            except OSError:
+                continue
+            name, ext = os.path.splitext(entry.name)
+            flag = ICON_CACHE_SUFFIX_FLAGS.get(ext)
+            if not flag or not name or entry.name.startswith("."):
+                continue
+            if dir_index is None:
+                if rel:
+                    dir_index = len(dirs)
+                    dirs.append(rel)
+                else:
+                    dir_index = ICON_CACHE_ROOT_DIR
+            images = icons.setdefault(name, {})
+            images[dir_index] = images.get(dir_index, 0) | flag
 
-            revealer = Gtk.Revealer()
-            revealer.set_transition_type(Gtk.RevealerTransitionType.SLIDE_UP)
-            revealer.set_transition_duration(600)
-            revealer.add(grid)
+    walk(str(theme_dir), "")
+    return dirs, icons
 
-            scrolled = Gtk.ScrolledWindow()
-            scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
-            scrolled.add(revealer)
+def _cache_string(s: str) -> bytes:
+    data = s.encode("utf-8") + b"\0"
+    return data + b"\0" * (-len(data) % 4)
 
-            box.pack_start(scrolled, True, True, 0)
-            self.show_all()
-            GLib.timeout_add(150, lambda: revealer.set_reveal_child(True) or False)
-        else:
-            self.show_all()
-
-        self._fade_in()
-
-    def _fade_in(self):
-        duration = 300
-        steps = 15
-        step_time = duration // steps
-        for i in range(steps + 1):
-            GLib.timeout_add(i * step_time, lambda i=i: self.set_opacity(i / steps) or False)
-
-    def _fade_out_and_close(self):
-        duration = 300
-        steps = 15
-        step_time = duration // steps
-
-        def fade_step(i=0):
-            self.set_opacity(max(0, 1 - i / steps))
-            if i >= steps:
-                self.response(Gtk.ResponseType.NONE)
-                self.destroy()
-                return False
-            GLib.timeout_add(step_time, lambda: fade_step(i + 1))
-            return False
+def build_icon_cache(theme_dir: Path) -> bytes:
+    """Serialize the icons below theme_dir in the GTK icon-theme.cache format.
 
-        fade_step()
+    Layout (big endian): header, hash table, directory list, icon records,
+    image lists, then the NUL-terminated strings. No image data is embedded.
+    """
+    dirs, icons = _scan_icon_files(theme_dir)
+    names = sorted(icons)
+    n_buckets = _cache_buckets(len(names))
 
-    def run(self):
-        response = super().run()
-        if response != Gtk.ResponseType.NONE:
-            GLib.idle_add(self._fade_out_and_close)
-        return response
+    hash_offset = 12
+    dir_list_offset = hash_offset + 4 + 4 * n_buckets
+    icons_offset = dir_list_offset + 4 + 4 * len(dirs)
+    image_lists_offset = icons_offset + 12 * len(names)
+    strings_offset = image_lists_offset + sum(4 + 8 * len(icons[n]) for n in names)
 
-def preview_icons(title, header, icons_dir, filenames, target_dir, show_icons=True):
-    win = PreviewDialog(title, header, icons_dir, filenames, target_dir, show_icons)
-    response = win.run()
-    win.destroy()
-    return response == Gtk.ResponseType.OK
+    strings = bytearray()
+    string_offsets = {}
 
-def ensure_local_copy(theme_name: str, icons_to_check: List[str], source_dir: Path) -> Path:
+    def string_at(s: str) -> int:
+        if s not in string_offsets:
+            string_offsets[s] = strings_offset + len(strings)
+            strings.extend(_cache_string(s))
+        return string_offsets[s]
+
+    buckets = [ICON_CACHE_NONE] * n_buckets
+    records = []
+    image_lists = bytearray()
+    for i, name in enumerate(names):
+        offset = icons_offset + 12 * i
+        bucket = _icon_name_hash(name) % n_buckets
+        image_list = image_lists_offset + len(image_lists)
+        images = icons[name]
+        image_lists.extend(struct.pack(">I", len(images)))
+        for dir_index, flags in sorted(images.items()):
+            image_lists.extend(struct.pack(">HHI", dir_index, flags, 0))
+        records.append(struct.pack(">III", buckets[bucket], string_at(name), image_list))
+        buckets[bucket] = offset
+
+    dir_offsets = [string_at(d) for d in dirs]
+
+    out = bytearray(struct.pack(">HHII", 1, 0, hash_offset, dir_list_offset))
+    out += struct.pack(f">I{n_buckets}I", n_buckets, *buckets)
+    out += struct.pack(f">I{len(dirs)}I", len(dirs), *dir_offsets)
+    out += b"".join(records)
+    out += image_lists
+    out += strings
+    return bytes(out)
+
+def read_icon_cache(path: Path) -> Dict[str, List[tuple]]:
+    """Parse an icon-theme.cache into {icon name: [(directory, flags), ...]}.
+
+    Every icon is reached through its hash bucket, the way GTK looks it up;
+    ValueError is raised for a malformed cache.
+    """
+    data = Path(path).read_bytes()
+
+    def u16(offset):
+        return struct.unpack_from(">H", data, offset)[0]
+
+    def u32(offset):
+        return struct.unpack_from(">I", data, offset)[0]
+
+    def string(offset):
+        end = data.index(b"\0", offset)
+        return data[offset:end].decode("utf-8")
+
+    try:
+        if (u16(0), u16(2)) != (1, 0):
+            raise ValueError(f"unsupported icon cache version {u16(0)}.{u16(2)}")
+        hash_offset, dir_list_offset = u32(4), u32(8)
+        dirs = [string(u32(dir_list_offset + 4 + 4 * i)) for i in range(u32(dir_list_offset))]
+        n_buckets = u32(hash_offset)
+        icons = {}
+        for bucket in range(n_buckets):
+            offset = u32(hash_offset + 4 + 4 * bucket)
+            chain = 0
+            while offset != ICON_CACHE_NONE:
+                chain += 1
+                if chain > len(data) // 12:
+                    raise ValueError("icon cache hash chain loops")
+                name = string(u32(offset + 4))
+                if _icon_name_hash(name) % n_buckets != bucket:
+                    raise ValueError(f"icon {name!r} is in the wrong hash bucket")
+                image_list = u32(offset + 8)
+                images = []
+                for i in range(u32(image_list)):
+                    dir_index, flags = u16(image_list + 4 + 8 * i), u16(image_list + 6 + 8 * i)
+                    images.append(("" if dir_index == ICON_CACHE_ROOT_DIR else dirs[dir_index], flags))
+                icons[name] = images
+                offset = u32(offset)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"malformed icon cache: {e}") from e
+    return icons
+
+def theme_root(path: Path) -> Optional[Path]:
+    """~/.local/share/icons/<theme> for any path inside a local icon theme."""
+    base = Path.home() / ".local/share/icons"
+    try:
+        rel = path.relative_to(base)
+    except ValueError:
+        return None
+    return base / rel.parts[0] if rel.parts else None
+
+def write_icon_cache(theme_dir: Path) -> Optional[Path]:
+    """(Re)generate theme_dir/icon-theme.cache, like gtk-update-icon-cache.
+
+    The cache is written atomically and the theme directory gets the cache's
+    mtime afterwards, so GTK (which ignores caches older than the directory)
+    keeps using it. Returns the cache path, or None if it could not be written.
+    """
+    if theme_dir is None or not theme_dir.is_dir():
+        return None
+    cache = theme_dir / ICON_CACHE_FILE
+    tmp = theme_dir / f".{ICON_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        data = build_icon_cache(theme_dir)
+        tmp.write_bytes(data)
+        profiling.count("files_written")
+        profiling.count("bytes_written", len(data))
+        os.replace(tmp, cache)
+        st = cache.stat()
+        os.utime(theme_dir, ns=(theme_dir.stat().st_atime_ns, st.st_mtime_ns))
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return None
+    return cache
+
+def ensure_local_copy(theme_name: str, icons_to_check: List[str], source_dir: Path,
+                      journal: Optional[Journal] = None) -> Path:
+    if journal is None:
+        journal = Journal()
     home = Path.home()
     local_base = home / ".local/share/icons"
     local_dir = local_base / theme_name
-    system_base = Path("/usr/share/icons")
+    system_base = SYSTEM_ICONS_DIR
     system_dir = system_base / theme_name
 
     exists_somewhere = local_dir.exists() or system_dir.exists()
     if not exists_somewhere:
         return None
 
-    if local_dir.exists():
-        has_local_svgs = any(any(local_dir.rglob(svg)) for svg in icons_to_check)
-        if has_local_svgs:
-            return local_dir
-    else:
-        local_dir.mkdir(parents=True, exist_ok=True)
+    if local_dir.exists() and theme_has_icons(local_dir, icons_to_check):
+        return local_dir
 
+    # the local directory is only created once there is something to copy into it
     effective_system_dir = system_dir if system_dir.exists() else None
     if effective_system_dir:
-        has_svgs_in_variant = any(any(effective_system_dir.rglob(svg)) for svg in icons_to_check)
+        has_svgs_in_variant = theme_has_icons(effective_system_dir, icons_to_check)
         if not has_svgs_in_variant:
             main_name = None
             for prefix in ["Mint-Y", "Mint-X", "Mint-L", "Yaru", "Papirus"]:
                 if theme_name.startswith(prefix):
                     main_name = prefix
                     break
-            if main_name and (system_base / main_name).exists():
+            if main_name and theme_has_icons(system_base / main_name, icons_to_check):
                 effective_system_dir = system_base / main_name
 
+    system_found = scan_icons(effective_system_dir, icons_to_check) if effective_system_dir else {}
+
     copied_any = False
     if effective_system_dir and effective_system_dir.exists():
         for svg in icons_to_check:
-            for sys_file in effective_system_dir.rglob(svg):
-                if not sys_file.is_file():
-                    continue
+            for sys_file in system_found.get(svg, []):
                 rel_path = sys_file.relative_to(effective_system_dir)
                 local_target = local_dir / rel_path
-                local_target.parent.mkdir(parents=True, exist_ok=True)
                 try:
-                    shutil.copy2(sys_file, local_target)
+                    journal.makedirs(local_target.parent)
+                    op = "copy" if journal.exists(local_target) else "create"
+                    if journal.record(op, local_target, source=sys_file):
+                        shutil.copy2(sys_file, local_target)
+                        _count_copy(local_target)
                     copied_any = True
                 except Exception:
                     pass
@@ -243,7 +744,7 @@ def ensure_local_copy(theme_name: str, icons_to_check: List[str], source_dir: Pa
             return local_dir
 
     adwaita_dir = local_base / "Adwaita/symbolic/ui"
-    adwaita_dir.mkdir(parents=True, exist_ok=True)
+    journal.makedirs(adwaita_dir)
     copied_any = False
 
     if source_dir and source_dir.exists():
@@ -253,98 +754,576 @@ def ensure_local_copy(theme_name: str, icons_to_check: List[str], source_dir: Pa
                 continue
             local_target = adwaita_dir / src_file.name
             try:
-                shutil.copy2(src_file, local_target)
+                op = "copy" if journal.exists(local_target) else "create"
+                if journal.record(op, local_target, source=src_file):
+                    shutil.copy2(src_file, local_target)
+                    _count_copy(local_target)
                 copied_any = True
             except Exception:
                 pass
 
     return adwaita_dir if copied_any else None
 
-def main():
-    if len(sys.argv) < 4:
-        zenity_error("Usage:\nreplace_symbolic_icon.py <mode> <style> <theme_dir>")
-        sys.exit(1)
+def icon_theme_dirs() -> List[Path]:
+    """Base directories searched for icon themes, in GTK's order."""
+    home = Path.home()
+    data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+    return [home / ".local/share/icons", home / ".icons"] + [Path(d) / "icons" for d in data_dirs.split(":") if d]
+
+def installed_icon_themes(names: List[str]) -> List[str]:
+    """Names of the installed icon themes (not cursor themes) that contain one of `names`."""
+    themes = {}
+    for base in icon_theme_dirs():
+        try:
+            entries = sorted(base.iterdir())
+        except OSError:
+            continue
+        for entry in entries:
+            index = entry / "index.theme"
+            try:
+                if "Directories=" not in index.read_text(encoding="utf-8", errors="replace"):
+                    continue
+            except OSError:
+                continue
+            themes.setdefault(entry.name, []).append(entry)
+    return [name for name, roots in sorted(themes.items())
+            if any(theme_has_icons(root, names) for root in roots)]
+
+def _run_batch_item(mode: str, style: str, theme: str, dry_run: bool = False) -> dict:
+    """run() for one theme of a batch, in a worker process."""
+    global _headless
+    _headless = True
+    _errors.clear()
+    result = {}
+    try:
+        result["status"] = run(mode, style, theme, interactive=False, result=result, dry_run=dry_run)
+    except Exception as e:
+        result.update(status=1, theme=theme)
+        _errors.append(f"{type(e).__name__}: {e}")
+    result["errors"] = list(_errors)
+    return result
+
+def run_batch(mode: str, style: str, themes: List[str], interactive: bool = True,
+              workers: Optional[int] = None, dry_run: bool = False) -> dict:
+    """Apply (or restore) the icons for several themes at once, one process per theme.
+
+    An interactive batch shows a single preview for all themes. Returns a
+    combined report with a result per theme and the summed counts.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    report = {"mode": mode, "style": style, "themes": [], "status": 0}
+    if mode not in MODES:
+        zenity_error(f"Unknown mode: {mode}")
+        report["status"] = 1
+        return report
+
+    if interactive and not dry_run:
+        title, header = MODES[mode]
+        label = ", ".join(themes[:3]) + (f" (+{len(themes) - 3})" if len(themes) > 3 else "")
+        if mode == "restore":
+            confirmed = preview_icons(title, header, Path("."), [], Path(label), show_icons=False)
+        else:
+            kind = "close-minimize-maximize" if mode == "controls" else "arrows"
+            source_dir = Path.home() / ".themes/semabe/symbolic icons" / kind / style
+            names = CONTROLS_FILES if mode == "controls" else ARROW_PREVIEW_FILES
+            confirmed = preview_icons(title, header, source_dir, names, Path(label))
+        if not confirmed:
+            zenity_error("Operation canceled by user.")
+            return report
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(themes)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        n = len(themes)
+        results = list(pool.map(_run_batch_item, [mode] * n, [style] * n, themes, [dry_run] * n))
+
+    totals = {key: 0 for key in ("replaced", "restored", "removed", "skipped", "copied", "linked")}
+    for result in results:
+        for key in totals:
+            totals[key] += result.get(key, 0)
+        if result["status"] != 0:
+            report["status"] = 1
+    report.update(totals, themes=results)
+    if interactive:
+        failed = [f"{r['theme']}: {'; '.join(r['errors']) or 'failed'}" for r in results if r["status"] != 0]
+        if failed:
+            zenity_error("Some icon themes were not changed:\n" + "\n".join(failed))
+    return report
+
+def run_tests() -> int:
+    """Tests for the icon-theme.cache writer, in a temporary directory.
+    Return 0 on success, non-zero on failure.
+    """
+    import tempfile
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        theme = Path(tmp) / "SemabeTest"
+        files = {
+            "symbolic/ui/window-close-symbolic.svg": "<svg/>",
+            "symbolic/ui/xsi-window-close-symbolic.svg": "<svg/>",
+            "symbolic/ui/window-close-symbolic.svg" + BACKUP_SUFFIX: "<svg/>",
+            "16x16/actions/pan-down-symbolic.svg": "<svg/>",
+            "16x16/actions/pan-down-symbolic.png": "png",
+            "16x16/actions/edit-copy.png": "png",
+            "32x32/actions/edit-copy.png": "png",
+            "32x32/actions/.hidden.png": "png",
+            "index.theme": "[Icon Theme]\nName=SemabeTest\n",
+        }
+        for rel, text in files.items():
+            (theme / rel).parent.mkdir(parents=True, exist_ok=True)
+            (theme / rel).write_text(text)
+        for i in range(200):
+            (theme / "48x48/apps" / f"app-{i}.svg").parent.mkdir(parents=True, exist_ok=True)
+            (theme / "48x48/apps" / f"app-{i}.svg").write_text("<svg/>")
 
-    mode, style, target = sys.argv[1], sys.argv[2], sys.argv[3]
+        cache = write_icon_cache(theme)
+        try:
+            icons = read_icon_cache(cache)
+        except (ValueError, TypeError) as e:
+            print(f"❌ TEST: write_icon_cache() – cache does not parse: {e}")
+            return 1
+
+        expected = {
+            "window-close-symbolic": [("symbolic/ui", 2)],
+            "xsi-window-close-symbolic": [("symbolic/ui", 2)],
+            "pan-down-symbolic": [("16x16/actions", 2 | 4)],
+            "edit-copy": [("16x16/actions", 4), ("32x32/actions", 4)],
+            "app-7": [("48x48/apps", 2)],
+        }
+        for name, images in expected.items():
+            if sorted(icons.get(name, [])) != images:
+                print(f"❌ TEST: icon cache – {name}: {icons.get(name)} != {images}")
+                failures += 1
+        if len(icons) != 204 or "index" in icons or ".hidden" in icons:
+            print(f"❌ TEST: icon cache – unexpected icons ({len(icons)})")
+            failures += 1
+        if cache.stat().st_mtime_ns > theme.stat().st_mtime_ns:
+            print("❌ TEST: icon cache – older than its theme directory")
+            failures += 1
+
+        # the cache is rebuilt after an icon swap
+        (theme / "symbolic/ui/window-minimize-symbolic.svg").write_text("<svg/>")
+        write_icon_cache(theme)
+        if "window-minimize-symbolic" not in read_icon_cache(cache):
+            print("❌ TEST: icon cache – not regenerated")
+            failures += 1
+
+        # empty theme and a corrupt cache
+        empty = Path(tmp) / "Empty"
+        empty.mkdir()
+        if read_icon_cache(write_icon_cache(empty)) != {}:
+            print("❌ TEST: icon cache – empty theme")
+            failures += 1
+        cache.write_bytes(cache.read_bytes()[:40])
+        try:
+            read_icon_cache(cache)
+            print("❌ TEST: read_icon_cache() – truncated cache accepted")
+            failures += 1
+        except ValueError:
+            pass
+
+        # preview thumbnails are keyed by path, size and mtime (needs GTK)
+        try:
+            from preview_dialog import thumbnail_path
+        except (ImportError, ValueError):
+            thumbnail_path = None
+            print("ℹ TEST: thumbnail_path() skipped, GTK not available")
+        svg = theme / "symbolic/ui/window-close-symbolic.svg"
+        if thumbnail_path is not None:
+            first = thumbnail_path(svg, 48)
+            if first != thumbnail_path(svg, 48) or first == thumbnail_path(svg, 96):
+                print("❌ TEST: thumbnail_path() – unstable key")
+                failures += 1
+            os.utime(svg, ns=(0, svg.stat().st_mtime_ns + 1_000_000_000))
+            if thumbnail_path(svg, 48) == first or thumbnail_path(theme / "missing.svg", 48) is not None:
+                print("❌ TEST: thumbnail_path() – not invalidated by mtime")
+                failures += 1
+
+        # headless mode: JSON result, no GTK import, no zenity
+        home = Path(tmp) / "home"
+        icons = home / ".local/share/icons/HeadlessTest/symbolic/ui"
+        source = home / ".themes/semabe/symbolic icons/close-minimize-maximize/breeze"
+        icons.mkdir(parents=True)
+        source.mkdir(parents=True)
+        (icons / "window-close-symbolic.svg").write_text("<svg>old</svg>")
+        (source / "window-close-symbolic.svg").write_text("<svg>new</svg>")
+        env = dict(os.environ, HOME=str(home), PATH="")
+        script = str(Path(__file__).resolve())
+        runs = [
+            ("controls", ["--json", "controls", "breeze", "HeadlessTest"], 0, {"replaced": 1, "copied": 1}),
+            ("controls again", ["--json", "controls", "breeze", "HeadlessTest"], 0, {"replaced": 1, "skipped": 2}),
+            ("restore", ["--json", "restore", "-", "HeadlessTest"], 0, {"restored": 1}),
+            ("unknown mode", ["--json", "nope", "-", "HeadlessTest"], 1, {}),
+        ]
+        for label, argv, code, counts in runs:
+            out = subprocess.run(
+                [sys.executable, "-c", "import os, sys, runpy; sys.modules['gi'] = None; "
+                 "sys.argv = sys.argv[1:]; sys.path.insert(0, os.path.dirname(sys.argv[0])); "
+                 "runpy.run_path(sys.argv[0], run_name='__main__')", script, *argv],
+                env=env, capture_output=True, text=True)
+            try:
+                result = json.loads(out.stdout)
+            except ValueError:
+                result = {}
+            if out.returncode != code or any(result.get(k) != v for k, v in counts.items()) \
+                    or (code and not result.get("errors")):
+                print(f"❌ TEST: headless {label} – exit {out.returncode}: {out.stdout}{out.stderr}")
+                failures += 1
+        if (icons / "window-close-symbolic.svg").read_text() != "<svg>old</svg>":
+            print("❌ TEST: headless restore – original not restored")
+            failures += 1
+
+        # SEMABE_PROFILE=<dir>: one trace per run, phases and counts filled in
+        traces = Path(tmp) / "traces"
+        traces.mkdir()
+        subprocess.run([sys.executable, script, "--json", "controls", "breeze", "HeadlessTest"],
+                       env=dict(env, SEMABE_PROFILE=str(traces)), capture_output=True)
+        try:
+            [trace_file] = traces.iterdir()
+            trace = json.loads(trace_file.read_text())
+            phases = {p["name"]: p for p in trace["phases"]}
+            if trace["schema"] != profiling.SCHEMA or trace["tool"] != "replace_symbolic_icon.py" \
+                    or phases["run"]["depth"] != 0 or phases["replace_many"]["depth"] != 1 \
+                    or not phases["ensure_local_copy"]["entries_scanned"] \
+                    or trace["total"]["files_written"] < 2 or trace["total"]["wall_s"] <= 0:
+                print(f"❌ TEST: profile trace – {trace}")
+                failures += 1
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ TEST: profile trace – {e}: {list(traces.iterdir())}")
+            failures += 1
+
+        # journal: dry-run plan, then restore undoes exactly the journaled changes
+        jtheme = home / ".local/share/icons/JournalTest"
+        (jtheme / "16x16/actions").mkdir(parents=True)
+        (jtheme / "16x16/actions/window-close-symbolic.svg").write_text("<svg>orig</svg>")
+        (jtheme / "16x16/actions/other.svg").write_text("<svg/>")
+        before = sorted(str(p.relative_to(jtheme)) for p in jtheme.rglob("*"))
+
+        def cli(*argv):
+            out = subprocess.run([sys.executable, script, "--json", *argv], env=env, capture_output=True, text=True)
+            try:
+                return out.returncode, json.loads(out.stdout)
+            except ValueError:
+                return out.returncode, {"stdout": out.stdout, "stderr": out.stderr}
+
+        code, report = cli("--dry-run", "controls", "breeze", "JournalTest")
+        ops = [(step["op"], Path(step["path"]).name) for step in report.get("plan", [])]
+        expected_ops = [("backup", "window-close-symbolic.svg"), ("copy", "window-close-symbolic.svg"),
+                        ("create", "xsi-window-close-symbolic.svg"), ("create", ICON_CACHE_FILE)]
+        if code != 0 or ops != expected_ops:
+            print(f"❌ TEST: dry-run plan – {ops}")
+            failures += 1
+        after = sorted(str(p.relative_to(jtheme)) for p in jtheme.rglob("*"))
+        if after != before or (home / ".local/share/semabe/icon-journal/JournalTest.jsonl").exists():
+            print("❌ TEST: dry-run plan – files were changed")
+            failures += 1
+
+        cli("controls", "breeze", "JournalTest")
+        cli("controls", "breeze", "JournalTest")
+        code, report = cli("--dry-run", "restore", "-", "JournalTest")
+        restore_ops = [(step["op"], Path(step["path"]).name) for step in report.get("plan", [])]
+        if code != 0 or restore_ops != [("delete", ICON_CACHE_FILE), ("delete", "xsi-window-close-symbolic.svg"),
+                                        ("restore", "window-close-symbolic.svg")]:
+            print(f"❌ TEST: dry-run restore plan – {restore_ops}")
+            failures += 1
+        code, report = cli("restore", "-", "JournalTest")
+        after = sorted(str(p.relative_to(jtheme)) for p in jtheme.rglob("*"))
+        if code != 0 or after != before or report.get("restored") != 1 \
+                or (jtheme / "16x16/actions/window-close-symbolic.svg").read_text() != "<svg>orig</svg>":
+            print(f"❌ TEST: journal restore – {report}, files: {after}")
+            failures += 1
+        if (home / ".local/share/semabe/icon-journal/JournalTest.jsonl").exists():
+            print("❌ TEST: journal restore – journal not removed")
+            failures += 1
+
+        # upgrade: backups made by a version without a journal, then a journaled replace run;
+        # the icon was replaced with other content (a copy is journaled) or with the same one (not)
+        for theme, replaced in (("UpgradeOther", "<svg>older style</svg>"), ("UpgradeSame", "<svg>new</svg>")):
+            icon = home / ".local/share/icons" / theme / "16x16/actions/window-close-symbolic.svg"
+            icon.parent.mkdir(parents=True)
+            icon.write_text(replaced)
+            Path(str(icon) + BACKUP_SUFFIX).write_text("<svg>orig</svg>")
+            (icon.parent / (XSI_PREFIX + icon.name)).write_text(replaced)
+            cli("controls", "breeze", theme)
+            code, report = cli("restore", "-", theme)
+            if code != 0 or report.get("restored") != 1 or icon.read_text() != "<svg>orig</svg>" \
+                    or Path(str(icon) + BACKUP_SUFFIX).exists():
+                print(f"❌ TEST: restore after upgrade ({theme}) – {report}, icon: {icon.read_text()}")
+                failures += 1
+
+        # batch: explicit themes and --all, in worker processes, with one report
+        for name in ("BatchA", "BatchB"):
+            d = home / ".local/share/icons" / name / "symbolic/ui"
+            d.mkdir(parents=True)
+            (d / "window-close-symbolic.svg").write_text("<svg>old</svg>")
+            (d.parent.parent / "index.theme").write_text("[Icon Theme]\nDirectories=symbolic/ui\n")
+        (home / ".local/share/icons/Cursors").mkdir()
+        (home / ".local/share/icons/Cursors/index.theme").write_text("[Icon Theme]\nInherits=x\n")
+        env["XDG_DATA_DIRS"] = str(Path(tmp) / "nowhere")
+        for argv, themes in ((["BatchA", "BatchB"], ["BatchA", "BatchB"]), (["--all"], ["BatchA", "BatchB"])):
+            out = subprocess.run(
+                [sys.executable, script, "--json", "-j", "2", "controls", "breeze", *argv],
+                env=env, capture_output=True, text=True)
+            try:
+                report = json.loads(out.stdout)
+            except ValueError:
+                report = {}
+            if out.returncode != 0 or [t["theme"] for t in report.get("themes", [])] != themes \
+                    or report.get("replaced") != 2:
+                print(f"❌ TEST: batch {argv} – exit {out.returncode}: {out.stdout}{out.stderr}")
+                failures += 1
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+MODES = {
+    "controls": ("Replace window control symbolic icons", "Replacing window control icons in theme:"),
+    "arrows": ("Replace arrow symbolic icons", "Replacing arrow icons in theme:"),
+    "restore": ("Restore original symbolic icons", "Restoring all original symbolic icons in theme:"),
+}
+
+def run(mode: str, style: str, target: str, interactive: bool = True, result: Optional[dict] = None,
+        dry_run: bool = False) -> int:
+    """Replace or restore the symbolic icons of one theme; return the exit status.
+
+    With interactive=False no dialog is shown (the operation is confirmed) and
+    GTK is never imported. `result` collects the counts and the affected paths.
+    Replace runs are journaled (see Journal) so restore only touches those
+    files; with dry_run=True nothing is changed and result["plan"] lists the
+    steps that would be taken.
+    """
+    if result is None:
+        result = {}
+    result.update({"mode": mode, "style": style, "theme": target, "replaced": 0, "restored": 0,
+                   "removed": 0, "skipped": 0, "copied": 0, "linked": 0, "icon_cache": None})
     home = Path.home()
     target_dir = home / ".local/share/icons" / target
+    interactive = interactive and not dry_run
 
     if mode == "controls":
         source_dir = home / f".themes/semabe/symbolic icons/close-minimize-maximize" / style
         all_names = CONTROLS_FILES
         preview_names = CONTROLS_FILES
-        title = "Replace window control symbolic icons"
-        header = "Replacing window control icons in theme:"
     elif mode == "arrows":
         source_dir = home / f".themes/semabe/symbolic icons/arrows" / style
         all_names = ARROW_FILES
         preview_names = ARROW_PREVIEW_FILES
-        title = "Replace arrow symbolic icons"
-        header = "Replacing arrow icons in theme:"
     elif mode == "restore":
         source_dir = None
         all_names = CONTROLS_FILES + ARROW_FILES
-        title = "Restore original symbolic icons"
-        header = "Restoring all original symbolic icons in theme:"
     else:
         zenity_error(f"Unknown mode: {mode}")
-        sys.exit(1)
+        return 1
+    title, header = MODES[mode]
 
     if mode == "restore":
-        confirmed = preview_icons(title, header, Path("."), [], target_dir, show_icons=False)
-        if not confirmed:
-            zenity_error("Operation canceled by user.")
-            sys.exit(0)
+        if interactive:
+            with profiling.phase("preview"):
+                confirmed = preview_icons(title, header, Path("."), [], target_dir, show_icons=False)
+            if not confirmed:
+                zenity_error("Operation canceled by user.")
+                return 0
 
+        plan = Journal(dry_run=dry_run)
+        if dry_run:
+            result["plan"] = plan.entries
+        entries = load_journal(journal_path(target))
         restored = 0
-        if target_dir.exists():
-            restored += restore_from_backups(target_dir, CONTROLS_FILES)
-            restored += restore_from_backups(target_dir, ARROW_FILES)
-
-        if restored == 0:
-            adwaita_dir = Path.home() / ".local/share/icons/Adwaita/symbolic/ui"
-            if adwaita_dir.exists():
-                removed = 0
-                for name in CONTROLS_FILES + ARROW_FILES:
-                    for dest in adwaita_dir.rglob(name):
-                        try:
+        roots = set()
+        if entries:
+            # O(changed): undo exactly what the journaled replace runs did
+            with profiling.phase("restore_from_journal"):
+                counts = restore_from_journal(entries, plan)
+            result.update(restored=counts["restored"], removed=counts["removed"])
+            restored = counts["restored"] + counts["removed"]
+            if not dry_run and counts["failed"] == 0:
+                journal_path(target).unlink(missing_ok=True)
+            # caches created by the replace runs were removed with them
+            roots = {theme_root(Path(e["path"])) for e in entries}
+        if not entries or result["restored"] == 0:
+            # no journal, or one started after the backups were made (older versions)
+            backups_restored = 0
+            if target_dir.exists():
+                with profiling.phase("scan"):
+                    found = scan_icons(target_dir, CONTROLS_FILES + ARROW_FILES)
+                with profiling.phase("restore_from_backups"):
+                    backups_restored += restore_from_backups(target_dir, CONTROLS_FILES, found, plan)
+                    backups_restored += restore_from_backups(target_dir, ARROW_FILES, found, plan)
+            result["restored"] = backups_restored
+            restored += backups_restored
+
+            if restored == 0 and not entries:
+                adwaita_dir = Path.home() / ".local/share/icons/Adwaita/symbolic/ui"
+                if adwaita_dir.exists():
+                    removed = 0
+                    with profiling.phase("scan"):
+                        found = scan_icons(adwaita_dir, CONTROLS_FILES + ARROW_FILES)
+                    for name in CONTROLS_FILES + ARROW_FILES:
+                        for dest in found[name]:
                             xsi_file = dest.parent / (XSI_PREFIX + dest.name)
-                            xsi_file.unlink(missing_ok=True)
-                            dest.unlink(missing_ok=True)
                             removed += 1
-                        except Exception:
-                            pass
-                if removed > 0:
-                    restored = removed
+                            if not (plan.record("delete", xsi_file) and plan.record("delete", dest)):
+                                continue
+                            try:
+                                xsi_file.unlink(missing_ok=True)
+                                dest.unlink(missing_ok=True)
+                            except Exception:
+                                removed -= 1
+                    if removed > 0:
+                        restored = removed
+                        result["removed"] = removed
+            roots |= {theme_root(target_dir), theme_root(home / ".local/share/icons/Adwaita")}
 
         if restored > 0:
-            sys.exit(0)
+            if dry_run:
+                return 0
+            for root in roots:
+                if root is not None and (root / ICON_CACHE_FILE).exists():
+                    with profiling.phase("icon_cache"):
+                        cache = write_icon_cache(root)
+                    if cache is not None and root == theme_root(target_dir):
+                        result["icon_cache"] = str(cache)
+            return 0
         else:
             zenity_error("No backup files (.semabe.bak) found to restore.")
-            sys.exit(1)
+            return 1
 
     if not source_dir.exists():
         zenity_error(f"Source directory not found:\n{source_dir}")
-        sys.exit(1)
-
-    confirmed = preview_icons(title, header, source_dir, preview_names, target_dir)
-    if not confirmed:
-        zenity_error("Operation canceled by user.")
-        sys.exit(0)
-
-    alt = ensure_local_copy(target, all_names, source_dir)
-    if alt is None:
-        zenity_error(f"Icon theme '{target}' not found or incompatible.")
-        sys.exit(1)
-    
-    target_dir = alt
-    replaced = replace_many(source_dir, target_dir, all_names)
-    
+        return 1
+
+    if interactive:
+        with profiling.phase("preview"):
+            confirmed = preview_icons(title, header, source_dir, preview_names, target_dir)
+        if not confirmed:
+            zenity_error("Operation canceled by user.")
+            return 0
+
+    journal = Journal(journal_path(target), dry_run=dry_run, header={"mode": mode, "style": style})
+    if dry_run:
+        result["plan"] = journal.entries
+    try:
+        with profiling.phase("ensure_local_copy"):
+            alt = ensure_local_copy(target, all_names, source_dir, journal)
+        if alt is None:
+            zenity_error(f"Icon theme '{target}' not found or incompatible.")
+            return 1
+
+        target_dir = alt
+        result["target_dir"] = str(target_dir)
+        found = None
+        if dry_run:
+            # the files ensure_local_copy() would have copied in
+            found = scan_icons(target_dir, all_names) if target_dir.is_dir() else {}
+            for entry in journal.entries:
+                path = Path(entry["path"])
+                if entry["op"] == "create" and path.name in all_names and target_dir in path.parents:
+                    found.setdefault(path.name, []).append(path)
+        stats = {}
+        with profiling.phase("replace_many"):
+            replaced = replace_many(source_dir, target_dir, all_names, found=found, stats=stats, journal=journal)
+        result.update(stats, replaced=replaced)
+
+        root = theme_root(target_dir)
+        if replaced > 0 and root is not None and (
+                stats["copied"] or stats["linked"] or not (root / ICON_CACHE_FILE).exists()):
+            cache = root / ICON_CACHE_FILE
+            if journal.record("cache" if cache.exists() else "create", cache):
+                with profiling.phase("icon_cache"):
+                    cache = write_icon_cache(root)
+                result["icon_cache"] = str(cache) if cache else None
+    finally:
+        journal.close()
+
     if replaced > 0:
-        sys.exit(0)
+        return 0
     else:
         zenity_error(f"No matching files found in:\n{target_dir}")
-        sys.exit(1)
+        return 1
+
+def _print_result(result: dict, status: int):
+    for step in result.get("plan", []):
+        detail = f"  ← {step['source']}" if "source" in step else f"  → {step['backup']}" if "backup" in step else ""
+        print(f"  {step['op']:8} {step['path']}{detail}")
+    if result.get("mode") in ("controls", "arrows") and "target_dir" in result:
+        print(f"replaced: {result['replaced']} (skipped: {result['skipped']}, copied: {result['copied']}, "
+              f"linked: {result['linked']})")
+    elif result.get("mode") == "restore" and status == 0:
+        print(f"restored: {result['restored']} (removed: {result['removed']})")
+
+def main():
+    global _headless
+
+    parser = argparse.ArgumentParser(description="Replace or restore the symbolic icons of icon themes")
+    parser.add_argument("mode", nargs="?", help="controls, arrows or restore")
+    parser.add_argument("style", nargs="?", help="icon style (ignored by restore)")
+    parser.add_argument("themes", nargs="*", help="icon themes below ~/.local/share/icons")
+    parser.add_argument("--all", action="store_true",
+                        help="all installed icon themes that contain the symbolic icons")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes for several themes (default: CPU count)")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="non-interactive: no preview dialog, no GTK, errors on stderr")
+    parser.add_argument("--json", action="store_true", help="non-interactive, print the result as JSON")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="print the plan of every file operation without changing anything")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help=f"write a JSON trace of the run (default: ~/.cache/semabe/traces; "
+                             f"or set {profiling.ENV_VAR})")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    args = parser.parse_args()
+
+    if args.run_tests:
+        sys.exit(run_tests())
+
+    _headless = args.yes or args.json or args.dry_run
+    _errors.clear()
+    profiling.start("replace_symbolic_icon.py", args.profile)
+    try:
+        themes = list(dict.fromkeys(args.themes))
+        if args.all and args.mode:
+            names = {"controls": CONTROLS_FILES, "arrows": ARROW_FILES}.get(args.mode, CONTROLS_FILES + ARROW_FILES)
+            with profiling.phase("installed_icon_themes"):
+                themes += [t for t in installed_icon_themes(names) if t not in themes]
+
+        result = {}
+        if not themes:
+            zenity_error("Usage:\nreplace_symbolic_icon.py [--yes|--json] <mode> <style> <theme_dir>... | --all")
+            status = 1
+        elif len(themes) == 1 and not args.all:
+            with profiling.phase("run"):
+                status = run(args.mode, args.style, themes[0], interactive=not _headless, result=result,
+                             dry_run=args.dry_run)
+        else:
+            # the workers are not traced; the phase holds their CPU time
+            with profiling.phase("run_batch"):
+                result = run_batch(args.mode, args.style, themes, interactive=not _headless, workers=args.jobs,
+                                   dry_run=args.dry_run)
+            status = result["status"]
+    finally:
+        profiling.finish()
+
+    if args.json:
+        result.update(status=status, errors=list(_errors))
+        print(json.dumps(result, indent=2))
+    else:
+        if "themes" in result:
+            for item in result["themes"]:
+                print(f"{item['theme']}: ", end="")
+                _print_result(item, item["status"])
+                if item["status"] != 0:
+                    print("failed: " + "; ".join(item["errors"]))
+            print(f"total: replaced {result['replaced']}, restored {result['restored']} "
+                  f"in {len(result['themes'])} themes")
+        else:
+            _print_result(result, status)
+        for error in _errors:
+            print(error, file=sys.stderr)
+    sys.exit(status)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helper service latency benchmark
+
+Compares what the extension pays per request with and without the helper
+service (semabe-theme-selector@sewbej/helper_service.py), in a temporary HOME:
+
+- flatpak  – `python3 flatpak.py <theme>` spawned cold vs. a warm "flatpak" request
+- icons    – `python3 replace_symbolic_icon.py --yes controls breeze <theme>` spawned
+             cold vs. the same warm "icons" request (headless: no GTK on either side)
+
+    tools/bench_helper.py --repeat 20 --output helper.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+EXT_DIR = REPO_DIR / "semabe-theme-selector@sewbej"
+THEME = "semabe/legacy/Semabe Steel Opaque (legacy)"
+
+ICON_THEME = "BenchIcons"
+
+sys.path.insert(0, str(EXT_DIR))
+import helper_service  # noqa: E402
+import replace_symbolic_icon  # noqa: E402
+
+
+def _timed(fn: Callable[[], None], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _summary(times: List[float]) -> dict:
+    ordered = sorted(times)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "min_ms": round(ordered[0] * 1000, 2),
+    }
+
+
+def _start_service(env: dict, sock: Path) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, str(EXT_DIR / "helper_service.py")], env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            helper_service.request("ping", path=sock, timeout=5)
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("helper service exited during start-up")
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("helper service did not start")
+
+
+def run_bench(repeat: int, output: Optional[Path]) -> dict:
+    with tempfile.TemporaryDirectory(prefix="semabe-bench-helper-") as tmp:
+        home = Path(tmp) / "home"
+        runtime = Path(tmp) / "run"
+        overrides = home / ".local/share/flatpak/overrides/global"
+        overrides.parent.mkdir(parents=True)
+        overrides.write_text("[Context]\nfilesystems=~/.themes;/usr/share/themes\n")
+        runtime.mkdir(mode=0o700)
+        source = home / ".themes/semabe/symbolic icons/close-minimize-maximize/breeze"
+        icons = home / ".local/share/icons" / ICON_THEME / "symbolic/ui"
+        source.mkdir(parents=True)
+        icons.mkdir(parents=True)
+        for name in replace_symbolic_icon.CONTROLS_FILES:
+            (source / name).write_text(f"<svg><!-- breeze {name} --></svg>")
+            (icons / name).write_text(f"<svg><!-- {name} --></svg>")
+        env = dict(os.environ, HOME=str(home), XDG_RUNTIME_DIR=str(runtime))
+        sock = runtime / helper_service.SOCKET_NAME
+        icon_args = ["--yes", "controls", "breeze", ICON_THEME]
+
+        def cold_flatpak():
+            subprocess.run([sys.executable, str(EXT_DIR / "flatpak.py"), THEME], env=env, check=True)
+
+        def cold_icons():
+            subprocess.run([sys.executable, str(EXT_DIR / "replace_symbolic_icon.py"), *icon_args],
+                           env=env, check=True, stdout=subprocess.DEVNULL)
+
+        proc = _start_service(env, sock)
+        try:
+            def warm_flatpak():
+                if helper_service.request("flatpak", [THEME], path=sock)["status"] != 0:
+                    raise RuntimeError("flatpak request failed")
+
+            def warm_icons():
+                reply = helper_service.request("icons", icon_args, path=sock, timeout=30)
+                if reply["status"] != 0:
+                    raise RuntimeError(f"icons request failed: {reply}")
+
+            results = []
+            for case, cold, warm in (("flatpak", cold_flatpak, warm_flatpak),
+                                     ("icons", cold_icons, warm_icons)):
+                cold_s, warm_s = _summary(_timed(cold, repeat)), _summary(_timed(warm, repeat))
+                speedup = round(cold_s["median_ms"] / warm_s["median_ms"], 1) if warm_s["median_ms"] else None
+                results.append({"case": case, "cold": cold_s, "warm": warm_s, "speedup": speedup})
+                print(f"⏱ {case:8} cold {cold_s['median_ms']:8.2f} ms  warm {warm_s['median_ms']:7.2f} ms  "
+                      f"(×{speedup})")
+        finally:
+            helper_service.request("quit", path=sock, timeout=5)
+            proc.wait(10)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "results": results,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ Results saved: {output}")
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Semabe helper service latency benchmark")
+    parser.add_argument("--repeat", type=int, default=10, help="requests per case")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+    run_bench(args.repeat, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
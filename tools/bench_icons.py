@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Symbolic icon script benchmark
+
+Measures replace_symbolic_icon.py in a temporary HOME with a synthetic icon
+theme:
+
+- startup  – a cold headless run (`--json controls …`, GTK never imported)
+             vs. the interactive path up to the point where the preview dialog
+             can be shown (script + preview_dialog imported, GTK initialised)
+- trees    – ensure_local_copy(), replace_many(), restore_from_backups() and
+             the Adwaita fallback, in process, on Papirus- and Mint-Y-shaped
+             themes from a few hundred (tiny) to 100k files (large). Every case
+             reports the wall time and, from the script's --profile counters,
+             the directory entries visited and the files written. A replace
+             followed by a restore must leave the theme byte-identical.
+
+    tools/bench_icons.py --repeat 10 --output icons.json
+    tools/bench_icons.py --scales tiny large --shapes papirus --repeat 3
+    tools/bench_icons.py --run-tests
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+EXT_DIR = REPO_DIR / "semabe-theme-selector@sewbej"
+SCRIPT = EXT_DIR / "replace_symbolic_icon.py"
+
+CONTROLS = ["window-close-symbolic.svg", "window-maximize-symbolic.svg",
+            "window-minimize-symbolic.svg", "window-restore-symbolic.svg"]
+ARROWS = ["pan-down-symbolic.svg", "pan-end-symbolic.svg", "pan-start-symbolic.svg", "pan-up-symbolic.svg"]
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="16" height="16"><path d="M{0} 4h8v8H{0}z"/></svg>\n'
+
+# approximate number of files of a synthetic theme
+SCALES = {"tiny": 300, "small": 5_000, "medium": 25_000, "large": 100_000}
+SHAPES = ("papirus", "mint-y")
+PAPIRUS_SIZES = ("16x16", "18x18", "22x22", "24x24", "32x32", "48x48", "64x64", "symbolic")
+PAPIRUS_CONTEXTS = ("actions", "apps", "categories", "devices", "emblems", "mimetypes", "places", "status", "panel")
+MINT_Y_CONTEXTS = ("actions", "apps", "categories", "devices", "emblems", "mimetypes", "places", "status")
+MINT_Y_SIZES = ("16", "16@2x", "22", "22@2x", "24", "24@2x", "32", "32@2x", "48", "48@2x",
+                "64", "64@2x", "96", "128", "256", "scalable", "symbolic")
+
+INTERACTIVE_STARTUP = (
+    "import sys; sys.path.insert(0, sys.argv[1]); "
+    "import replace_symbolic_icon, preview_dialog; "
+    "from gi.repository import Gtk; Gtk.init_check(None)"
+)
+
+
+def make_source(home: Path) -> Path:
+    """The "breeze" window control icons the benchmark puts into the themes."""
+    source = home / ".themes/semabe/symbolic icons/close-minimize-maximize/breeze"
+    source.mkdir(parents=True, exist_ok=True)
+    for name in CONTROLS:
+        (source / name).write_text(SVG.format(2))
+    return source
+
+
+def make_theme(home: Path, theme: str = "BenchIcons", sizes: int = 6, filler: int = 50) -> Path:
+    """Icon theme shaped like the usual ones: per-size context dirs plus filler icons."""
+    root = home / ".local/share/icons" / theme
+    (root / "index.theme").parent.mkdir(parents=True)
+    (root / "index.theme").write_text(f"[Icon Theme]\nName={theme}\n")
+    for size in (16, 22, 24, 32, 48, 64)[:sizes]:
+        for context in ("actions", "apps", "places", "status"):
+            d = root / f"{size}x{size}" / context
+            d.mkdir(parents=True)
+            for i in range(filler):
+                (d / f"filler-{i}.svg").write_text(SVG.format(i % 8))
+        for name in CONTROLS:
+            (root / f"{size}x{size}" / "actions" / name).write_text(SVG.format(1))
+    make_source(home)
+    return root
+
+
+def shape_dirs(shape: str) -> List[Tuple[str, bool]]:
+    """(directory, holds the symbolic icons) of a theme laid out like Papirus or Mint-Y.
+
+    Papirus nests context directories in size directories (16x16/actions),
+    Mint-Y the other way round (actions/16@2x).
+    """
+    if shape == "papirus":
+        return [(f"{size}/{context}", context in ("actions", "panel") and size in ("16x16", "22x22", "symbolic"))
+                for size in PAPIRUS_SIZES for context in PAPIRUS_CONTEXTS]
+    return [(f"{context}/{size}", context == "actions" and size in ("16", "16@2x", "symbolic"))
+            for context in MINT_Y_CONTEXTS for size in MINT_Y_SIZES]
+
+
+def make_shaped_theme(root: Path, shape: str, files: int, icons: bool = True) -> int:
+    """Write a synthetic theme of about `files` files below root; return the number written.
+
+    Every fourth filler icon is a symlink to its neighbour, the way Papirus and
+    Mint-Y ship icon aliases. The directories get an old mtime, so the
+    script's icon index may keep them (it ignores directories changed in the
+    last seconds).
+    """
+    dirs = shape_dirs(shape)
+    per_dir = max(1, files // len(dirs))
+    root.mkdir(parents=True)
+    (root / "index.theme").write_text(
+        f"[Icon Theme]\nName={root.name}\nDirectories={','.join(d for d, _icons in dirs)}\n")
+    written = 1
+    for rel, has_icons in dirs:
+        d = root / rel
+        d.mkdir(parents=True, exist_ok=True)
+        for i in range(per_dir):
+            if i % 4 == 3:
+                (d / f"filler-{i}.svg").symlink_to(f"filler-{i - 1}.svg")
+            else:
+                (d / f"filler-{i}.svg").write_text(SVG.format(i % 8))
+        written += per_dir
+        if icons and has_icons:
+            for name in CONTROLS + ARROWS:
+                (d / name).write_text(SVG.format(1))
+            written += len(CONTROLS) + len(ARROWS)
+    old = time.time() - 3600
+    for d in [root, *(p for p in root.rglob("*") if p.is_dir() and not p.is_symlink())]:
+        os.utime(d, (old, old))
+    return written
+
+
+def snapshot(root: Path) -> Dict[str, tuple]:
+    """Every path below root with its kind and content (file bytes, link target)."""
+    tree = {}
+    for path in root.rglob("*"):
+        rel = path.relative_to(root).as_posix()
+        if path.is_symlink():
+            tree[rel] = ("link", os.readlink(path))
+        elif path.is_dir():
+            tree[rel] = ("dir",)
+        else:
+            tree[rel] = ("file", path.read_bytes())
+    return tree
+
+
+def load_script(home: Path):
+    """Import replace_symbolic_icon with HOME (index, journal, local themes) in `home`.
+
+    System themes are looked up in home/system-icons instead of /usr/share/icons.
+    """
+    os.environ["HOME"] = str(home)
+    sys.path.insert(0, str(EXT_DIR))
+    import replace_symbolic_icon
+    replace_symbolic_icon._headless = True
+    replace_symbolic_icon.SYSTEM_ICONS_DIR = home / "system-icons"
+    replace_symbolic_icon.ICON_INDEX = home / ".cache/semabe/icon-index.json"
+    replace_symbolic_icon.JOURNAL_DIR = home / ".local/share/semabe/icon-journal"
+    return replace_symbolic_icon
+
+
+def _reset_index(script) -> None:
+    script.ICON_INDEX.unlink(missing_ok=True)
+    script._icon_index = None
+
+
+def _counted(script, fn: Callable[[], object], trace: Path) -> Tuple[float, dict, object]:
+    """Run fn once with the script's profiler on; (seconds, counts, fn's result)."""
+    import profiling
+    profiler = profiling.start("bench_icons.py", str(trace))
+    start = time.perf_counter()
+    try:
+        value = fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        counts = dict(profiler.counts)
+        profiling.finish()
+    return elapsed, counts, value
+
+
+def bench_tree(script, home: Path, shape: str, scale: str, repeat: int) -> List[dict]:
+    """Time the file operations of the script on one synthetic theme shape and size."""
+    base = home / ".local/share/icons"
+    system = script.SYSTEM_ICONS_DIR
+    source = make_source(home)
+    name = f"{'Papirus' if shape == 'papirus' else 'Mint-Y'}-{scale}"
+    trace = home / "bench-trace.json"
+
+    files = make_shaped_theme(system / name, shape, SCALES[scale])
+    make_shaped_theme(base / f"{name}-local", shape, SCALES[scale])
+    # no symbolic icons and no parent theme to fall back on: icons go to Adwaita
+    make_shaped_theme(system / f"Bench-{shape}-{scale}-noicons", shape, SCALES[scale], icons=False)
+
+    rows = []
+
+    def case(label: str, fn: Callable[[], object], setup: Optional[Callable[[], None]] = None,
+             check: Optional[Callable[[object], Optional[str]]] = None) -> None:
+        times = []
+        counts = {}
+        error = None
+        for _ in range(repeat):
+            if setup:
+                setup()
+            elapsed, counts, value = _counted(script, fn, trace)
+            times.append(elapsed)
+            if check and error is None:
+                error = check(value)
+        row = {"case": label, "shape": shape, "scale": scale, "files": files, **_summary(times),
+               "entries_scanned": counts["entries_scanned"], "files_written": counts["files_written"],
+               "bytes_written": counts["bytes_written"]}
+        if check:
+            row["error"] = error
+        rows.append(row)
+
+    def fresh_local_copy():
+        shutil.rmtree(base / name, ignore_errors=True)
+        _reset_index(script)
+
+    def copied(result):
+        expected = sum(has for _d, has in shape_dirs(shape)) * len(CONTROLS)
+        got = len([p for p in (base / name).rglob("*-symbolic.svg")]) if result else 0
+        return None if got == expected else f"{got} icons copied, expected {expected}"
+
+    case("ensure_local_copy system", lambda: script.ensure_local_copy(name, CONTROLS, source),
+         setup=fresh_local_copy, check=copied)
+    local = base / f"{name}-local"
+    case("ensure_local_copy local cold", lambda: script.ensure_local_copy(f"{name}-local", CONTROLS, source),
+         setup=lambda: _reset_index(script), check=lambda d: None if d == local else f"returned {d}")
+    case("ensure_local_copy local warm", lambda: script.ensure_local_copy(f"{name}-local", CONTROLS, source))
+
+    # replace and restore alternate; the tree must come back byte for byte
+    before = snapshot(local)
+    changed = []
+
+    def replaced(count):
+        changed.append(snapshot(local) != before)
+        return None if count > 0 else "nothing replaced"
+
+    def restored(count):
+        if count <= 0:
+            return "nothing restored"
+        after = snapshot(local)
+        if after != before:
+            diff = sorted(set(after) ^ set(before)) or sorted(k for k in after if after[k] != before[k])
+            return f"tree differs after restore: {diff[:5]}"
+        return None
+
+    replace_times, restore_times = [], []
+    replace_counts = restore_counts = {}
+    errors = []
+    for _ in range(repeat):
+        _reset_index(script)
+        elapsed, replace_counts, count = _counted(
+            script, lambda: script.replace_many(source, local, CONTROLS), trace)
+        replace_times.append(elapsed)
+        errors.append(replaced(count))
+        _reset_index(script)
+        elapsed, restore_counts, count = _counted(
+            script, lambda: script.restore_from_backups(local, CONTROLS), trace)
+        restore_times.append(elapsed)
+        errors.append(restored(count))
+    if not all(changed):
+        errors.append("replace left the theme unchanged")
+    for label, times, counts in (("replace_many", replace_times, replace_counts),
+                                 ("restore_from_backups", restore_times, restore_counts)):
+        rows.append({"case": label, "shape": shape, "scale": scale, "files": files, **_summary(times),
+                     "entries_scanned": counts["entries_scanned"], "files_written": counts["files_written"],
+                     "bytes_written": counts["bytes_written"],
+                     "error": next((e for e in errors if e), None)})
+
+    adwaita = base / "Adwaita/symbolic/ui"
+
+    def fallback():
+        target = script.ensure_local_copy(f"Bench-{shape}-{scale}-noicons", CONTROLS, source)
+        return target, script.replace_many(source, target, CONTROLS)
+
+    def fresh_adwaita():
+        shutil.rmtree(base / "Adwaita", ignore_errors=True)
+        _reset_index(script)
+
+    case("adwaita_fallback", fallback, setup=fresh_adwaita,
+         check=lambda r: None if r[0] == adwaita and r[1] == len(CONTROLS) else f"returned {r}")
+    shutil.rmtree(base / "Adwaita", ignore_errors=True)
+    return rows
+
+
+def _timed(fn: Callable[[], None], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _summary(times: List[float]) -> dict:
+    ordered = sorted(times)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "min_ms": round(ordered[0] * 1000, 2),
+    }
+
+
+def bench_startup(home: Path, repeat: int) -> dict:
+    env = dict(os.environ, HOME=str(home))
+
+    def headless():
+        out = subprocess.run([sys.executable, str(SCRIPT), "--json", "controls", "breeze", "BenchIcons"],
+                             env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"headless run failed:\n{out.stdout}{out.stderr}")
+
+    def interactive():
+        subprocess.run([sys.executable, "-c", INTERACTIVE_STARTUP, str(EXT_DIR)],
+                       env=env, capture_output=True, check=True)
+
+    result = {"case": "startup", "headless": _summary(_timed(headless, repeat))}
+    try:
+        interactive()
+        result["interactive"] = _summary(_timed(interactive, repeat))
+        result["speedup"] = round(result["interactive"]["median_ms"] / result["headless"]["median_ms"], 1)
+    except subprocess.CalledProcessError:
+        result["interactive"] = None  # no GTK on this machine
+    return result
+
+
+def run_bench(repeat: int, output: Optional[Path], scales: List[str] = ("tiny", "small", "medium"),
+              shapes: List[str] = SHAPES) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="semabe-bench-icons-") as tmp:
+        home = Path(tmp) / "home"
+        make_theme(home)
+        results.append(bench_startup(home, repeat))
+        script = load_script(home)
+        for shape in shapes:
+            for scale in scales:
+                print(f"⏳ {shape} {scale}…")
+                results.extend(bench_tree(script, home, shape, scale, repeat))
+
+    for r in results:
+        if r["case"] == "startup":
+            interactive = r.get("interactive")
+            print(f"⏱ {r['case']:8} headless {r['headless']['median_ms']:8.2f} ms  interactive "
+                  + (f"{interactive['median_ms']:8.2f} ms  (×{r['speedup']})" if interactive else "n/a (no GTK)"))
+        else:
+            print(f"⏱ {r['shape']:7} {r['scale']:6} {r['files']:7d} files  {r['case']:28} {r['median_ms']:9.2f} ms "
+                  f"{r['entries_scanned']:8d} entries {r['files_written']:5d} written"
+                  + (f"  ❌ {r['error']}" if r.get("error") else ""))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "results": results,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ Results saved: {output}")
+    return report
+
+
+def run_tests() -> int:
+    """Replace/restore round trips on tiny themes of both shapes, in a temporary HOME.
+    Return 0 on success, non-zero on failure.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix="semabe-test-icons-") as tmp:
+        home = Path(tmp) / "home"
+        script = load_script(home)
+
+        # 1) every case of both shapes: no errors, scans visit the tree, copies are counted
+        for shape in SHAPES:
+            rows = {r["case"]: r for r in bench_tree(script, home, shape, "tiny", 2)}
+            for label, r in rows.items():
+                if r.get("error"):
+                    print(f"❌ TEST: {shape} {label} – {r['error']}")
+                    failures += 1
+            if rows["ensure_local_copy local cold"]["entries_scanned"] < rows["replace_many"]["files"] \
+                    or rows["ensure_local_copy local warm"]["entries_scanned"] != 0:
+                print(f"❌ TEST: {shape} – index not used: {rows['ensure_local_copy local warm']}")
+                failures += 1
+            icons = sum(has for _d, has in shape_dirs(shape)) * len(CONTROLS)
+            if rows["ensure_local_copy system"]["files_written"] != icons \
+                    or rows["replace_many"]["files_written"] < 2 * icons:
+                print(f"❌ TEST: {shape} – copies not counted: {rows['replace_many']}")
+                failures += 1
+
+        # 2) run() with its journal: controls then restore leaves the theme as it was
+        local = home / ".local/share/icons/Papirus-tiny-local"
+        before = snapshot(local)
+        result = {}
+        status = script.run("controls", "breeze", local.name, interactive=False, result=result)
+        middle = snapshot(local)
+        status += script.run("restore", "-", local.name, interactive=False)
+        if status != 0 or middle == before or snapshot(local) != before:
+            print(f"❌ TEST: run() controls + restore – status {status}, {result.get('replaced')} replaced")
+            failures += 1
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Semabe symbolic icon script benchmark")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per case; the median is reported")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["tiny", "small", "medium"],
+                        help="synthetic theme sizes (" + ", ".join(f"{k}: ~{v} files" for k, v in SCALES.items()) + ")")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES), help="theme layouts")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    args = parser.parse_args()
+    if args.run_tests:
+        return run_tests()
+    report = run_bench(args.repeat, args.output, args.scales, args.shapes)
+    return 1 if any(r.get("error") for r in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
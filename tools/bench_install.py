@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Installer benchmark suite
+
+Generates synthetic archives shaped like the real semabe.tar.xz variant matrix
+(color × transparency × controls × size × layout) and runs them through the
+installer in a temporary HOME:
+
+- extract()           – serial extraction of both archives
+- extract_parallel()  – concurrent / multi-block extraction
+- clean_existing()    – removal of an installed tree: the rename aside
+                        (`rename_s`) plus the background deletion (`wall_s`)
+- main()              – full install flow (`-y`), then a second (delta) install
+
+Every case runs in its own process and records wall time, peak RSS, files per
+second and bytes written. Cases that start from an installed tree are seeded by
+a separate installer process, so the numbers cover the measured step only. Results are saved as JSON so releases can be compared:
+
+    tools/bench_install.py --scale medium --output bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+COLORS = ["Azure", "Cinnamon", "Crimson", "Falcon", "Grey", "Mint", "Nordic", "Steel", "Violet"]
+TRANSPARENCIES = ["Glassy", "Translucent", "Opaque"]
+# sizes per window-control style, as in ThemeSelectorExtension._validateSize()
+CONTROLS = {
+    "legacy": ["L"],
+    "ambiance": ["M", "L"],
+    "macOS": ["S", "M", "L", "XL", "XXL"],
+    "breeze": ["S", "M", "L", "XL", "XXL"],
+    "LED": ["S", "M", "L"],
+    "zephyr": ["S", "M", "L"],
+    "human": ["S", "M", "L"],
+}
+CLASSIC_CONTROLS = {"macOS", "breeze", "human"}
+LAYOUTS = {"R": "right", "L": "left", "M": "classic_mac", "G": "gnome"}
+SIZE_NAMES = {"S": "small", "M": "medium", "L": "large", "XL": "extra-large", "XXL": "extra-extra-large"}
+
+# scale presets: (colors, transparencies, control styles, css size in KiB)
+SCALES = {
+    "tiny": (1, 1, ["legacy", "macOS"], 8),
+    "small": (2, 2, ["legacy", "ambiance", "macOS"], 32),
+    "medium": (3, 3, list(CONTROLS), 64),
+    "full": (len(COLORS), len(TRANSPARENCIES), list(CONTROLS), 192),
+}
+
+CASES = ["extract", "extract_parallel", "clean_existing", "main", "main_delta"]
+
+
+def variant_paths(colors: List[str], transparencies: List[str], controls: List[str]) -> List[str]:
+    """Variant directories below ~/.themes, following buildThemePath() of the extension."""
+    paths = []
+    for c in controls:
+        for color in colors:
+            for transparency in transparencies:
+                if c == "legacy":
+                    paths.append(f"semabe/legacy/Semabe {color} {transparency} (legacy)")
+                    continue
+                for size in CONTROLS[c]:
+                    if c in CLASSIC_CONTROLS:
+                        paths.append(f"semabe/{c}/{SIZE_NAMES[size]}/Semabe {color} {transparency} ({c}){size}")
+                        continue
+                    for letter, layout in LAYOUTS.items():
+                        paths.append(
+                            f"semabe/{c}/{layout}/{SIZE_NAMES[size]}/Semabe {color} {transparency} ({c}){size}{letter}")
+    return paths
+
+
+def _css(rng: random.Random, kib: int) -> bytes:
+    """Stylesheet-like text: repetitive selectors and declarations, compresses like the real files."""
+    out = []
+    size = 0
+    while size < kib * 1024:
+        rule = (f".widget-{rng.randrange(400)} .child:{rng.choice(['hover', 'active', 'backdrop'])} {{\n"
+                f"  background-color: mix(@theme_color2, @theme_color, 0.{rng.randrange(1000):03d});\n"
+                f"  border-radius: {rng.randrange(20)}px; }}\n")
+        out.append(rule)
+        size += len(rule)
+    return "".join(out).encode()
+
+
+def make_archives(out_dir: Path, scale: str, seed: int = 1) -> dict:
+    """Write synthetic semabe.tar.xz and extension archives into out_dir; return their stats."""
+    n_colors, n_transparencies, controls, css_kib = SCALES[scale]
+    rng = random.Random(seed)
+    src = out_dir / "src"
+    paths = variant_paths(COLORS[:n_colors], TRANSPARENCIES[:n_transparencies], controls)
+
+    shared_png = bytes(rng.randrange(256) for _ in range(2048))
+    for rel in paths:
+        variant = src / rel
+        for toolkit, kib in (("gtk-3.0", css_kib), ("gtk-4.0", css_kib * 4 // 5), ("cinnamon", css_kib * 2 // 5)):
+            (variant / toolkit).mkdir(parents=True)
+            name = "cinnamon.css" if toolkit == "cinnamon" else "gtk.css"
+            (variant / toolkit / name).write_bytes(_css(rng, kib))
+            if toolkit != "cinnamon":
+                (variant / toolkit / "window_controls.css").write_bytes(_css(random.Random(len(toolkit)), 6))
+        (variant / "libadwaita-1.5").mkdir()
+        (variant / "libadwaita-1.5" / "base.css").write_text('@import url("../gtk-4.0/gtk.css");\n')
+        (variant / "assets").mkdir()
+        for state in ("checked", "unchecked", "mixed"):
+            for suffix in ("", "@2"):
+                (variant / "assets" / f"checkbox-{state}-dark{suffix}.png").write_bytes(shared_png)
+    icons = src / "semabe" / "symbolic icons" / "arrows" / "Breeze"
+    icons.mkdir(parents=True)
+    (icons / "pan-down-symbolic.svg").write_text("<svg/>")
+
+    ext = src / "semabe-theme-selector@sewbej"
+    shutil.copytree(REPO_DIR / "semabe-theme-selector@sewbej", ext)
+
+    theme_archive = out_dir / "semabe.tar.xz"
+    with tarfile.open(theme_archive, "w:xz") as tar:
+        tar.add(src / "semabe", arcname="semabe")
+    ext_archive = out_dir / "semabe-theme-selector@sewbej.tar.xz"
+    with tarfile.open(ext_archive, "w:xz") as tar:
+        tar.add(ext, arcname="semabe-theme-selector@sewbej")
+    shutil.rmtree(src)
+
+    return {
+        "scale": scale,
+        "variants": len(paths),
+        "theme_archive_bytes": theme_archive.stat().st_size,
+        "ext_archive_bytes": ext_archive.stat().st_size,
+    }
+
+
+def _io_counters() -> dict:
+    """rchar/wchar/read_bytes/write_bytes of this process (Linux), empty elsewhere."""
+    try:
+        lines = Path("/proc/self/io").read_text().splitlines()
+    except OSError:
+        return {}
+    return {k: int(v) for k, v in (line.split(": ") for line in lines)}
+
+
+def _count_files(*roots: Path) -> int:
+    return sum(1 for root in roots if root.exists() for p in root.rglob("*") if p.is_file())
+
+
+def run_case(case: str, work_dir: Path) -> dict:
+    """Run one benchmark case in this process (HOME is already pointing at work_dir/home)."""
+    sys.path.insert(0, str(work_dir))
+    import install
+
+    # no dialogs during benchmarks
+    which = install._which
+    install._which = lambda cmd: None if cmd == "zenity" else which(cmd)
+
+    theme_archive = work_dir / install.THEME_ARCHIVE
+    ext_archive = work_dir / install.EXT_ARCHIVE
+    home = Path(os.environ["HOME"])
+
+    if case == "seed":
+        # installed tree for clean_existing / main_delta, measured in the next process
+        sys.argv = ["install.py", "-y"]
+        install.main()
+        return {"case": case}
+
+    # clean_existing hands the trees to background processes; keep them to wait for
+    removals = []
+    remove_in_background = install._remove_in_background
+
+    def track_removal(path):
+        proc = remove_in_background(path)
+        removals.append(proc)
+        return proc
+
+    install._remove_in_background = track_removal
+
+    rename = None
+    io_before = _io_counters()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    if case == "extract":
+        install.extract(theme_archive, install.THEMES_DIR)
+        install.extract(ext_archive, install.EXT_DIR)
+    elif case == "extract_parallel":
+        install.extract_parallel([(theme_archive, install.THEMES_DIR), (ext_archive, install.EXT_DIR)])
+    elif case == "clean_existing":
+        install.clean_existing(install.THEMES_DIR, install.EXT_DIR)
+        rename = time.perf_counter() - start
+        for proc in filter(None, removals):
+            proc.wait()
+    elif case in ("main", "main_delta"):
+        sys.argv = ["install.py", "-y"]
+        install.main()
+    else:
+        raise ValueError(f"unknown case: {case}")
+
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if removals:
+        cpu += children.ru_utime + children.ru_stime
+    io_after = _io_counters()
+
+    files = _count_files(install.THEMES_DIR / "semabe", install.EXT_DIR / "semabe-theme-selector@sewbej")
+    return {
+        "case": case,
+        "wall_s": round(wall, 4),
+        "rename_s": round(rename, 4) if rename is not None else None,
+        "cpu_s": round(cpu, 4),
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "files": files,
+        "files_per_s": round(files / wall, 1) if wall and case != "clean_existing" else None,
+        "bytes_written": io_after.get("wchar", 0) - io_before.get("wchar", 0),
+        "disk_bytes_written": io_after.get("write_bytes", 0) - io_before.get("write_bytes", 0),
+        "home": str(home),
+    }
+
+
+def _run_isolated(case: str, archives_dir: Path) -> dict:
+    """Run a case in a fresh process with its own HOME and copy of the installer."""
+    with tempfile.TemporaryDirectory(prefix=f"semabe-bench-{case}-") as tmp:
+        work_dir = Path(tmp)
+        for name in ("semabe.tar.xz", "semabe-theme-selector@sewbej.tar.xz"):
+            if _same_fs(archives_dir, work_dir):
+                os.link(archives_dir / name, work_dir / name)
+            else:
+                shutil.copyfile(archives_dir / name, work_dir / name)
+        shutil.copyfile(REPO_DIR / "install.py", work_dir / "install.py")
+        (work_dir / "home").mkdir()
+        env = dict(os.environ, HOME=str(work_dir / "home"))
+        steps = ["seed", case] if case in ("clean_existing", "main_delta") else [case]
+        for step in steps:
+            out = subprocess.run(
+                [sys.executable, __file__, "--case", step, "--work-dir", str(work_dir)],
+                env=env, capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                raise RuntimeError(f"case {step} failed:\n{out.stderr}")
+            if step == "seed":
+                time.sleep(0.5)  # let the background removal of staging leftovers finish
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result.pop("home", None)
+        return result
+
+
+def _same_fs(a: Path, b: Path) -> bool:
+    return a.stat().st_dev == b.stat().st_dev
+
+
+def run_suite(scale: str, cases: List[str], repeat: int, output: Optional[Path]) -> dict:
+    with tempfile.TemporaryDirectory(prefix="semabe-bench-archives-") as tmp:
+        archives_dir = Path(tmp)
+        print(f"⏳ Generating '{scale}' archives…")
+        archive_stats = make_archives(archives_dir, scale)
+        print(f"✅ {archive_stats['variants']} variants, theme archive: {archive_stats['theme_archive_bytes']} bytes")
+
+        results = []
+        for case in cases:
+            runs = [_run_isolated(case, archives_dir) for _ in range(repeat)]
+            best = min(runs, key=lambda r: r["wall_s"])
+            best["runs_wall_s"] = [r["wall_s"] for r in runs]
+            results.append(best)
+            print(f"⏱ {case:18} {best['wall_s']:8.3f} s  {best['peak_rss_kib'] / 1024:7.1f} MiB RSS  "
+                  f"{best['files_per_s'] or '-':>9} files/s  {best['bytes_written']:>12} bytes written"
+                  + (f"  (rename {best['rename_s']:.3f} s)" if best["rename_s"] is not None else ""))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "archives": archive_stats,
+        "results": results,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"✅ Results saved: {output}")
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Semabe installer benchmark suite")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="size of the synthetic variant matrix")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES, help="cases to run")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is reported")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.work_dir)))
+        return 0
+
+    run_suite(args.scale, args.cases, args.repeat, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
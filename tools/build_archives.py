@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reproducible archive builder for install.py
+
+Builds semabe.tar.<fmt> (the ~/.themes tree) and
+semabe-theme-selector@sewbej.tar.<fmt> (the extension) so that the same input
+always gives the same bytes:
+
+- members sorted, owners root/root without names, one mtime for everything
+  (SOURCE_DATE_EPOCH, else the last commit), modes normalised to 755/644
+- duplicate files (same content and mode) become tar hard link entries
+- xz is written as one stream of independent blocks (--block-size), which
+  install.py decodes on all cores; zstd (module or command) and gzip are
+  available as well – the installer detects the format from the content
+
+    tools/build_archives.py --out dist                     # themes rendered by generate_variants.py
+    tools/build_archives.py --themes ~/build/themes --format zst --out dist
+    tools/build_archives.py --compare --output formats.json
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+EXT_NAME = "semabe-theme-selector@sewbej"
+THEME_NAME = "semabe"
+DEFAULT_BLOCK_SIZE = 1 << 20
+SKIP = {"__pycache__", ".git"}
+
+sys.path.insert(0, str(REPO_DIR))
+import install  # noqa: E402
+
+
+def source_date_epoch() -> int:
+    """Timestamp for every member: SOURCE_DATE_EPOCH, else the last commit, else 0."""
+    if os.environ.get("SOURCE_DATE_EPOCH", "").isdigit():
+        return int(os.environ["SOURCE_DATE_EPOCH"])
+    try:
+        out = subprocess.run(["git", "-C", str(REPO_DIR), "log", "-1", "--format=%ct"],
+                             capture_output=True, text=True, timeout=10)
+        return int(out.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return 0
+
+
+def write_tar(out, roots: Dict[str, Path], mtime: int, links: bool = True) -> dict:
+    """Write a deterministic tar of `roots` (archive name → directory) to the binary file `out`."""
+    stats = {"files": 0, "links": 0, "bytes": 0, "linked_bytes": 0}
+    seen: Dict[tuple, str] = {}
+    with tarfile.open(fileobj=out, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+        for arcroot, root in sorted(roots.items()):
+            entries = [(arcroot, root)]
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in SKIP]
+                rel = Path(arcroot) / Path(dirpath).relative_to(root)
+                entries += [((rel / name).as_posix(), Path(dirpath, name)) for name in dirnames + filenames
+                            if not name.endswith((".pyc", ".pyo"))]
+            for arcname, path in sorted(entries, key=lambda e: e[0]):
+                st = os.lstat(path)
+                info = tarfile.TarInfo(arcname)
+                info.mtime = mtime
+                info.uid = info.gid = 0
+                info.uname = info.gname = ""
+                if os.path.islink(path):
+                    info.type, info.linkname, info.mode = tarfile.SYMTYPE, os.readlink(path), 0o777
+                    tar.addfile(info)
+                elif path.is_dir():
+                    info.type, info.mode = tarfile.DIRTYPE, 0o755
+                    tar.addfile(info)
+                else:
+                    info.mode = 0o755 if st.st_mode & 0o111 else 0o644
+                    data = path.read_bytes()
+                    key = (hashlib.sha256(data).digest(), info.mode)
+                    if links and key in seen:
+                        info.type, info.linkname = tarfile.LNKTYPE, seen[key]
+                        tar.addfile(info)
+                        stats["links"] += 1
+                        stats["linked_bytes"] += len(data)
+                        continue
+                    seen[key] = arcname
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+                    stats["files"] += 1
+                    stats["bytes"] += len(data)
+    return stats
+
+
+def _xz_block(chunk: bytes, preset: int):
+    """Compress `chunk` into one xz block: (stream header, padded block, unpadded size, size)."""
+    stream = lzma.compress(chunk, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC64, preset=preset)
+    index_size = (struct.unpack("<I", stream[-8:-4])[0] + 1) * 4
+    index = stream[-12 - index_size:-12]
+    count, pos = install._read_varint(index, 1)
+    unpadded, pos = install._read_varint(index, pos)
+    size, _pos = install._read_varint(index, pos)
+    if count != 1 or size != len(chunk):
+        raise lzma.LZMAError("unexpected xz block layout")
+    return stream[:12], stream[12:12 + ((unpadded + 3) & ~3)], unpadded, size
+
+
+def compress_xz(src, dest, block_size: int = DEFAULT_BLOCK_SIZE, preset: int = 9,
+                workers: Optional[int] = None) -> int:
+    """Write `src` as one xz stream of independent `block_size` blocks (0: one block); return blocks."""
+    workers = workers or os.cpu_count() or 1
+    header = lzma.compress(b"", format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC64)[:12]
+    dest.write(header)
+    records = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+
+        def flush(limit):
+            while len(pending) > limit:
+                _header, block, unpadded, size = pending.pop(0).result()
+                dest.write(block)
+                records.append((unpadded, size))
+
+        while True:
+            chunk = src.read(block_size) if block_size else src.read()
+            if not chunk:
+                break
+            pending.append(pool.submit(_xz_block, chunk, preset))
+            flush(workers * 2)
+            if not block_size:
+                break
+        flush(0)
+
+    index = b"\x00" + install._varint(len(records))
+    index += b"".join(install._varint(u) + install._varint(s) for u, s in records)
+    index += b"\x00" * (-len(index) % 4)
+    index += struct.pack("<I", zlib.crc32(index))
+    backward = struct.pack("<I", len(index) // 4 - 1) + header[6:8]
+    dest.write(index + struct.pack("<I", zlib.crc32(backward)) + backward + install.XZ_FOOTER_MAGIC)
+    return len(records)
+
+
+def compress_zstd(src, dest, level: int = 19) -> None:
+    try:
+        import zstandard
+    except ImportError:
+        zstd = shutil.which("zstd")
+        if not zstd:
+            raise RuntimeError("zstd format needs the zstandard module or the zstd command")
+        subprocess.run([zstd, f"-{level}", "-T0", "-q", "-c"], stdin=src, stdout=dest, check=True)
+        return
+    zstandard.ZstdCompressor(level=level, threads=-1).copy_stream(src, dest)
+
+
+def compress_gzip(src, dest, level: int = 9) -> None:
+    with gzip.GzipFile(filename="", mode="wb", fileobj=dest, compresslevel=level, mtime=0) as gz:
+        shutil.copyfileobj(src, gz)
+
+
+def compress(tar_path: Path, archive: Path, fmt: str, block_size: int = DEFAULT_BLOCK_SIZE) -> None:
+    tmp = archive.with_name(f".{archive.name}.tmp")
+    with open(tar_path, "rb") as src, open(tmp, "wb") as dest:
+        if fmt == "xz":
+            compress_xz(src, dest, block_size)
+        elif fmt == "zst":
+            compress_zstd(src, dest)
+        elif fmt == "gz":
+            compress_gzip(src, dest)
+        else:
+            shutil.copyfileobj(src, dest)
+    os.replace(tmp, archive)
+
+
+def default_themes(tmp: Path) -> Path:
+    """Render every variant of tools/variant_tables.json into tmp/semabe."""
+    import generate_variants
+    tables = generate_variants.load_tables()
+    templates = generate_variants.TemplateSet(tables)
+    for params in generate_variants.all_params(tables):
+        generate_variants.render(templates, params, tmp / generate_variants.variant_path(params))
+    return tmp / THEME_NAME
+
+
+def build(out_dir: Path, themes: Path, extension: Path, fmt: str, mtime: int,
+          block_size: int = DEFAULT_BLOCK_SIZE, links: bool = True) -> List[dict]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+    for name, root in ((THEME_NAME, themes), (EXT_NAME, extension)):
+        archive = out_dir / f"{name}.tar" if fmt == "tar" else out_dir / f"{name}.tar.{fmt}"
+        with tempfile.NamedTemporaryFile(dir=out_dir, suffix=".tar") as tar:
+            stats = write_tar(tar, {name: root}, mtime, links)
+            tar.flush()
+            tar_size = os.fstat(tar.fileno()).st_size
+            compress(Path(tar.name), archive, fmt, block_size)
+        results.append({"archive": archive.name, "bytes": archive.stat().st_size, "tar_bytes": tar_size,
+                        "sha256": hashlib.sha256(archive.read_bytes()).hexdigest(), **stats})
+        print(f"✅ {archive}: {archive.stat().st_size:,} B ({stats['files']} files, {stats['links']} hard links)")
+    return results
+
+
+def _decode_seconds(archive: Path, workers: int) -> float:
+    start = time.perf_counter()
+    blocks = install._xz_blocks(archive)
+    if workers > 1 and blocks is not None and len(blocks) > 1:
+        reader = install._ParallelXZReader(archive, blocks, workers)
+    else:
+        reader = install.open_archive(archive)
+    with reader:
+        while reader.read(1 << 20):
+            pass
+    return time.perf_counter() - start
+
+
+def compare(themes: Path, mtime: int, repeat: int = 3) -> List[dict]:
+    """Compressed size and install-time decode speed of every format, for the theme archive."""
+    candidates = [("xz (1 block)", "xz", 0), ("xz (1 MiB blocks)", "xz", 1 << 20), ("gz", "gz", 0), ("tar", "tar", 0)]
+    try:
+        import zstandard  # noqa: F401
+        candidates.insert(2, ("zst", "zst", 0))
+    except ImportError:
+        if shutil.which("zstd"):
+            candidates.insert(2, ("zst", "zst", 0))
+    workers = os.cpu_count() or 1
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="semabe-archives-") as tmp:
+        tar_path = Path(tmp) / "semabe.tar"
+        with open(tar_path, "wb") as f:
+            write_tar(f, {THEME_NAME: themes}, mtime)
+        tar_size = tar_path.stat().st_size
+        for label, fmt, block_size in candidates:
+            archive = Path(tmp) / f"{fmt}-{block_size}" / ("semabe.tar" + ("" if fmt == "tar" else f".{fmt}"))
+            archive.parent.mkdir()
+            start = time.perf_counter()
+            compress(tar_path, archive, fmt, block_size)
+            build_s = time.perf_counter() - start
+            serial = min(_decode_seconds(archive, 1) for _ in range(repeat))
+            parallel = min(_decode_seconds(archive, workers) for _ in range(repeat))
+            rows.append({"format": label, "bytes": archive.stat().st_size,
+                         "ratio": round(archive.stat().st_size / tar_size, 4), "build_s": round(build_s, 3),
+                         "decode_s": round(serial, 4), "decode_parallel_s": round(parallel, 4),
+                         "workers": workers})
+    print(f"{'format':20} {'bytes':>12} {'ratio':>7} {'build s':>8} {'decode s':>9} {'parallel s':>11}")
+    for r in rows:
+        print(f"{r['format']:20} {r['bytes']:>12,} {r['ratio']:>7.3f} {r['build_s']:>8.3f} "
+              f"{r['decode_s']:>9.4f} {r['decode_parallel_s']:>11.4f}")
+    return rows
+
+
+def run_tests() -> int:
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        src = tmp_path / "src" / "semabe"
+        for variant in ("Semabe Grey Opaque (legacy)", "Semabe Mint Opaque (legacy)"):
+            (src / "legacy" / variant / "assets").mkdir(parents=True)
+            (src / "legacy" / variant / "assets" / "check.png").write_bytes(b"png" * 1000)
+            (src / "legacy" / variant / "gtk.css").write_bytes(os.urandom(3 << 20))
+        ext = tmp_path / "src" / EXT_NAME
+        ext.mkdir()
+        (ext / "extension.js").write_text("// js\n")
+
+        # 1) same bytes whatever the mtimes, umask and order on disk
+        first = build(tmp_path / "a", src, ext, "xz", 1000)
+        for path in src.rglob("*"):
+            os.utime(path, (5, 5))
+        (src / "legacy/Semabe Grey Opaque (legacy)/gtk.css").chmod(0o600)
+        second = build(tmp_path / "b", src, ext, "xz", 1000)
+        if [r["sha256"] for r in first] != [r["sha256"] for r in second]:
+            print("❌ TEST: build() – archives are not reproducible")
+            failures += 1
+
+        # 2) hard links for duplicates, several xz blocks, install.py reads it all
+        archive = tmp_path / "a" / "semabe.tar.xz"
+        with tarfile.open(archive) as tar:
+            members = tar.getmembers()
+        links = [m for m in members if m.islnk()]
+        if len(links) != 1 or any(m.uid or m.gid or m.uname or m.mtime != 1000 for m in members) or \
+                [m.name for m in members] != sorted(m.name for m in members):
+            print("❌ TEST: write_tar() – members not normalised or duplicates not linked")
+            failures += 1
+        blocks = install._xz_blocks(archive)
+        if not blocks or len(blocks) < 6:
+            print(f"❌ TEST: compress_xz() – {len(blocks or [])} blocks")
+            failures += 1
+        out = tmp_path / "installed"
+        install.extract_parallel([(archive, out)], workers=4)
+        for path in src.rglob("*"):
+            if path.is_file() and (out / "semabe" / path.relative_to(src)).read_bytes() != path.read_bytes():
+                print(f"❌ TEST: extract_parallel() – {path.name} differs")
+                failures += 1
+
+        # 3) the other formats round-trip through install.py as well
+        formats = ["gz", "tar"] + (["zst"] if shutil.which("zstd") else [])
+        for fmt in formats:
+            result = build(tmp_path / fmt, src, ext, fmt, 1000)
+            archive = tmp_path / fmt / result[0]["archive"]
+            if install.find_archive(tmp_path / fmt, install.THEME_ARCHIVE) != archive:
+                print(f"❌ TEST: find_archive() – {fmt} archive not found")
+                failures += 1
+            install.extract(archive, tmp_path / f"installed-{fmt}")
+            if not (tmp_path / f"installed-{fmt}/semabe/legacy/Semabe Mint Opaque (legacy)/assets/check.png").is_file():
+                print(f"❌ TEST: extract() – {fmt} archive not extracted")
+                failures += 1
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build reproducible Semabe archives for install.py")
+    parser.add_argument("--themes", type=Path, help="directory holding the semabe/ theme tree "
+                        "(default: render the variants of tools/variant_tables.json)")
+    parser.add_argument("--extension", type=Path, default=REPO_DIR / EXT_NAME, help="extension directory")
+    parser.add_argument("--format", choices=["xz", "zst", "gz", "tar"], default="xz")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help="uncompressed bytes per xz block, 0 for a single block")
+    parser.add_argument("--no-links", action="store_true", help="store duplicate files in full")
+    parser.add_argument("--mtime", type=int, help="member timestamp (default: SOURCE_DATE_EPOCH or the last commit)")
+    parser.add_argument("--out", type=Path, default=Path("."), help="output directory")
+    parser.add_argument("--compare", action="store_true", help="compare the formats (size vs. decode time)")
+    parser.add_argument("--output", type=Path, help="with --compare: write the table as JSON")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    args = parser.parse_args()
+
+    if args.run_tests:
+        return run_tests()
+
+    mtime = source_date_epoch() if args.mtime is None else args.mtime
+    with tempfile.TemporaryDirectory(prefix="semabe-themes-") as tmp:
+        themes = args.themes / THEME_NAME if args.themes and (args.themes / THEME_NAME).is_dir() else args.themes
+        themes = themes or default_themes(Path(tmp))
+        try:
+            if args.compare:
+                rows = compare(themes, mtime)
+                if args.output:
+                    args.output.write_text(json.dumps(rows, indent=2) + "\n", encoding="utf-8")
+                    print(f"✅ Results saved: {args.output}")
+            else:
+                build(args.out, themes, args.extension, args.format, mtime, args.block_size, not args.no_links)
+        except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parametric theme variant generator
+
+Renders Semabe variants from one template set instead of shipping a full copy
+of every stylesheet per color × transparency × controls × size × layout.
+
+- the template set is the reference variant (`Semabe Grey Opaque (legacy)`):
+  in every stylesheet carrying a "theme colors (red, green, blue)" header, the
+  listed colors become placeholders (`{{gtk.2}}`, `{{cinnamon.5}}`, …)
+- tools/variant_tables.json holds the color table (the header colors of each
+  color, for the gtk and the cinnamon stylesheets) and one row per
+  transparency, control style, size and layout. A row can carry literal
+  `replace` rules and whole overlay files (tools/variant_overlays/…), which
+  are templated the same way and therefore work for every color
+- rendered variants are cached in ~/.cache/semabe/variants, keyed by the
+  template digest and the table rows; assets are hard-linked from the cache
+
+    tools/generate_variants.py render --color Grey --transparency Opaque --controls legacy --out DIR
+    tools/generate_variants.py all --out ~/.themes
+    tools/generate_variants.py extract ~/.themes/semabe/legacy/Semabe*   # fill the tables
+"""
+
+import argparse
+import filecmp
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+TABLES = Path(__file__).resolve().parent / "variant_tables.json"
+OVERLAYS = Path(__file__).resolve().parent / "variant_overlays"
+CACHE_DIR = Path.home() / ".cache/semabe/variants"
+
+HEADER_RE = re.compile(r"/\* theme colors \(red, green, blue\):\n(.*?)\*/", re.S)
+TRIPLET_RE = re.compile(r"^(\d{1,3}), (\d{1,3}), (\d{1,3})$", re.M)
+PLACEHOLDER_RE = re.compile(r"\{\{(gtk|cinnamon)\.(\d+)\}\}")
+
+LAYOUTS = {"R": "right", "L": "left", "M": "classic_mac", "G": "gnome"}
+SIZE_NAMES = {"S": "small", "M": "medium", "L": "large", "XL": "extra-large", "XXL": "extra-extra-large"}
+CLASSIC_CONTROLS = {"macOS", "breeze", "human"}
+DIMENSIONS = {"transparency": "transparencies", "controls": "controls", "size": "sizes", "layout": "layouts"}
+
+
+def load_tables(path: Path = TABLES) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def header_colors(text: str) -> List[Tuple[int, int, int]]:
+    """Colors listed in the "theme colors" comment at the top of a stylesheet."""
+    m = HEADER_RE.search(text[:1024])
+    if not m:
+        return []
+    return [tuple(int(c) for c in t) for t in TRIPLET_RE.findall(m.group(1))]
+
+
+def _group(rel: str) -> str:
+    return "cinnamon" if rel.split("/")[0] == "cinnamon" else "gtk"
+
+
+def _triplet_re(color) -> re.Pattern:
+    return re.compile(r"(?<![\d.])%d, %d, %d(?![\d.])" % tuple(color))
+
+
+def make_template(text: str, rel: str, reference_colors: List[List[int]]) -> str:
+    """Replace the reference colors in a stylesheet by placeholders."""
+    if "{{" in text:
+        raise ValueError(f"{rel}: contains '{{{{', cannot be templated")
+    colors = header_colors(text)
+    if not colors:
+        return text
+    if [list(c) for c in colors] != [list(c) for c in reference_colors]:
+        raise ValueError(f"{rel}: header colors {colors} do not match the reference row of the tables")
+    if len({tuple(c) for c in colors}) != len(colors):
+        raise ValueError(f"{rel}: the reference colors are not distinct")
+    group = _group(rel)
+    for i, color in enumerate(colors, 1):
+        text = _triplet_re(color).sub("{{%s.%d}}" % (group, i), text)
+    return text
+
+
+def render_template(template: str, colors: Dict[str, List[List[int]]]) -> str:
+    def sub(m):
+        r, g, b = colors[m.group(1)][int(m.group(2)) - 1]
+        return f"{r}, {g}, {b}"
+    return PLACEHOLDER_RE.sub(sub, template)
+
+
+def _is_template(path: Path) -> bool:
+    return path.suffix == ".css"
+
+
+def _walk(root: Path) -> Iterator[Tuple[str, Path]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = Path(dirpath, name)
+            yield path.relative_to(root).as_posix(), path
+
+
+class TemplateSet:
+    """The reference variant, with its stylesheets turned into templates."""
+
+    def __init__(self, tables: dict, reference_dir: Optional[Path] = None):
+        self.tables = tables
+        ref = tables["reference"]
+        self.dir = reference_dir or REPO_DIR / ref["dir"]
+        self.reference_colors = tables["colors"][ref["color"]]
+        self.templates: Dict[str, str] = {}
+        self.files: Dict[str, Path] = {}
+        digest = hashlib.sha256()
+        for rel, path in _walk(self.dir):
+            digest.update(rel.encode() + b"\0")
+            if _is_template(path):
+                text = path.read_text(encoding="utf-8")
+                self.templates[rel] = make_template(text, rel, self.reference_colors[_group(rel)])
+                digest.update(text.encode("utf-8"))
+            else:
+                self.files[rel] = path
+                st = path.stat()
+                digest.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+        self.digest = digest.hexdigest()
+
+    def rows(self, params: dict) -> List[Tuple[str, dict]]:
+        out = []
+        for dim, key in DIMENSIONS.items():
+            value = params.get(dim) or self.tables["reference"][dim]
+            try:
+                out.append((f"{dim}/{value}", self.tables[key][value]))
+            except KeyError:
+                raise KeyError(f"no table row for {dim} '{value}'") from None
+        return out
+
+    def variant_files(self, params: dict) -> Tuple[Dict[str, str], Dict[str, Path]]:
+        """Rendered stylesheets and the other files of one variant."""
+        colors = self.tables["colors"][params.get("color") or self.tables["reference"]["color"]]
+        templates = dict(self.templates)
+        files = dict(self.files)
+        for name, row in self.rows(params):
+            for rel, rules in row.get("replace", {}).items():
+                for old, new in rules:
+                    if old not in templates[rel]:
+                        raise ValueError(f"{name}: '{old}' not found in {rel}")
+                    templates[rel] = templates[rel].replace(old, new)
+            for rel in row.get("files", []):
+                overlay = OVERLAYS / name / rel
+                if _is_template(overlay):
+                    text = overlay.read_text(encoding="utf-8")
+                    templates[rel] = make_template(text, rel, self.reference_colors[_group(rel)]) \
+                        if header_colors(text) else text
+                else:
+                    files[rel] = overlay
+        return {rel: render_template(t, colors) for rel, t in templates.items()}, files
+
+    def cache_key(self, params: dict) -> str:
+        color = params.get("color") or self.tables["reference"]["color"]
+        rows = [self.tables["colors"][color]] + [row for _name, row in self.rows(params)]
+        return hashlib.sha256((self.digest + json.dumps(rows, sort_keys=True)).encode()).hexdigest()[:24]
+
+
+def _link_or_copy(src: Path, dest: Path):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def render(templates: TemplateSet, params: dict, out: Path, cache_dir: Optional[Path] = CACHE_DIR) -> str:
+    """Write one variant to `out`; return "cached" or "rendered"."""
+    key = templates.cache_key(params)
+    cached = cache_dir / key if cache_dir else None
+    status = "cached"
+    if cached is None or not cached.is_dir():
+        status = "rendered"
+        texts, files = templates.variant_files(params)
+        if cache_dir:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        build = Path(tempfile.mkdtemp(prefix=".render-", dir=cache_dir)) if cache_dir else None
+        target = build or out
+        for rel, text in texts.items():
+            (target / rel).parent.mkdir(parents=True, exist_ok=True)
+            (target / rel).write_bytes(text.encode("utf-8"))
+        for rel, src in files.items():
+            (target / rel).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, target / rel)
+        if build is None:
+            return status
+        try:
+            os.rename(build, cached)
+        except OSError:  # rendered concurrently by someone else
+            shutil.rmtree(build, ignore_errors=True)
+
+    for rel, path in _walk(cached):
+        dest = out / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists():
+            dest.unlink()
+        _link_or_copy(path, dest)
+    return status
+
+
+def variant_name(p: dict) -> str:
+    suffix = "" if p["controls"] == "legacy" else p["size"] + ("" if p["controls"] in CLASSIC_CONTROLS else p["layout"])
+    return f"Semabe {p['color']} {p['transparency']} ({p['controls']}){suffix}"
+
+
+def variant_path(p: dict) -> str:
+    """Directory below ~/.themes, as built by the selector extension."""
+    c = p["controls"]
+    if c == "legacy":
+        return f"semabe/legacy/{variant_name(p)}"
+    if c in CLASSIC_CONTROLS:
+        return f"semabe/{c}/{SIZE_NAMES[p['size']]}/{variant_name(p)}"
+    return f"semabe/{c}/{LAYOUTS[p['layout']]}/{SIZE_NAMES[p['size']]}/{variant_name(p)}"
+
+
+def all_params(tables: dict) -> Iterator[dict]:
+    """Every combination the tables can render (sizes/layouts only where they apply)."""
+    for color in tables["colors"]:
+        for transparency in tables["transparencies"]:
+            for controls, row in tables["controls"].items():
+                sizes = row.get("sizes", ["L"]) if controls != "legacy" else ["L"]
+                layouts = list(tables["layouts"]) if controls not in ("legacy", *CLASSIC_CONTROLS) else ["R"]
+                for size in sizes:
+                    if size not in tables["sizes"]:
+                        continue
+                    for layout in layouts:
+                        yield {"color": color, "transparency": transparency, "controls": controls,
+                               "size": size, "layout": layout}
+
+
+def parse_variant_name(name: str) -> Optional[dict]:
+    m = re.match(r"^Semabe (\w+) (\w+) \((\w+)\)(S|M|L|XL|XXL)?([RLMG])?$", name)
+    if not m:
+        return None
+    return {"color": m.group(1), "transparency": m.group(2), "controls": m.group(3),
+            "size": m.group(4) or "L", "layout": m.group(5) or "R"}
+
+
+def extract(tables: dict, variant_dirs: List[Path]) -> List[str]:
+    """Add table rows from existing variant directories; return what was added.
+
+    Colors come from the stylesheet headers. Files of a variant that differ from
+    the template rendering in exactly one dimension (transparency, controls, size
+    or layout) are stored as overlays of that dimension's row.
+    """
+    added = []
+    ref = tables["reference"]
+    for d in variant_dirs:
+        params = parse_variant_name(d.name)
+        if params is None:
+            continue
+        colors = {}
+        for rel, group in (("gtk-3.0/gtk.css", "gtk"), ("cinnamon/cinnamon.css", "cinnamon")):
+            try:
+                colors[group] = [list(c) for c in header_colors((d / rel).read_text(encoding="utf-8"))]
+            except OSError:
+                pass
+        if set(colors) == {"gtk", "cinnamon"} and params["color"] not in tables["colors"]:
+            tables["colors"][params["color"]] = colors
+            added.append(f"color/{params['color']}")
+
+        differing = [dim for dim in DIMENSIONS if params[dim] != ref[dim]]
+        if len(differing) != 1 or params["color"] not in tables["colors"]:
+            continue
+        dim = differing[0]
+        rows = tables[DIMENSIONS[dim]]
+        if params[dim] in rows:
+            continue
+        templates = TemplateSet(tables)
+        texts, files = templates.variant_files({**params, dim: ref[dim]})
+        overlay_files = []
+        for rel, path in _walk(d):
+            name = f"{dim}/{params[dim]}"
+            same = (texts[rel].encode("utf-8") == path.read_bytes()) if rel in texts else \
+                (rel in files and filecmp.cmp(files[rel], path, shallow=False))
+            if same:
+                continue
+            dest = OVERLAYS / name / rel
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, dest)
+            overlay_files.append(rel)
+        rows[params[dim]] = {"files": overlay_files}
+        added.append(f"{dim}/{params[dim]} ({len(overlay_files)} overlay files)")
+    return added
+
+
+def run_tests() -> int:
+    """Render the reference variant and compare it with the shipped files byte for byte."""
+    failures = 0
+    tables = load_tables()
+    templates = TemplateSet(tables)
+    ref = tables["reference"]
+    params = {k: ref[k] for k in ("color", "transparency", "controls", "size", "layout")}
+
+    if not any(PLACEHOLDER_RE.search(t) for t in templates.templates.values()):
+        print("❌ TEST: generate_variants – no placeholders in the templates")
+        failures += 1
+    if variant_name(params) != ref["dir"]:
+        print(f"❌ TEST: variant_name() – {variant_name(params)!r} != {ref['dir']!r}")
+        failures += 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = Path(tmp) / "cache"
+        for attempt in ("rendered", "cached"):
+            out = Path(tmp) / attempt
+            status = render(templates, params, out, cache_dir=cache)
+            if status != attempt:
+                print(f"❌ TEST: render() – {status} instead of {attempt}")
+                failures += 1
+            expected = dict(_walk(templates.dir))
+            got = dict(_walk(out))
+            if expected.keys() != got.keys():
+                print(f"❌ TEST: render() – file lists differ: {sorted(expected.keys() ^ got.keys())[:5]}")
+                failures += 1
+            for rel in expected.keys() & got.keys():
+                if not filecmp.cmp(expected[rel], got[rel], shallow=False):
+                    print(f"❌ TEST: render() – {rel} differs from the reference")
+                    failures += 1
+
+        # another color changes exactly the header colors
+        other = json.loads(json.dumps(tables))
+        other["colors"]["Test"] = {g: [[1, 2, 3]] + c[1:] for g, c in tables["colors"][ref["color"]].items()}
+        texts, _files = TemplateSet(other).variant_files({**params, "color": "Test"})
+        css = texts["gtk-3.0/gtk.css"]
+        if "@define-color theme_color rgb(1, 2, 3);" not in css or "254, 254, 254" in css:
+            print("❌ TEST: render() – color table not applied")
+            failures += 1
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Render Semabe theme variants from templates")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    parser.add_argument("--no-cache", action="store_true", help=f"do not use {CACHE_DIR}")
+    sub = parser.add_subparsers(dest="command")
+
+    one = sub.add_parser("render", help="render one variant into --out")
+    for dim in ("color", *DIMENSIONS):
+        one.add_argument(f"--{dim}")
+    one.add_argument("--out", type=Path, required=True)
+
+    every = sub.add_parser("all", help="render every variant of the tables below --out (like ~/.themes)")
+    every.add_argument("--out", type=Path, required=True)
+
+    ext = sub.add_parser("extract", help="add table rows from existing variant directories")
+    ext.add_argument("dirs", type=Path, nargs="+")
+    args = parser.parse_args()
+
+    if args.run_tests:
+        return run_tests()
+
+    tables = load_tables()
+    cache = None if args.no_cache else CACHE_DIR
+    if args.command == "render":
+        templates = TemplateSet(tables)
+        params = {dim: getattr(args, dim) for dim in ("color", *DIMENSIONS)}
+        print(f"{render(templates, params, args.out, cache)}: {args.out}")
+    elif args.command == "all":
+        templates = TemplateSet(tables)
+        counts = {"rendered": 0, "cached": 0}
+        for params in all_params(tables):
+            counts[render(templates, params, args.out / variant_path(params), cache)] += 1
+        print(f"✅ {counts['rendered']} rendered, {counts['cached']} from cache")
+    elif args.command == "extract":
+        added = extract(tables, args.dirs)
+        TABLES.write_text(json.dumps(tables, indent=2) + "\n", encoding="utf-8")
+        print("\n".join(added) or "nothing new")
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
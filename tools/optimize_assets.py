@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asset optimization stage for the theme images
+
+- PNGs are recompressed losslessly: Adam7 interlacing is removed, 16-bit
+  images whose samples fit in 8 bits are reduced, metadata chunks (text,
+  time, pHYs) are dropped, and the best of several filter/zlib strategies is
+  kept. The pixels are decoded again and compared before a file is replaced
+- byte-identical and pixel-identical duplicates are reported; accidental
+  "… (kopia).png" copies that nothing references are removed
+- refraction maps of the blur extension (semabe-theme-blur@sewbej/refraction)
+  that are larger than a menu or a notification get pre-scaled copies in
+  refraction/menus/ and refraction/notifications/, which the extension
+  prefers when they exist (needs Pillow; skipped without it)
+
+    tools/optimize_assets.py                       # report only
+    tools/optimize_assets.py --apply --report assets.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+REFRACTION_DIR = REPO_DIR / "semabe-theme-blur@sewbej/refraction"
+# surfaces the blur extension draws refraction maps on: typical size in pixels,
+# the pre-scaled map covers it
+SURFACES = {"menus": (480, 720), "notifications": (480, 160)}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# chunks that do not change how an image is drawn
+METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME", b"pHYs"}
+# chunks whose content depends on the bit depth
+DEPTH_CHUNKS = {b"sBIT", b"bKGD"}
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+ADAM7 = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+class Png:
+    """A decoded PNG: header fields, unfiltered scanlines and the chunks to keep."""
+
+    def __init__(self, width, height, depth, color_type, rows, chunks):
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.color_type = color_type
+        self.rows: List[bytes] = rows  # unfiltered, without filter bytes, not interlaced
+        self.chunks: List[Tuple[bytes, bytes]] = chunks  # ancillary/PLTE chunks before IDAT
+
+    @property
+    def bpp(self) -> int:
+        """Bytes per complete pixel (at least 1), as used by the PNG filters."""
+        return max(1, CHANNELS[self.color_type] * self.depth // 8)
+
+    def row_bytes(self, width: int) -> int:
+        return (width * CHANNELS[self.color_type] * self.depth + 7) // 8
+
+
+def _rel(path: Path) -> str:
+    try:
+        return path.relative_to(REPO_DIR).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def _chunks(data: bytes):
+    if not data.startswith(PNG_SIGNATURE):
+        raise UnsupportedImage("not a PNG")
+    i = len(PNG_SIGNATURE)
+    while i < len(data):
+        length, kind = struct.unpack(">I4s", data[i:i + 8])
+        yield kind, data[i + 8:i + 8 + length]
+        i += 12 + length
+
+
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def _unfilter(data: bytes, offset: int, height: int, stride: int, bpp: int) -> Tuple[List[bytes], int]:
+    rows = []
+    prev = bytearray(stride)
+    for _ in range(height):
+        kind = data[offset]
+        row = bytearray(data[offset + 1:offset + 1 + stride])
+        offset += 1 + stride
+        if kind == 1:
+            for x in range(bpp, stride):
+                row[x] = (row[x] + row[x - bpp]) & 0xFF
+        elif kind == 2:
+            for x in range(stride):
+                row[x] = (row[x] + prev[x]) & 0xFF
+        elif kind == 3:
+            for x in range(stride):
+                left = row[x - bpp] if x >= bpp else 0
+                row[x] = (row[x] + ((left + prev[x]) >> 1)) & 0xFF
+        elif kind == 4:
+            for x in range(stride):
+                left = row[x - bpp] if x >= bpp else 0
+                upleft = prev[x - bpp] if x >= bpp else 0
+                row[x] = (row[x] + _paeth(left, prev[x], upleft)) & 0xFF
+        elif kind != 0:
+            raise UnsupportedImage(f"bad filter type {kind}")
+        rows.append(bytes(row))
+        prev = row
+    return rows, offset
+
+
+def read_png(data: bytes) -> Png:
+    header = None
+    chunks, idat = [], []
+    for kind, body in _chunks(data):
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+        elif not idat:
+            chunks.append((kind, body))
+        elif kind[0] & 0x20 == 0:
+            raise UnsupportedImage(f"critical chunk {kind!r} after IDAT")
+    if header is None:
+        raise UnsupportedImage("no IHDR")
+    width, height, depth, color_type, _compression, _filter, interlace = header
+    png = Png(width, height, depth, color_type, [], chunks)
+    raw = zlib.decompress(b"".join(idat))
+    if not interlace:
+        png.rows, _ = _unfilter(raw, 0, height, png.row_bytes(width), png.bpp)
+        return png
+    if depth < 8:
+        raise UnsupportedImage("interlaced image with less than 8 bits per sample")
+
+    size = png.bpp
+    canvas = [bytearray(png.row_bytes(width)) for _ in range(height)]
+    offset = 0
+    for x0, y0, dx, dy in ADAM7:
+        pw = (width - x0 + dx - 1) // dx
+        ph = (height - y0 + dy - 1) // dy
+        if not pw or not ph:
+            continue
+        rows, offset = _unfilter(raw, offset, ph, pw * size, size)
+        for j, row in enumerate(rows):
+            target = canvas[y0 + j * dy]
+            for i in range(pw):
+                x = (x0 + i * dx) * size
+                target[x:x + size] = row[i * size:(i + 1) * size]
+    png.rows = [bytes(r) for r in canvas]
+    return png
+
+
+def rgba16(png: Png) -> bytes:
+    """Pixels as 16-bit RGBA, to compare images across bit depths and color types."""
+    palette = trns = None
+    for kind, body in png.chunks:
+        if kind == b"PLTE":
+            palette = [tuple(body[i:i + 3]) for i in range(0, len(body), 3)]
+        elif kind == b"tRNS":
+            trns = body
+    depth, ct = png.depth, png.color_type
+    top = (1 << depth) - 1
+    out = bytearray()
+    for row in png.rows:
+        if depth < 8:
+            samples = [(row[i // (8 // depth)] >> (8 - depth * (i % (8 // depth) + 1))) & top
+                       for i in range(png.width)]
+        elif depth == 8:
+            samples = list(row)
+        else:
+            samples = list(struct.unpack(f">{len(row) // 2}H", row))
+        n = CHANNELS[ct]
+        for i in range(png.width):
+            px = samples[i * n:(i + 1) * n]
+            if ct == 3:
+                r, g, b = palette[px[0]]
+                a = trns[px[0]] if trns and px[0] < len(trns) else 255
+                px = [v * 257 for v in (r, g, b, a)]
+            else:
+                px = [v * 65535 // top for v in px]
+                if ct == 0:
+                    transparent = trns and px[0] == struct.unpack(">H", trns)[0] * 65535 // top
+                    px = [px[0]] * 3 + [0 if transparent else 65535]
+                elif ct == 2:
+                    transparent = trns and tuple(px) == tuple(v * 65535 // top for v in struct.unpack(">3H", trns))
+                    px = px + [0 if transparent else 65535]
+                elif ct == 4:
+                    px = [px[0]] * 3 + [px[1]]
+            out += struct.pack(">4H", *px)
+    return bytes(out)
+
+
+def _reduce_depth(png: Png) -> bool:
+    """16 → 8 bits when every sample has equal high and low bytes."""
+    if png.depth != 16 or any(kind in DEPTH_CHUNKS or kind == b"tRNS" for kind, _ in png.chunks):
+        return False
+    if any(row[0::2] != row[1::2] for row in png.rows):
+        return False
+    png.rows = [row[0::2] for row in png.rows]
+    png.depth = 8
+    return True
+
+
+def _filter_rows(rows: List[bytes], bpp: int, strategy: Optional[int]) -> bytes:
+    out = bytearray()
+    prev = bytes(len(rows[0])) if rows else b""
+    for row in rows:
+        candidates = range(5) if strategy is None else (strategy,)
+        best = None
+        for kind in candidates:
+            if kind == 0:
+                f = row
+            elif kind == 1:
+                f = bytes((row[x] - (row[x - bpp] if x >= bpp else 0)) & 0xFF for x in range(len(row)))
+            elif kind == 2:
+                f = bytes((row[x] - prev[x]) & 0xFF for x in range(len(row)))
+            elif kind == 3:
+                f = bytes((row[x] - (((row[x - bpp] if x >= bpp else 0) + prev[x]) >> 1)) & 0xFF
+                          for x in range(len(row)))
+            else:
+                f = bytes((row[x] - _paeth(row[x - bpp] if x >= bpp else 0, prev[x],
+                                           prev[x - bpp] if x >= bpp else 0)) & 0xFF for x in range(len(row)))
+            # minimum sum of absolute differences, the usual adaptive heuristic
+            score = sum(b if b < 128 else 256 - b for b in f)
+            if best is None or score < best[0]:
+                best = (score, kind, f)
+        out.append(best[1])
+        out += best[2]
+        prev = row
+    return bytes(out)
+
+
+def _chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def write_png(png: Png) -> bytes:
+    """Smallest non-interlaced encoding of `png` among the filter/zlib strategies tried."""
+    best = None
+    for strategy in (None, 0, 1, 2, 4):
+        raw = _filter_rows(png.rows, png.bpp, strategy)
+        for zstrategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED):
+            co = zlib.compressobj(9, zlib.DEFLATED, 15, 9, zstrategy)
+            data = co.compress(raw) + co.flush()
+            if best is None or len(data) < len(best):
+                best = data
+    header = struct.pack(">IIBBBBB", png.width, png.height, png.depth, png.color_type, 0, 0, 0)
+    return (PNG_SIGNATURE + _chunk(b"IHDR", header)
+            + b"".join(_chunk(k, b) for k, b in png.chunks if k not in METADATA_CHUNKS)
+            + _chunk(b"IDAT", best) + _chunk(b"IEND", b""))
+
+
+def recompress_png(data: bytes) -> bytes:
+    """Lossless re-encoding of a PNG; the original if nothing smaller was found."""
+    png = read_png(data)
+    pixels = rgba16(png)
+    _reduce_depth(png)
+    out = write_png(png)
+    if len(out) >= len(data):
+        return data
+    if rgba16(read_png(out)) != pixels:
+        raise AssertionError("re-encoded PNG differs from the original")
+    return out
+
+
+def webp_size(data: bytes) -> Tuple[int, int]:
+    """Canvas size of a WebP file (VP8, VP8L or VP8X)."""
+    if data[:4] != b"RIFF" or data[8:12] != b"WEBP":
+        raise UnsupportedImage("not a WebP")
+    kind = data[12:16]
+    if kind == b"VP8X":
+        return 1 + int.from_bytes(data[24:27], "little"), 1 + int.from_bytes(data[27:30], "little")
+    if kind == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        return 1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF)
+    if kind == b"VP8 ":
+        w, h = struct.unpack("<HH", data[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    raise UnsupportedImage(f"unknown WebP chunk {kind!r}")
+
+
+def _cover(size: Tuple[int, int], box: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    """Smallest size with the aspect ratio of `size` covering `box`; None if not smaller."""
+    scale = max(box[0] / size[0], box[1] / size[1])
+    if scale >= 1:
+        return None
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def prescale_refraction(path: Path, apply: bool) -> List[dict]:
+    data = path.read_bytes()
+    size = webp_size(data)
+    results = []
+    for surface, box in SURFACES.items():
+        target = _cover(size, box)
+        if target is None:
+            continue
+        entry = {"file": _rel(path), "action": f"prescale:{surface}",
+                 "size": f"{size[0]}x{size[1]} → {target[0]}x{target[1]}", "bytes_before": len(data)}
+        if Image is None:
+            entry.update(bytes_after=len(data), note="Pillow not installed")
+        else:
+            with Image.open(path) as image:
+                scaled = image.resize(target, Image.LANCZOS)
+            out = path.parent / surface / path.name
+            lossless = data[12:16] == b"VP8L"
+            with tempfile.NamedTemporaryFile(suffix=".webp") as tmp:
+                scaled.save(tmp.name, "WEBP", lossless=lossless, quality=90, method=6)
+                scaled_data = Path(tmp.name).read_bytes()
+            if len(scaled_data) >= len(data):
+                # e.g. a heavily compressed lossy source: the extension falls back to it
+                entry.update(bytes_after=len(data), note="not smaller than the original, skipped")
+                results.append(entry)
+                continue
+            entry["bytes_after"] = len(scaled_data)
+            if apply:
+                out.parent.mkdir(exist_ok=True)
+                out.write_bytes(scaled_data)
+        results.append(entry)
+    return results
+
+
+def _referenced(name: str, roots: List[Path]) -> bool:
+    for root in roots:
+        for path in root.rglob("*"):
+            if path.suffix in (".css", ".js", ".json", ".py") and path.is_file():
+                if name in path.read_text(encoding="utf-8", errors="replace"):
+                    return True
+    return False
+
+
+def find_duplicates(paths: List[Path]) -> List[dict]:
+    """Groups of byte-identical and (other) pixel-identical PNGs."""
+    by_bytes: Dict[str, List[Path]] = {}
+    for path in paths:
+        by_bytes.setdefault(hashlib.sha256(path.read_bytes()).hexdigest(), []).append(path)
+    groups = [{"kind": "bytes", "files": sorted(g)} for g in by_bytes.values() if len(g) > 1]
+
+    by_pixels: Dict[Tuple, List[Path]] = {}
+    for group in by_bytes.values():
+        try:
+            png = read_png(group[0].read_bytes())
+        except (UnsupportedImage, zlib.error):
+            continue
+        key = (png.width, png.height, hashlib.sha256(rgba16(png)).hexdigest())
+        by_pixels.setdefault(key, []).append(group[0])
+    groups += [{"kind": "pixels", "files": sorted(g)} for g in by_pixels.values() if len(g) > 1]
+    return groups
+
+
+def _kopia_original(path: Path) -> Optional[Path]:
+    m = re.match(r"^(.*) \(kopia\)(\.\w+)$", path.name)
+    return path.with_name(m.group(1) + m.group(2)) if m else None
+
+
+def run_stage(roots: List[Path], apply: bool) -> dict:
+    report = {"assets": [], "duplicates": [], "pillow": Image is not None}
+    pngs = sorted(p for root in roots for p in root.rglob("*.png") if p.is_file())
+
+    removed = set()
+    for group in find_duplicates(pngs):
+        files = group["files"]
+        report["duplicates"].append({"kind": group["kind"],
+                                     "files": [_rel(f) for f in files]})
+        for f in files:
+            original = _kopia_original(f)
+            if original in files and not _referenced(f.name, roots):
+                report["assets"].append({"file": _rel(f), "action": "remove duplicate",
+                                         "bytes_before": f.stat().st_size, "bytes_after": 0})
+                removed.add(f)
+                if apply:
+                    f.unlink()
+
+    for path in pngs:
+        if path in removed:
+            continue
+        data = path.read_bytes()
+        entry = {"file": _rel(path), "action": "recompress",
+                 "bytes_before": len(data)}
+        try:
+            out = recompress_png(data)
+        except (UnsupportedImage, zlib.error) as e:
+            entry.update(bytes_after=len(data), note=str(e))
+        else:
+            entry["bytes_after"] = len(out)
+            if apply and out is not data:
+                tmp = path.with_name(f".{path.name}.tmp")
+                tmp.write_bytes(out)
+                os.replace(tmp, path)
+        report["assets"].append(entry)
+
+    if REFRACTION_DIR.is_dir() and any(REFRACTION_DIR == r or r in REFRACTION_DIR.parents for r in roots):
+        for path in sorted(REFRACTION_DIR.glob("*.webp")):
+            report["assets"] += prescale_refraction(path, apply)
+    return report
+
+
+def _print_report(report: dict, apply: bool) -> None:
+    for a in report["assets"]:
+        if a["bytes_after"] != a["bytes_before"] or a.get("note") or a["action"].startswith("prescale"):
+            extra = f"  {a['size']}" if "size" in a else ""
+            note = f"  ({a['note']})" if a.get("note") else ""
+            print(f"  {a['action']:22} {a['bytes_before']:>9,} → {a['bytes_after']:>9,} B  {a['file']}{extra}{note}")
+    for d in report["duplicates"]:
+        print(f"  duplicate ({d['kind']}): " + ", ".join(d["files"]))
+    files = [a for a in report["assets"] if not a["action"].startswith("prescale")]
+    before = sum(a["bytes_before"] for a in files)
+    after = sum(a["bytes_after"] for a in files)
+    print(f"{'✅' if apply else 'ℹ'} PNG: {before:,} → {after:,} B ({100 * (before - after) / max(before, 1):.1f} % "
+          f"smaller){'' if apply else ' – dry run, use --apply'}")
+    if not report["pillow"]:
+        print("ℹ Pillow is not installed: refraction maps were not pre-scaled")
+
+
+def run_tests() -> int:
+    failures = 0
+
+    # every color type and bit depth round-trips; interlacing is removed
+    def encode(width, height, depth, ct, rows, interlace=False, chunks=()):
+        png = Png(width, height, depth, ct, rows, list(chunks))
+        if not interlace:
+            return write_png(png)
+        raw = bytearray()
+        size = png.bpp
+        for x0, y0, dx, dy in ADAM7:
+            pw = (width - x0 + dx - 1) // dx
+            for y in range(y0, height, dy):
+                if pw:
+                    raw.append(0)
+                    raw += b"".join(rows[y][x * size:(x + 1) * size] for x in range(x0, width, dx))
+        header = struct.pack(">IIBBBBB", width, height, depth, ct, 0, 0, 1)
+        return (PNG_SIGNATURE + _chunk(b"IHDR", header) + b"".join(_chunk(k, b) for k, b in chunks)
+                + _chunk(b"tEXt", b"Comment\0x" * 20) + _chunk(b"IDAT", zlib.compress(bytes(raw)))
+                + _chunk(b"IEND", b""))
+
+    w, h = 5, 7
+    cases = {
+        "gray+alpha 16 interlaced": (16, 4, [bytes(v for x in range(w) for v in (x * 40, x * 40, 200, 200))
+                                             for _y in range(h)], True, ()),
+        "rgba 8": (8, 6, [bytes((x * 50 + y) % 256 for x in range(w * 4)) for y in range(h)], False, ()),
+        "palette 2": (2, 3, [bytes([0b00011011, 0b01000000]) for _y in range(h)], False,
+                      ((b"PLTE", bytes(range(12))), (b"tRNS", b"\x00\x80"))),
+    }
+    for name, (depth, ct, rows, interlace, chunks) in cases.items():
+        data = encode(w, h, depth, ct, rows, interlace, chunks)
+        try:
+            out = recompress_png(data)
+        except Exception as e:
+            print(f"❌ TEST: recompress_png – {name}: {e}")
+            failures += 1
+            continue
+        if rgba16(read_png(out)) != rgba16(read_png(data)) or len(out) > len(data):
+            print(f"❌ TEST: recompress_png – {name}: pixels or size changed")
+            failures += 1
+    reduced = read_png(recompress_png(encode(w, h, *list(cases["gray+alpha 16 interlaced"])[:4])))
+    if reduced.depth != 8:
+        print("❌ TEST: recompress_png – 16-bit samples not reduced")
+        failures += 1
+
+    # the shipped assets plus a "(kopia)" copy: pixels kept, never larger, the copy removed
+    assets = REPO_DIR / "Semabe Grey Opaque (legacy)/assets"
+    if assets.is_dir():
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            originals = {}
+            for path in sorted(assets.glob("*.png")):
+                originals[path.name] = path.read_bytes()
+                (root / path.name).write_bytes(originals[path.name])
+            first = next(iter(originals))
+            kopia = root / first.replace(".png", " (kopia).png")
+            kopia.write_bytes(originals[first])
+            report = run_stage([root], apply=True)
+            if kopia.exists() or not (root / first).exists():
+                print("❌ TEST: run_stage – (kopia) copy not removed")
+                failures += 1
+            for name, data in originals.items():
+                new = (root / name).read_bytes() if (root / name).exists() else b""
+                if name.endswith(" (kopia).png") and not new:
+                    continue
+                if len(new) > len(data) or rgba16(read_png(new)) != rgba16(read_png(data)):
+                    print(f"❌ TEST: run_stage – {name} changed or grew")
+                    failures += 1
+            if any(a.get("note") for a in report["assets"] if a["action"] == "recompress"):
+                print("❌ TEST: run_stage – some assets could not be decoded")
+                failures += 1
+
+    # refraction maps: sizes from the headers, scaled to cover the surfaces
+    frost = REFRACTION_DIR / "frozen.webp"
+    if frost.exists():
+        size = webp_size(frost.read_bytes())
+        target = _cover(size, SURFACES["notifications"])
+        if target and (target[0] < SURFACES["notifications"][0] or target[1] < SURFACES["notifications"][1]):
+            print(f"❌ TEST: _cover – {size} → {target} does not cover the surface")
+            failures += 1
+    if _cover((100, 100), (640, 960)) is not None:
+        print("❌ TEST: _cover – small map scaled up")
+        failures += 1
+    # the committed pre-scaled maps: one per source map and surface, at the size _cover() gives
+    for surface, box in SURFACES.items():
+        for scaled in sorted((REFRACTION_DIR / surface).glob("*.webp")):
+            source = REFRACTION_DIR / scaled.name
+            if not source.exists() or webp_size(scaled.read_bytes()) != _cover(webp_size(source.read_bytes()), box):
+                print(f"❌ TEST: pre-scaled map {_rel(scaled)} does not match its source")
+                failures += 1
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Optimize and deduplicate the Semabe image assets")
+    parser.add_argument("roots", type=Path, nargs="*", help="directories to process (default: the repository)")
+    parser.add_argument("--apply", action="store_true", help="write the results (default: report only)")
+    parser.add_argument("--report", type=Path, help="write the per-asset report as JSON")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    args = parser.parse_args()
+
+    if args.run_tests:
+        return run_tests()
+
+    roots = [r.resolve() for r in args.roots] or [REPO_DIR]
+    report = run_stage(roots, args.apply)
+    _print_report(report, args.apply)
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"✅ Report saved: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
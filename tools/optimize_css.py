@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSS optimization pipeline for the theme stylesheets
+
+Rewrites gtk-3.0/, gtk-4.0/ and cinnamon/ stylesheets of one or more theme
+directories without changing the cascade:
+
+- comments and formatting are dropped (the "theme colors" header is kept)
+- dead declarations are removed: a declaration that a later rule with the same
+  selectors (or a superset) sets again, with the same priority
+- rules left without declarations and duplicate declarations are removed
+- rules with identical declaration blocks are merged when no rule in between
+  touches the same properties (shorthands and longhands count as the same
+  property)
+- with several themes, runs of rules shared by all of them are moved into
+  common files below semabe-common/ and @import-ed in place (GTK imports are
+  positional; Cinnamon only gets a leading shared block)
+
+Every rewritten file is checked against the original: both are parsed with
+their imports inlined and reduced to the declarations that can still win, in
+cascade order per property. A difference aborts the run.
+
+    tools/optimize_css.py --out build/themes "Semabe Grey Opaque (legacy)"
+    tools/optimize_css.py --in-place --report css.json ~/.themes/semabe/legacy/Semabe*
+
+The pipeline assumes that every selector in the input is valid for its
+toolkit: GTK drops a whole rule with an unknown selector, and merging would
+take the other selectors of that rule down with it.
+"""
+
+import argparse
+import difflib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+STYLESHEETS = ("gtk-3.0", "gtk-4.0", "cinnamon")
+SHARED_DIR = "semabe-common"
+# shorter shared runs are not worth an extra file
+MIN_SHARED_RULES = 8
+# at-rules that do not take part in the cascade of the rules around them
+NEUTRAL_AT_RULES = ("@define-color", "@keyframes", "@charset")
+
+IMPORT_RE = re.compile(r"""@import\s+(?:url\()?\s*["']?([^"')]+)["']?\s*\)?\s*;""")
+
+
+class Rule:
+    __slots__ = ("selectors", "decls")
+
+    def __init__(self, selectors: List[str], decls: List[Tuple[str, str, bool]]):
+        self.selectors = selectors
+        self.decls = decls  # (property, value, important)
+
+    def text(self) -> str:
+        body = ";".join(f"{p}:{v}{' !important' if imp else ''}" for p, v, imp in self.decls)
+        return f"{','.join(self.selectors)}{{{body}}}"
+
+
+class AtRule:
+    __slots__ = ("source",)
+
+    def __init__(self, source: str):
+        self.source = source
+
+    @property
+    def keyword(self) -> str:
+        return re.match(r"@[\w-]+", self.source).group(0)
+
+    def text(self) -> str:
+        return self.source
+
+
+def _collapse(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _skip_string(css: str, i: int) -> int:
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == "\\" else 1
+    return i + 1
+
+
+def _strip_comments(css: str) -> str:
+    out = []
+    i = 0
+    while i < len(css):
+        c = css[i]
+        if c in "\"'":
+            j = _skip_string(css, i)
+            out.append(css[i:j])
+            i = j
+        elif css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            i = len(css) if end < 0 else end + 2
+            out.append(" ")
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+def _split_top(text: str, sep: str) -> List[str]:
+    """Split at `sep` outside strings and parentheses."""
+    parts, depth, start, i = [], 0, 0, 0
+    while i < len(text):
+        c = text[i]
+        if c in "\"'":
+            i = _skip_string(text, i)
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _block_end(css: str, i: int) -> int:
+    """Index after the "}" closing the block whose "{" is at i."""
+    depth = 0
+    while i < len(css):
+        c = css[i]
+        if c in "\"'":
+            i = _skip_string(css, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise ValueError("unbalanced braces")
+
+
+def header_comment(css: str) -> str:
+    m = re.match(r"\s*(/\* theme colors \(red, green, blue\):.*?\*/)", css, re.S)
+    return m.group(1) if m else ""
+
+
+def parse(css: str) -> List[object]:
+    """Top-level items of a stylesheet: Rule and AtRule objects."""
+    css = _strip_comments(css)
+    items = []
+    i = 0
+    while True:
+        while i < len(css) and css[i].isspace():
+            i += 1
+        if i >= len(css):
+            return items
+        j = i
+        while j < len(css) and css[j] not in "{;":
+            j = _skip_string(css, j) if css[j] in "\"'" else j + 1
+        if css[i] == "@":
+            if j < len(css) and css[j] == "{":
+                end = _block_end(css, j)
+                items.append(AtRule(_collapse(css[i:j]) + "{" + _minify_block(css[j + 1:end - 1]) + "}"))
+            else:
+                end = j + 1
+                items.append(AtRule(_collapse(css[i:j]) + ";"))
+            i = end
+            continue
+        if j >= len(css) or css[j] != "{":
+            raise ValueError(f"expected '{{' after {css[i:i + 60]!r}")
+        end = _block_end(css, j)
+        selectors = [_collapse(s) for s in _split_top(css[i:j], ",")]
+        items.append(Rule(selectors, _declarations(css[j + 1:end - 1])))
+        i = end
+
+
+def _declarations(body: str) -> List[Tuple[str, str, bool]]:
+    decls = []
+    for part in _split_top(body, ";"):
+        if ":" not in part:
+            continue
+        prop, value = part.split(":", 1)
+        value = _collapse(value)
+        important = value.endswith("!important")
+        if important:
+            value = value[: -len("!important")].rstrip()
+        decls.append((prop.strip(), value, important))
+    return decls
+
+
+def _minify_block(body: str) -> str:
+    """Nested blocks (@keyframes, @media) are kept as they are, only minified."""
+    return "".join(item.text() for item in parse(body)) if "{" in body else \
+        ";".join(f"{p}:{v}{' !important' if imp else ''}" for p, v, imp in _declarations(body))
+
+
+def family(prop: str) -> str:
+    """Properties that can override each other share a family (border, border-top-color, …)."""
+    return prop.lstrip("-").split("-")[0]
+
+
+def _is_barrier(item) -> bool:
+    return isinstance(item, AtRule) and item.keyword not in NEUTRAL_AT_RULES
+
+
+def drop_dead(items: List[object]) -> Dict[str, int]:
+    """Remove declarations overridden by a later rule with the same selectors."""
+    stats = {"dead_declarations": 0, "duplicate_declarations": 0, "empty_rules": 0}
+    by_selector: Dict[str, List[int]] = {}
+    for idx, item in enumerate(items):
+        if isinstance(item, Rule):
+            for sel in item.selectors:
+                by_selector.setdefault(sel, []).append(idx)
+
+    for idx, rule in enumerate(items):
+        if not isinstance(rule, Rule):
+            continue
+        # exact duplicates inside a block: keep the last one
+        seen, kept = set(), []
+        for decl in reversed(rule.decls):
+            if decl in seen:
+                stats["duplicate_declarations"] += 1
+                continue
+            seen.add(decl)
+            kept.append(decl)
+        rule.decls = kept[::-1]
+
+        overridden = set()
+        own = set(rule.selectors)
+        for later in by_selector.get(rule.selectors[0], []):
+            if later > idx and own <= set(items[later].selectors):
+                overridden.update((p, imp) for p, _v, imp in items[later].decls)
+        if overridden:
+            before = len(rule.decls)
+            rule.decls = [d for d in rule.decls if (d[0], d[2]) not in overridden]
+            stats["dead_declarations"] += before - len(rule.decls)
+
+    kept_items = []
+    for item in items:
+        if isinstance(item, Rule) and not item.decls:
+            stats["empty_rules"] += 1
+            continue
+        kept_items.append(item)
+    items[:] = kept_items
+    return stats
+
+
+def merge_blocks(items: List[object]) -> int:
+    """Merge rules with identical declarations into the earlier rule; return merges."""
+    merged = 0
+    out: List[object] = []
+    for item in items:
+        if not isinstance(item, Rule):
+            out.append(item)
+            continue
+        families = {family(p) for p, _v, _imp in item.decls}
+        target = None
+        for prev in reversed(out):
+            if _is_barrier(prev):
+                break
+            if not isinstance(prev, Rule):
+                continue
+            if prev.decls == item.decls:
+                target = prev
+                break
+            if families & {family(p) for p, _v, _imp in prev.decls}:
+                break
+        if target is None:
+            out.append(item)
+        else:
+            target.selectors = [s for s in target.selectors if s not in item.selectors] + item.selectors
+            merged += 1
+    items[:] = out
+    return merged
+
+
+def serialize(items: List[object], header: str = "") -> str:
+    lines = [header] if header else []
+    lines += [item.text() for item in items]
+    return "\n".join(lines) + "\n"
+
+
+def _resolve_imports(css: str, base: Path, seen=()) -> List[object]:
+    items = []
+    for item in parse(css):
+        m = IMPORT_RE.match(item.text()) if isinstance(item, AtRule) else None
+        if m:
+            path = (base / m.group(1)).resolve()
+            if path in seen or not path.exists():
+                items.append(item)
+                continue
+            items += _resolve_imports(path.read_text(encoding="utf-8"), path.parent, seen + (path,))
+        else:
+            items.append(item)
+    return items
+
+
+def cascade(css: str, base: Path) -> Tuple[Dict[str, list], List[str]]:
+    """Semantic form of a stylesheet: per property family, the declarations that
+    can still win, in cascade order; plus the at-rules in order."""
+    entries = {}
+    at_rules = []
+    section = 0  # barriers (@media, unresolved @import) split the cascade into sections
+    for item in _resolve_imports(css, base):
+        if isinstance(item, AtRule):
+            at_rules.append(item.text())
+            section += _is_barrier(item)
+            continue
+        for sel in item.selectors:
+            for prop, value, imp in item.decls:
+                key = (sel, prop, imp)
+                entries.pop(key, None)  # re-insert: only the last occurrence counts
+                entries[key] = (family(prop), (section, sel, prop, value, imp))
+    result: Dict[str, list] = {}
+    for fam, decl in entries.values():
+        result.setdefault(fam, []).append(decl)
+    return result, at_rules
+
+
+def _count_rules(items: List[object]) -> int:
+    return sum(1 for item in items if isinstance(item, Rule))
+
+
+def _stylesheets(theme: Path) -> List[str]:
+    return sorted(p.relative_to(theme).as_posix()
+                  for sub in STYLESHEETS if (theme / sub).is_dir()
+                  for p in (theme / sub).rglob("*.css"))
+
+
+def _shared_runs(docs: List[List[str]], leading_only: bool) -> List[Tuple[int, int, List[int]]]:
+    """Runs of identical items present in every document: (start in docs[0], length,
+    start in each document)."""
+    first = docs[0]
+    mapping = [dict() for _ in docs]  # index in docs[0] -> index in docs[k]
+    for k, doc in enumerate(docs):
+        matcher = difflib.SequenceMatcher(None, first, doc, autojunk=False)
+        for a, b, size in matcher.get_matching_blocks():
+            for n in range(size):
+                mapping[k][a + n] = b + n
+    runs = []
+    i = 0
+    while i < len(first):
+        if all(i in m for m in mapping):
+            j = i + 1
+            while j < len(first) and all(j in m and m[j] == m[j - 1] + 1 for m in mapping):
+                j += 1
+            if j - i >= MIN_SHARED_RULES and (not leading_only or all(m[i] == 0 for m in mapping)):
+                runs.append((i, j - i, [m[i] for m in mapping]))
+            i = j
+        else:
+            i += 1
+        if leading_only and runs:
+            break
+    return runs
+
+
+def optimize(themes: List[Path], out_root: Path, in_root: Path, share: bool = True) -> dict:
+    """Optimize the stylesheets of `themes` (below in_root) into out_root; return the report."""
+    report = {"files": [], "shared": []}
+    docs: Dict[str, Dict[Path, Tuple[str, List[object]]]] = {}
+    for theme in themes:
+        dest = out_root / theme.relative_to(in_root)
+        if dest.resolve() != theme.resolve():
+            if dest.exists():
+                shutil.rmtree(dest)
+            shutil.copytree(theme, dest, symlinks=True)
+        for rel in _stylesheets(theme):
+            source = (theme / rel).read_text(encoding="utf-8")
+            items = parse(source)
+            entry = {"theme": theme.name, "file": rel, "bytes_before": len(source.encode("utf-8")),
+                     "rules_before": _count_rules(items)}
+            entry.update(drop_dead(items))
+            entry["merged_rules"] = merge_blocks(items)
+            docs.setdefault(rel, {})[dest] = (header_comment(source), items)
+            entry["_paths"] = (theme, dest, source)
+            report["files"].append(entry)
+
+    if share and len(themes) > 1:
+        for rel, per_theme in docs.items():
+            if len(per_theme) != len(themes):
+                continue
+            dests = list(per_theme)
+            # relative @imports would break when moved; they never match across themes
+            texts = [[item.text() + (f"\0{k}" if item.text().startswith("@import") else "")
+                      for item in per_theme[d][1]] for k, d in enumerate(dests)]
+            runs = _shared_runs(texts, leading_only=rel.startswith("cinnamon/"))
+            # replace from the end so earlier indices stay valid
+            for n, (start, size, starts) in reversed(list(enumerate(runs))):
+                shared = out_root / SHARED_DIR / f"{rel[:-4]}-{n + 1}.css"
+                shared.parent.mkdir(parents=True, exist_ok=True)
+                shared.write_text(serialize(per_theme[dests[0]][1][start:start + size]), encoding="utf-8")
+                report["shared"].append({"file": shared.relative_to(out_root).as_posix(), "rules": size,
+                                         "bytes": shared.stat().st_size})
+                for dest, offset in zip(dests, starts):
+                    items = per_theme[dest][1]
+                    url = os.path.relpath(shared, (dest / rel).parent)
+                    items[offset:offset + size] = [AtRule(f'@import url("{url}");')]
+
+    for entry in report["files"]:
+        theme, dest, source = entry.pop("_paths")
+        rel = entry["file"]
+        header, items = docs[rel][dest]
+        text = serialize(items, header)
+        (dest / rel).write_text(text, encoding="utf-8")
+        entry["bytes_after"] = len(text.encode("utf-8"))
+        entry["rules_after"] = _count_rules(items)
+        if cascade(source, (theme / rel).parent) != cascade(text, (dest / rel).parent):
+            raise RuntimeError(f"{dest / rel}: the optimized stylesheet changes the cascade")
+    return report
+
+
+def _print_report(report: dict) -> None:
+    before = sum(f["bytes_before"] for f in report["files"])
+    after = sum(f["bytes_after"] for f in report["files"]) + sum(s["bytes"] for s in report["shared"])
+    for f in report["files"]:
+        print(f"  {f['theme']}/{f['file']}: {f['bytes_before']:,} → {f['bytes_after']:,} B, "
+              f"{f['rules_before']} → {f['rules_after']} rules "
+              f"(dead {f['dead_declarations']}, duplicate {f['duplicate_declarations']}, "
+              f"empty {f['empty_rules']}, merged {f['merged_rules']})")
+    for s in report["shared"]:
+        print(f"  {s['file']}: {s['rules']} shared rules, {s['bytes']:,} B")
+    print(f"✅ {before:,} → {after:,} B ({100 * (before - after) / max(before, 1):.1f} % smaller), "
+          "cascade unchanged")
+
+
+def run_tests() -> int:
+    failures = 0
+
+    # dead, duplicate and empty rules; merges blocked by overlapping properties
+    css = ("/* theme colors (red, green, blue):\n1, 2, 3\n*/\n"
+           "a { color: red; color: red; border: 1px solid; }\n"
+           "b { margin: 0; }\n"
+           "c { padding: 0; }\n"
+           "a { color: blue; }\n"
+           "d { margin: 0; }\n"
+           "e { border-color: red; }\n"
+           "f { color: blue; }\n"
+           "g { }\n")
+    items = parse(css)
+    stats = drop_dead(items)
+    merged = merge_blocks(items)
+    out = serialize(items, header_comment(css))
+    expected = ("/* theme colors (red, green, blue):\n1, 2, 3\n*/\n"
+                "a{border:1px solid}\nb,d{margin:0}\nc{padding:0}\na,f{color:blue}\ne{border-color:red}\n")
+    if out != expected:
+        print(f"❌ TEST: optimize – unexpected result:\n{out}")
+        failures += 1
+    if stats != {"dead_declarations": 1, "duplicate_declarations": 1, "empty_rules": 1} or merged != 2:
+        print(f"❌ TEST: optimize – stats {stats}, merged {merged}")
+        failures += 1
+    if cascade(css, Path(".")) != cascade(out, Path(".")):
+        print("❌ TEST: cascade – optimized test stylesheet differs")
+        failures += 1
+    if cascade("a{border:0}\nb{border-color:red}\n", Path(".")) == \
+            cascade("b{border-color:red}\na{border:0}\n", Path(".")):
+        print("❌ TEST: cascade – reordered shorthand/longhand not detected")
+        failures += 1
+
+    # reference theme plus a second variant: optimized, shared files, cascade kept
+    reference = Path(__file__).resolve().parent.parent / "Semabe Grey Opaque (legacy)"
+    with tempfile.TemporaryDirectory() as tmp:
+        src = Path(tmp) / "src"
+        shutil.copytree(reference, src / reference.name)
+        variant = src / "Semabe Test Opaque (legacy)"
+        shutil.copytree(reference, variant)
+        gtk = variant / "gtk-3.0/gtk.css"
+        gtk.write_text(gtk.read_text(encoding="utf-8").replace("254, 254, 254", "1, 2, 3"), encoding="utf-8")
+        try:
+            report = optimize(sorted(src.iterdir()), Path(tmp) / "out", src)
+        except RuntimeError as e:
+            print(f"❌ TEST: optimize – {e}")
+            failures += 1
+        else:
+            before = sum(f["bytes_before"] for f in report["files"])
+            after = sum(f["bytes_after"] for f in report["files"]) + sum(s["bytes"] for s in report["shared"])
+            if after >= before * 0.75:
+                print(f"❌ TEST: optimize – only {before} → {after} bytes")
+                failures += 1
+            if not any(s["file"].startswith(f"{SHARED_DIR}/gtk-4.0/gtk") for s in report["shared"]):
+                print(f"❌ TEST: optimize – nothing shared: {report['shared']}")
+                failures += 1
+            out_css = (Path(tmp) / "out" / variant.name / "gtk-3.0/gtk.css").read_text(encoding="utf-8")
+            if not out_css.startswith("/* theme colors (red, green, blue):\n1, 2, 3\n"):
+                print("❌ TEST: optimize – theme colors header lost")
+                failures += 1
+
+    if failures:
+        print(f"\n❌ TESTS: failures: {failures}")
+        return 1
+
+    print("\n✅ TESTS: all passed")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Optimize the Semabe theme stylesheets")
+    parser.add_argument("themes", type=Path, nargs="*", help="theme directories")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--out", type=Path, help="write the optimized themes below this directory")
+    target.add_argument("--in-place", action="store_true", help="rewrite the themes in place")
+    parser.add_argument("--no-share", action="store_true", help=f"do not factor shared rules into {SHARED_DIR}/")
+    parser.add_argument("--report", type=Path, help="write the report as JSON")
+    parser.add_argument("--run-tests", action="store_true", help="run tests and exit")
+    args = parser.parse_args()
+
+    if args.run_tests:
+        return run_tests()
+    if not args.themes or not (args.out or args.in_place):
+        parser.error("theme directories and --out or --in-place are required")
+
+    themes = [t.resolve() for t in args.themes]
+    in_root = Path(os.path.commonpath(themes)) if len(themes) > 1 else themes[0].parent
+    out_root = in_root if args.in_place else args.out.resolve()
+    try:
+        report = optimize(themes, out_root, in_root, share=not args.no_share)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    _print_report(report)
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"✅ Report saved: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())